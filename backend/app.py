@@ -5,19 +5,28 @@ from typing import List, Optional
 import uvicorn
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, ORJSONResponse
 from fastapi.requests import Request
-from background_tasks import start_scheduler
+from log_config import setup_logging
+from background_tasks import (
+    start_scheduler, backfill_printer_activity, rebuild_status_counters, build_duration_sketches, resume_report_jobs
+)
 
 from database import get_db, engine
 from models import Base
 from sqlalchemy.orm import Session
-from routers import printers, printings, models, reports, printer_parameters
+from routers import printers, printings, models, reports, printer_parameters, telemetry, queue, metrics, fleet, search
+import instrumentation
+
+# JSON-логи через очередь и фоновый поток (уровни - LOG_LEVEL и LOG_LEVELS)
+setup_logging()
 
 app = FastAPI(
     title="3D Printer Management API",
     description="API for managing 3D printers, models and print jobs",
-    version="1.0.0"
+    version="1.0.0",
+    # orjson вместо стандартного json для всех ответов
+    default_response_class=ORJSONResponse
 )
 
 # Add CORS middleware
@@ -30,6 +39,10 @@ app.add_middleware(
     expose_headers=["*"],  # Expose all headers
 )
 
+# Время ответа, SQL-запросы и профилирование (заголовок Server-Timing, /metrics)
+app.add_middleware(instrumentation.InstrumentationMiddleware)
+instrumentation.instrument_engine(engine)
+
 # Инициализация базы данных
 Base.metadata.create_all(bind=engine)
 
@@ -40,10 +53,22 @@ app.include_router(printings.router)
 app.include_router(models.router)
 app.include_router(reports.router)
 app.include_router(printer_parameters.router)
+app.include_router(telemetry.router)
+app.include_router(queue.router)
+app.include_router(metrics.router)
+app.include_router(fleet.router)
+app.include_router(search.router)
+
+# Профилирование оборачивает обработчики, поэтому подключается после всех роутеров
+instrumentation.instrument_routes(app)
 
 # Запускаем планировщик при старте приложения
 @app.on_event("startup")
 async def startup_event():
+    backfill_printer_activity()
+    rebuild_status_counters()
+    build_duration_sketches()
+    resume_report_jobs()
     start_scheduler()
 
 
@@ -1,18 +1,29 @@
 from apscheduler.schedulers.background import BackgroundScheduler
 from sqlalchemy.orm import Session
 from datetime import datetime
-from database import SessionLocal
+from database import SessionLocal, engine
 from printer_control import calculate_printer_downtime
 from services.printer import get_printers, format_hours_to_hhmm
 from dal import printer as printer_dal
+import telemetry
+import partitioning
+import status_counters
+import report_jobs
+import quantiles
+from services.queue import dispatch_queue
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Интервал запуска диспетчера очереди печати в секундах
+QUEUE_DISPATCH_INTERVAL = 10
 
 def update_printer_downtimes():
     """Обновляет время простоя для всех принтеров в неактивном состоянии"""
     db = SessionLocal()
     try:
         printers = get_printers(db)
-        current_time = datetime.now()
-        print(f"[{current_time}] Checking printer downtimes...")
+        logger.debug("Checking printer downtimes...")
         
         # Время в минутах между запусками задачи
         # Обычно планировщик запускается раз в 30 секунд, но для надежности используем
@@ -34,12 +45,111 @@ def update_printer_downtimes():
                 # Обновляем общее время простоя
                 printer_dal.update(db, printer.id, {"total_downtime": new_downtime})
                 
-                formatted_time = format_hours_to_hhmm(new_downtime)
-                print(f"[{current_time}] Printer {printer.id} updated downtime: {formatted_time} (+{increment_minutes:.2f} min)")
+                # Строка на каждый простаивающий принтер - только на уровне DEBUG
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Printer %s updated downtime: %s (+%.2f min)",
+                                 printer.id, format_hours_to_hhmm(new_downtime), increment_minutes)
         
         db.commit()
     except Exception as e:
-        print(f"Error updating printer downtimes: {e}")
+        logger.error("Error updating printer downtimes: %s", e)
+        db.rollback()
+    finally:
+        db.close()
+
+def process_telemetry():
+    """Забирает телеметрию (если настроен getter) и записывает изменения состояний принтеров"""
+    db = SessionLocal()
+    try:
+        telemetry.pull_from_getter()
+    except Exception as e:
+        logger.warning("Error pulling telemetry: %s", e)
+    try:
+        telemetry.flush(db)
+    except Exception as e:
+        logger.error("Error applying telemetry: %s", e)
+        db.rollback()
+    finally:
+        db.close()
+
+def dispatch_print_queue():
+    """Назначает задания из очереди печати свободным принтерам"""
+    db = SessionLocal()
+    try:
+        printings = dispatch_queue(db)
+        if printings:
+            logger.info("Dispatched %d queued printings", len(printings))
+    except Exception as e:
+        logger.error("Error dispatching print queue: %s", e)
+        db.rollback()
+    finally:
+        db.close()
+
+def maintain_printing_partitions():
+    """Создаёт секции td_printings наперёд и архивирует старую историю (только для секционированной таблицы)"""
+    try:
+        created, archived = partitioning.maintain_partitions(engine)
+        if created or archived:
+            logger.info("Printing partitions created: %s, archived: %s", created, archived)
+    except Exception as e:
+        logger.error("Error maintaining printing partitions: %s", e)
+
+def backfill_printer_activity():
+    """Заполняет указатель на текущую печать и время активности у принтеров, где их ещё нет"""
+    db = SessionLocal()
+    try:
+        count = printer_dal.backfill_activity(db)
+        if count:
+            logger.info("Backfilled current printing and last activity for %d printers", count)
+    except Exception as e:
+        logger.error("Error backfilling printer activity: %s", e)
+        db.rollback()
+    finally:
+        db.close()
+
+def rebuild_status_counters():
+    """Пересчитывает счётчики статусов принтеров по таблице принтеров"""
+    db = SessionLocal()
+    try:
+        count = status_counters.rebuild(db)
+        logger.info("Printer status counters rebuilt for %d printers", count)
+    except Exception as e:
+        logger.error("Error rebuilding printer status counters: %s", e)
+        db.rollback()
+    finally:
+        db.close()
+
+def build_duration_sketches():
+    """Собирает скетчи квантилей по истории печатей, если их ещё нет (первый запуск после миграции)"""
+    db = SessionLocal()
+    try:
+        if quantiles.is_empty(db):
+            count = quantiles.rebuild(db)
+            logger.info("Duration sketches built from %d printings", count)
+    except Exception as e:
+        logger.error("Error building duration sketches: %s", e)
+        db.rollback()
+    finally:
+        db.close()
+
+def resume_report_jobs():
+    """Запускает задания отчётов, не досчитанные до перезапуска"""
+    try:
+        count = report_jobs.resume_pending()
+        if count:
+            logger.info("Resumed %d report jobs", count)
+    except Exception as e:
+        logger.error("Error resuming report jobs: %s", e)
+
+def cleanup_report_jobs():
+    """Удаляет старые задания отчётов вместе с результатами"""
+    db = SessionLocal()
+    try:
+        count = report_jobs.cleanup(db)
+        if count:
+            logger.info("Deleted %d old report jobs", count)
+    except Exception as e:
+        logger.error("Error cleaning up report jobs: %s", e)
         db.rollback()
     finally:
         db.close()
@@ -51,6 +161,23 @@ def start_scheduler():
                      'interval', 
                      seconds=30,
                      next_run_time=datetime.now())  # Немедленный запуск
+    # Применяем телеметрию каждые TELEMETRY_FLUSH_INTERVAL секунд
+    scheduler.add_job(process_telemetry,
+                     'interval',
+                     seconds=telemetry.TELEMETRY_FLUSH_INTERVAL)
+    # Раздаём очередь печати свободным принтерам
+    scheduler.add_job(dispatch_print_queue,
+                     'interval',
+                     seconds=QUEUE_DISPATCH_INTERVAL)
+    # Секции печатей на месяцы вперёд и архив старой истории
+    scheduler.add_job(maintain_printing_partitions,
+                     'interval',
+                     hours=partitioning.PARTITION_MAINTENANCE_HOURS,
+                     next_run_time=datetime.now())
+    # Старые задания отчётов и их результаты
+    scheduler.add_job(cleanup_report_jobs,
+                     'interval',
+                     hours=1)
     scheduler.start()
-    print(f"[{datetime.now()}] Scheduler started - updating printer downtimes every 30 seconds")
+    logger.info("Scheduler started - updating printer downtimes every 30 seconds")
     return scheduler
@@ -0,0 +1,143 @@
+"""
+Бенчмарк фильтров списков: отбор на клиенте (страницы /printings/ и /printers/
+без фильтров, как раньше делал фронтенд) против фильтров в запросе.
+
+Для каждого сценария меряется, сколько запросов, строк и байт понадобилось,
+чтобы получить нужные строки, и сколько это заняло времени. Базу заполняет
+benchmarks/seed.py.
+
+Запуск из каталога backend:
+    python benchmarks/seed.py --database-url sqlite:///bench.db --printings 1000000
+    python benchmarks/bench_listing.py --database-url sqlite:///bench.db
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SERVER_TIMING_QUERIES = re.compile(r'desc="(\d+) queries"')
+ACTIVE_STATUSES = ("printing", "paused")
+
+
+class Meter:
+    def __init__(self, client):
+        self.client = client
+        self.requests = self.rows = self.bytes = self.queries = 0
+
+    def get(self, path: str, **params):
+        response = self.client.get(path, params=params)
+        response.raise_for_status()
+        self.requests += 1
+        self.bytes += len(response.content)
+        match = SERVER_TIMING_QUERIES.search(response.headers.get("server-timing", ""))
+        if match:
+            self.queries += int(match.group(1))
+        rows = response.json()
+        self.rows += len(rows)
+        return rows
+
+
+def _client_side(meter: Meter, path: str, wanted: int, match, page_size: int, max_pages: int, stop=None, **params):
+    """Листает страницы без фильтров и отбирает строки сам, как делал фронтенд"""
+    found = []
+    for page in range(max_pages):
+        rows = meter.get(path, skip=page * page_size, limit=page_size, **params)
+        found.extend(row for row in rows if match(row))
+        if len(found) >= wanted or len(rows) < page_size or (stop and rows and stop(rows[-1])):
+            break
+    return found[:wanted]
+
+
+def scenarios(args, model_id: int, printer_prefix: str):
+    week_ago = datetime.now() - timedelta(days=7)
+    return {
+        "printings_of_model": (
+            lambda meter: _client_side(meter, "/printings/", args.wanted, lambda row: row["model_id"] == model_id,
+                                       args.page_size, args.max_pages, sort_by="start_time", sort_desc=True),
+            lambda meter: meter.get("/printings/", model_id=model_id, limit=args.wanted,
+                                    sort_by="start_time", sort_desc=True),
+        ),
+        "active_printings": (
+            lambda meter: _client_side(meter, "/printings/", args.wanted,
+                                       lambda row: row["status"] in ACTIVE_STATUSES and not row["real_time_stop"],
+                                       args.page_size, args.max_pages),
+            lambda meter: meter.get("/printings/", active_only=True, limit=args.wanted),
+        ),
+        "cancelled_last_week": (
+            lambda meter: _client_side(
+                meter, "/printings/", args.wanted, lambda row: row["status"] == "cancelled",
+                args.page_size, args.max_pages,
+                stop=lambda row: datetime.fromisoformat(row["start_time"]) < week_ago,
+                sort_by="start_time", sort_desc=True),
+            lambda meter: meter.get("/printings/", status="cancelled", started_from=week_ago.isoformat(),
+                                    limit=args.wanted, sort_by="start_time", sort_desc=True),
+        ),
+        "idle_printers_by_prefix": (
+            lambda meter: [row for row in meter.get("/printers/", limit=1000000)
+                           if row["status"] == "idle" and row["name"].startswith(printer_prefix)],
+            lambda meter: meter.get("/printers/", status="idle", name_prefix=printer_prefix, limit=1000000),
+        ),
+    }
+
+
+def _run(client, fetch, repeat: int):
+    timings, result = [], None
+    for _ in range(repeat):
+        meter = Meter(client)
+        started = time.perf_counter()
+        rows = fetch(meter)
+        timings.append((time.perf_counter() - started) * 1000)
+        result = {"found": len(rows), "requests": meter.requests, "rows_fetched": meter.rows,
+                  "bytes": meter.bytes, "queries": meter.queries}
+    result["median_ms"] = round(sorted(timings)[len(timings) // 2], 1)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="по умолчанию DATABASE_URL")
+    parser.add_argument("--wanted", type=int, default=50, help="сколько строк нужно клиенту")
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--max-pages", type=int, default=500, help="сколько страниц клиент готов пролистать")
+    parser.add_argument("--printer-prefix", default="bench-printer-000")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="файл для результата в JSON")
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    from fastapi.testclient import TestClient
+    from sqlalchemy import func
+    from app import app
+    from database import SessionLocal
+    import models
+
+    with SessionLocal() as db:
+        # Модель со средним числом печатей - типичная страница модели
+        counts = db.query(models.Printing.model_id, func.count()).group_by(models.Printing.model_id).all()
+        model_id = sorted(counts, key=lambda row: row[1])[len(counts) // 2][0] if counts else 1
+
+    client = TestClient(app)
+    report = {"model_id": model_id, "wanted": args.wanted, "scenarios": {}}
+    for name, (client_side, server_side) in scenarios(args, model_id, args.printer_prefix).items():
+        report["scenarios"][name] = {
+            "client_filter": _run(client, client_side, args.repeat),
+            "server_filter": _run(client, server_side, args.repeat),
+        }
+        print(json.dumps({name: report["scenarios"][name]}), file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Бенчмарк планировщика очереди: LPT + локальный поиск.
+
+Запуск из каталога backend:
+    python benchmarks/bench_planner.py --printers 500 --jobs 10000
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.planner import PlanJob, PlanPrinter, plan_assignments
+
+
+def make_farm(printers: int, jobs: int, pinned_share: float, seed: int):
+    rng = random.Random(seed)
+    farm = [
+        # Часть принтеров занята текущей печатью
+        PlanPrinter(i, rng.uniform(0, 240) if rng.random() < 0.6 else 0.0)
+        for i in range(printers)
+    ]
+    queue = [
+        PlanJob(
+            key=k,
+            queue_item_id=k // 3,
+            model_id=rng.randrange(500),
+            duration=rng.lognormvariate(4.5, 0.8),  # медиана ~90 минут
+            priority=rng.randrange(3),
+            printer_id=rng.randrange(printers) if rng.random() < pinned_share else None,
+        )
+        for k in range(jobs)
+    ]
+    return queue, farm
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--printers", type=int, default=500)
+    parser.add_argument("--jobs", type=int, default=10000)
+    parser.add_argument("--pinned-share", type=float, default=0.02)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    jobs, printers = make_farm(args.printers, args.jobs, args.pinned_share, args.seed)
+    lower_bound = max(
+        (sum(j.duration for j in jobs) + sum(p.available_in for p in printers)) / len(printers),
+        max(p.available_in for p in printers),
+        max(j.duration for j in jobs) + min(p.available_in for p in printers),
+    )
+
+    timings = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        plan = plan_assignments(jobs, printers)
+        timings.append(time.perf_counter() - started)
+
+    print(json.dumps({
+        "benchmark": "planner",
+        "printers": args.printers,
+        "jobs": args.jobs,
+        "seconds_median": round(statistics.median(timings), 4),
+        "seconds_max": round(max(timings), 4),
+        "makespan_minutes": round(plan["makespan"], 1),
+        "lower_bound_minutes": round(lower_bound, 1),
+        "local_search_improvements": plan["improvements"],
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
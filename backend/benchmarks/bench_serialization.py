@@ -0,0 +1,111 @@
+"""
+Бенчмарк сериализации списков: прежний путь (ORM-объекты -> response_model
+pydantic -> стандартный json) против нового (проекция колонок -> словари -> orjson).
+
+База - временный SQLite с синтетической фермой (seed.py).
+
+Запуск из каталога backend:
+    python benchmarks/bench_serialization.py --rows 10000
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _measure(fn, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(timings), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench_serialization.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+
+    from typing import List
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse, ORJSONResponse
+    from pydantic import TypeAdapter
+    from database import SessionLocal, engine
+    import schemas
+    from dal import printer as printer_dal
+    from dal import printing as printing_dal
+    from services import printer as printer_service
+    from services import printing as printing_service
+    from seed import seed_database
+
+    seed_database(engine, printers=args.rows, models_count=500, printings=args.rows)
+    db = SessionLocal()
+
+    printing_adapter = TypeAdapter(List[schemas.Printing])
+    printer_adapter = TypeAdapter(List[schemas.Printer])
+
+    def old_printings():
+        # Как раньше: get_printings (запросы на каждую печать), валидация response_model, json.dumps
+        return old_encode(printing_adapter, printing_service.get_printings(db, 0, args.rows))
+
+    def old_printers():
+        db.expire_all()  # параметры подгружаются лениво, как при первом обращении в запросе
+        return old_encode(printer_adapter, printer_dal.get_all(db, 0, args.rows))
+
+    def old_encode(adapter, objects):
+        validated = adapter.validate_python(objects, from_attributes=True)
+        return JSONResponse(jsonable_encoder(adapter.dump_python(validated, mode="json"))).body
+
+    def old_encode_only(adapter, objects):
+        return lambda: old_encode(adapter, objects)
+
+    cases = {}
+
+    # Только сериализация готовых данных
+    printing_objects = printing_dal.get_all(db, 0, args.rows)
+    for p in printing_objects:
+        p.printer_name, p.model_name, p.progress = "", "", 0.0
+    printing_rows = printing_service.get_printing_list(db, 0, args.rows)
+    cases["printings_serialize"] = {
+        "before_ms": _measure(old_encode_only(printing_adapter, printing_objects), args.repeat),
+        "after_ms": _measure(lambda: ORJSONResponse(printing_rows).body, args.repeat),
+    }
+    printer_objects = printer_dal.get_all(db, 0, args.rows)
+    for p in printer_objects:
+        p.parameters  # noqa: B018 - загружаем заранее, чтобы мерить только сериализацию
+    printer_rows = printer_service.get_printer_list(db, 0, args.rows)
+    cases["printers_serialize"] = {
+        "before_ms": _measure(old_encode_only(printer_adapter, printer_objects), args.repeat),
+        "after_ms": _measure(lambda: ORJSONResponse(printer_rows).body, args.repeat),
+    }
+
+    # Загрузка из базы и сериализация вместе, как в обработчике
+    cases["printings_end_to_end"] = {
+        "before_ms": _measure(old_printings, args.repeat),
+        "after_ms": _measure(lambda: ORJSONResponse(printing_service.get_printing_list(db, 0, args.rows)).body,
+                             args.repeat),
+    }
+    cases["printers_end_to_end"] = {
+        "before_ms": _measure(old_printers, args.repeat),
+        "after_ms": _measure(lambda: ORJSONResponse(printer_service.get_printer_list(db, 0, args.rows)).body,
+                             args.repeat),
+    }
+    for case in cases.values():
+        case["speedup"] = round(case["before_ms"] / case["after_ms"], 1) if case["after_ms"] else None
+
+    db.close()
+    print(json.dumps({"rows": args.rows, "cases": cases}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
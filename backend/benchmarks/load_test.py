@@ -0,0 +1,263 @@
+"""
+Нагрузочный тест API: гоняет настоящее приложение (app.app) через TestClient
+по горячим эндпоинтам в несколько потоков и пишет результат в JSON -
+пропускную способность, p50/p99 времени ответа и число SQL-запросов на запрос
+(из заголовка Server-Timing).
+
+Запуск из каталога backend:
+    python benchmarks/seed.py --database-url sqlite:///bench.db --printings 1000000
+    python benchmarks/load_test.py --database-url sqlite:///bench.db --output before.json
+    # ... изменения ...
+    python benchmarks/load_test.py --database-url sqlite:///bench.db --compare before.json
+
+С --reseed база заполняется перед тестом теми же параметрами, что и в seed.py.
+
+Отчёты кешируются (coalescing): сценарий report_* меряется с выключенным
+кешем - каждый запрос считает отчёт в базе, - а report_*_cached - с кешем,
+как в работе. Сравнивать с прошлыми прогонами нужно report_* без _cached.
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SERVER_TIMING_DB = re.compile(r'db;dur=([\d.]+);desc="(\d+) queries"')
+
+# Сценарии чтения: имя -> путь
+READ_SCENARIOS = {
+    "printings_list": "/printings/?limit=100",
+    "printers_list": "/printers/",
+    "report_printer_status": "/reports/printer-status",
+    "report_efficiency": "/reports/printing-efficiency?days=30",
+    "report_daily": "/reports/daily/",
+}
+TRANSITION_SCENARIO = "start_stop"
+# Суффикс варианта сценария отчёта, который меряется с кешем результатов
+CACHED_SUFFIX = "_cached"
+
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.queries = []
+        self.db_ms = []
+        self.errors = 0
+
+    def record(self, response, elapsed_ms):
+        match = SERVER_TIMING_DB.search(response.headers.get("server-timing", ""))
+        with self.lock:
+            self.latencies.append(elapsed_ms)
+            if response.status_code >= 400:
+                self.errors += 1
+            if match:
+                self.db_ms.append(float(match.group(1)))
+                self.queries.append(int(match.group(2)))
+
+    def summary(self, wall_seconds):
+        count = len(self.latencies)
+        return {
+            "requests": count,
+            "errors": self.errors,
+            "throughput_rps": round(count / wall_seconds, 1) if wall_seconds else None,
+            "mean_ms": round(statistics.fmean(self.latencies), 2) if count else None,
+            "p50_ms": round(_percentile(self.latencies, 0.5), 2) if count else None,
+            "p99_ms": round(_percentile(self.latencies, 0.99), 2) if count else None,
+            "queries_per_request": round(statistics.fmean(self.queries), 1) if self.queries else None,
+            "db_ms_per_request": round(statistics.fmean(self.db_ms), 2) if self.db_ms else None,
+        }
+
+
+def _timed(client, recorder, method, path, **kwargs):
+    started = time.perf_counter()
+    response = client.request(method, path, **kwargs)
+    recorder.record(response, (time.perf_counter() - started) * 1000)
+    return response
+
+
+def run_scenario(app, worker_fn, requests: int, concurrency: int, warmup: int):
+    """Выполняет requests вызовов worker_fn(client, recorder, i) в concurrency потоках"""
+    from fastapi.testclient import TestClient
+
+    local = threading.local()
+
+    def client():
+        # Клиент на поток: TestClient держит своё состояние соединения
+        if not hasattr(local, "client"):
+            local.client = TestClient(app)
+        return local.client
+
+    warmup_recorder = Recorder()
+    for i in range(warmup):
+        worker_fn(client(), warmup_recorder, i)
+
+    recorder = Recorder()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(lambda i: worker_fn(client(), recorder, i), range(requests)))
+    return recorder.summary(time.perf_counter() - started)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _set_report_caches(enabled: bool):
+    """Включает кеш отчётов с настройками приложения или выключает его (ttl = 0) и очищает"""
+    import coalescing
+    from routers.reports import REPORTS_CACHE_TTL, REPORTS_STALE_TTL
+
+    for name in coalescing.get_stats():
+        if name.startswith("reports."):
+            cache = coalescing.get_cache(name, REPORTS_CACHE_TTL)
+            cache.ttl, cache.stale_ttl = (REPORTS_CACHE_TTL, REPORTS_STALE_TTL) if enabled else (0.0, 0.0)
+            cache.invalidate()
+
+
+def _scenario_names():
+    names = []
+    for name in READ_SCENARIOS:
+        names.append(name)
+        if name.startswith("report_"):
+            names.append(name + CACHED_SUFFIX)
+    return names + [TRANSITION_SCENARIO]
+
+
+def _farm_size(db):
+    import models
+    return {
+        "printers": db.query(models.Printer).count(),
+        "models": db.query(models.Model).count(),
+        "printings": db.query(models.Printing).count(),
+    }
+
+
+def run(args):
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    # Фоновые задачи не запускаются: TestClient без контекстного менеджера не шлёт startup
+    import app as app_module
+    import models
+    from database import SessionLocal, engine
+
+    if args.reseed:
+        import seed
+        print(json.dumps(seed.seed_database(engine, args.printers, args.models, args.printings, seed=args.seed)),
+              file=sys.stderr)
+
+    db = SessionLocal()
+    try:
+        farm = _farm_size(db)
+        idle_printers = [p.id for p in db.query(models.Printer.id).filter(models.Printer.status == "idle")
+                         .order_by(models.Printer.id).limit(args.concurrency * 4).all()]
+        model_id = db.query(models.Model.id).order_by(models.Model.id).limit(1).scalar()
+    finally:
+        db.close()
+
+    scenarios = args.scenarios or _scenario_names()
+    results = {}
+    for name in scenarios:
+        if name == TRANSITION_SCENARIO:
+            if not idle_printers or model_id is None:
+                print("start_stop: нет свободных принтеров или моделей, пропуск", file=sys.stderr)
+                continue
+            # Каждый поток работает со своим принтером, чтобы переходы не конфликтовали
+            slots = {}
+            slots_lock = threading.Lock()
+
+            def worker(client, recorder, i):
+                ident = threading.get_ident()
+                with slots_lock:
+                    if ident not in slots:
+                        slots[ident] = idle_printers[len(slots) % len(idle_printers)]
+                    printer_id = slots[ident]
+                _timed(client, recorder, "POST", f"/printers/{printer_id}/start", json={"model_id": model_id})
+                _timed(client, recorder, "POST", f"/printers/{printer_id}/stop", json={"reason": "benchmark"})
+        else:
+            cached = name.endswith(CACHED_SUFFIX)
+            path = READ_SCENARIOS[name[:-len(CACHED_SUFFIX)] if cached else name]
+            _set_report_caches(cached)
+
+            def worker(client, recorder, i, path=path):
+                _timed(client, recorder, "GET", path)
+
+        results[name] = run_scenario(app_module.app, worker, args.requests, args.concurrency, args.warmup)
+        print(f"{name}: {json.dumps(results[name])}", file=sys.stderr)
+
+    return {
+        "commit": _git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "database": engine.dialect.name,
+        "python": platform.python_version(),
+        "farm": farm,
+        "settings": {"requests": args.requests, "concurrency": args.concurrency, "warmup": args.warmup},
+        "scenarios": results,
+    }
+
+
+def compare(baseline: dict, current: dict):
+    """Печатает изменение ключевых показателей относительно прошлого прогона"""
+    print(f"{'scenario':<24}{'metric':<22}{'baseline':>12}{'current':>12}{'change':>10}")
+    for name, metrics in current["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        for metric in ("throughput_rps", "p50_ms", "p99_ms", "queries_per_request"):
+            old, new = before.get(metric), metrics.get(metric)
+            if old is None or new is None:
+                continue
+            change = f"{(new - old) / old * 100:+.0f}%" if old else "-"
+            print(f"{name:<24}{metric:<22}{old:>12}{new:>12}{change:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="по умолчанию DATABASE_URL")
+    parser.add_argument("--requests", type=int, default=200, help="запросов на сценарий")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--scenarios", nargs="*", choices=_scenario_names())
+    parser.add_argument("--reseed", action="store_true", help="заполнить базу перед тестом")
+    parser.add_argument("--printers", type=int, default=1000)
+    parser.add_argument("--models", type=int, default=500)
+    parser.add_argument("--printings", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="файл для результата в JSON")
+    parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    args = parser.parse_args()
+
+    result = run(args)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+    else:
+        print(json.dumps(result, indent=2))
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Заполнение базы синтетической фермой для бенчмарков.
+
+База берётся из DATABASE_URL (или --database-url), поэтому можно заполнить и
+локальный Postgres, и файл SQLite. Данные детерминированы: при одинаковых
+параметрах и --seed получается одна и та же ферма.
+
+Запуск из каталога backend:
+    python benchmarks/seed.py --database-url sqlite:///bench.db --printers 1000 --models 500 --printings 5000000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Сколько строк вставлять одной пачкой
+CHUNK_SIZE = 10000
+
+PRINTER_MODELS = ["Creality Ender 3 V2", "Prusa MK4", "Bambu Lab X1C", "Voron 2.4", "Anycubic Kobra 2"]
+NOZZLES = ["0.2", "0.4", "0.6", "0.8"]
+
+
+def _insert(conn, table, rows):
+    for start in range(0, len(rows), CHUNK_SIZE):
+        conn.execute(table.insert(), rows[start:start + CHUNK_SIZE])
+
+
+def _printings(rng: random.Random, count: int, printer_ids, model_times, days: int, now: datetime):
+    """Завершённые и отменённые печати, равномерно распределённые по последним days дням"""
+    model_ids = list(model_times)
+    span = days * 24 * 3600
+    for _ in range(count):
+        model_id = rng.choice(model_ids)
+        planned = model_times[model_id]
+        start = now - timedelta(seconds=rng.uniform(0, span))
+        downtime = rng.expovariate(1 / 10) if rng.random() < 0.2 else 0.0
+        cancelled = rng.random() < 0.1
+        actual = planned * (rng.uniform(0.05, 0.9) if cancelled else rng.lognormvariate(0, 0.1))
+        yield {
+            "printer_id": rng.choice(printer_ids),
+            "model_id": model_id,
+            "start_time": start,
+            "printing_time": planned,
+            "calculated_time_stop": start + timedelta(minutes=planned),
+            "real_time_stop": start + timedelta(minutes=actual + downtime),
+            "downtime": downtime,
+            "status": "cancelled" if cancelled else "completed",
+            "stop_reason": "other" if cancelled else "finished",
+        }
+
+
+def seed_database(engine, printers: int = 1000, models_count: int = 500, printings: int = 100000,
+                  days: int = 365, seed: int = 42, reset: bool = True) -> dict:
+    """
+    Создаёт ферму: принтеры с параметрами, модели, историю печатей и текущие
+    печати на занятых принтерах. Возвращает число вставленных строк.
+    """
+    from sqlalchemy import select
+    import models
+    from database import Base
+
+    if reset:
+        Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    rng = random.Random(seed)
+    now = datetime.now()
+    started = time.perf_counter()
+
+    with engine.begin() as conn:
+        model_rows = [
+            {"name": f"bench-model-{i:05d}", "printing_time": round(rng.lognormvariate(4.5, 0.8), 1)}
+            for i in range(1, models_count + 1)
+        ]
+        _insert(conn, models.Model.__table__, model_rows)
+        # id не задаём явно, иначе последовательности Postgres отстанут от данных
+        model_times = dict(conn.execute(
+            select(models.Model.id, models.Model.printing_time).order_by(models.Model.id)
+        ).all())
+
+        printer_rows = []
+        for i in range(1, printers + 1):
+            roll = rng.random()
+            status = "printing" if roll < 0.3 else "paused" if roll < 0.35 else "error" if roll < 0.37 else "idle"
+            printer_rows.append({
+                "name": f"bench-printer-{i:05d}",
+                "model": rng.choice(PRINTER_MODELS),
+                "status": status,
+                "total_print_time": 0.0,
+                "total_downtime": 0.0,
+                "created_at": now - timedelta(days=days),
+            })
+        _insert(conn, models.Printer.__table__, printer_rows)
+        printer_rows = [
+            {"id": printer_id, "status": status} for printer_id, status in conn.execute(
+                select(models.Printer.id, models.Printer.status).order_by(models.Printer.id)
+            )
+        ]
+
+        parameter_rows = []
+        for row in printer_rows:
+            nozzle = rng.choice(NOZZLES)
+            parameter_rows.append({"printer_id": row["id"], "name": "nozzle", "value": nozzle,
+                                   "value_num": float(nozzle), "created_at": now})
+            bed = rng.choice([220, 250, 300, 350])
+            parameter_rows.append({"printer_id": row["id"], "name": "bed_size", "value": str(bed),
+                                   "value_num": float(bed), "created_at": now})
+        _insert(conn, models.PrinterParameter.__table__, parameter_rows)
+
+        # Текущие печати занятых принтеров
+        active_rows = []
+        for row in printer_rows:
+            if row["status"] not in ("printing", "paused"):
+                continue
+            model_id = rng.choice(list(model_times))
+            planned = model_times[model_id]
+            start = now - timedelta(minutes=rng.uniform(0, planned))
+            active_rows.append({
+                "printer_id": row["id"],
+                "model_id": model_id,
+                "start_time": start,
+                "printing_time": planned,
+                "calculated_time_stop": start + timedelta(minutes=planned),
+                "downtime": 0.0,
+                "status": row["status"],
+                "pause_time": now - timedelta(minutes=5) if row["status"] == "paused" else None,
+            })
+        _insert(conn, models.Printing.__table__, active_rows)
+
+        # История вставляется потоком, чтобы 5M строк не держать в памяти
+        history = _printings(rng, printings, [row["id"] for row in printer_rows], model_times, days, now)
+        inserted = 0
+        while True:
+            chunk = [row for _, row in zip(range(CHUNK_SIZE), history)]
+            if not chunk:
+                break
+            conn.execute(models.Printing.__table__.insert(), chunk)
+            inserted += len(chunk)
+
+    # Указатели принтеров на текущие печати и счётчики статусов - как при старте приложения
+    from sqlalchemy.orm import Session
+    from dal import printer as printer_dal
+    import quantiles
+    import status_counters
+    with Session(bind=engine) as db:
+        printer_dal.backfill_activity(db)
+        status_counters.rebuild(db)
+        quantiles.rebuild(db)
+
+    return {
+        "printers": len(printer_rows),
+        "printer_parameters": len(parameter_rows),
+        "models": len(model_rows),
+        "printings": inserted + len(active_rows),
+        "active_printings": len(active_rows),
+        "seconds": round(time.perf_counter() - started, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="по умолчанию DATABASE_URL")
+    parser.add_argument("--printers", type=int, default=1000)
+    parser.add_argument("--models", type=int, default=500)
+    parser.add_argument("--printings", type=int, default=100000)
+    parser.add_argument("--days", type=int, default=365, help="за сколько дней строить историю печатей")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keep", action="store_true", help="не удалять существующие таблицы")
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    from database import engine
+
+    result = seed_database(engine, args.printers, args.models, args.printings, args.days, args.seed,
+                           reset=not args.keep)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
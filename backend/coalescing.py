@@ -0,0 +1,146 @@
+"""
+Объединение одинаковых запросов к дорогим отчётам (single-flight) и кеш их результатов.
+
+Пока результат по ключу считается, остальные запросы с тем же ключом ждут его
+и получают тот же ответ, а не запускают такой же запрос к базе. Готовый
+результат свежий ttl секунд; следующие stale_ttl секунд он ещё отдаётся сразу,
+а пересчёт идёт в фоне (stale-while-revalidate). Счётчики показывают, сколько
+вычислений удалось не делать (/metrics/).
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Фоновые пересчёты устаревших результатов
+_refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="coalescing")
+
+_caches: Dict[str, "CoalescingCache"] = {}
+_registry_lock = threading.Lock()
+
+
+class _Flight:
+    """Одно идущее вычисление, которого ждут запросы с тем же ключом"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class _Entry:
+    def __init__(self, value: Any):
+        self.value = value
+        self.computed_at = time.monotonic()
+
+
+class CoalescingCache:
+    """Результаты по ключу (например, эндпоинт и параметры) и идущие вычисления"""
+
+    def __init__(self, name: str, ttl: float, stale_ttl: float = 0.0, max_entries: int = 256):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._stats = dict.fromkeys(
+            ["requests", "fresh_hits", "stale_hits", "coalesced", "computations", "refreshes", "errors"], 0
+        )
+
+    def get(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        with self._lock:
+            self._stats["requests"] += 1
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = time.monotonic() - entry.computed_at
+                if age < self.ttl:
+                    self._stats["fresh_hits"] += 1
+                    self._entries.move_to_end(key)
+                    return entry.value
+                if age < self.ttl + self.stale_ttl:
+                    self._stats["stale_hits"] += 1
+                    if key not in self._flights:
+                        self._flights[key] = _Flight()
+                        self._stats["refreshes"] += 1
+                        _refresh_executor.submit(self._compute, key, compute, self._flights[key])
+                    return entry.value
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self._stats["coalesced"] += 1
+        if leader:
+            self._compute(key, compute, flight)
+        else:
+            flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    def _compute(self, key: Hashable, compute: Callable[[], Any], flight: _Flight):
+        try:
+            flight.value = compute()
+        except Exception as e:
+            flight.error = e
+            logger.error("Error computing %s %s: %s", self.name, key, e)
+        with self._lock:
+            self._stats["computations"] += 1
+            if flight.error is None:
+                self._entries[key] = _Entry(flight.value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            else:
+                self._stats["errors"] += 1
+            self._flights.pop(key, None)
+        flight.done.set()
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        # Сколько запросов обошлись без собственного вычисления
+        stats["saved"] = stats["requests"] - stats["computations"] + stats["refreshes"]
+        stats["ttl"], stats["stale_ttl"] = self.ttl, self.stale_ttl
+        return stats
+
+    def reset_stats(self):
+        with self._lock:
+            for name in self._stats:
+                self._stats[name] = 0
+
+
+def get_cache(name: str, ttl: float, stale_ttl: float = 0.0, max_entries: int = 256) -> CoalescingCache:
+    """Кеш с данным именем (создаётся при первом обращении); имя - ключ в метриках"""
+    with _registry_lock:
+        cache = _caches.get(name)
+        if cache is None:
+            cache = _caches[name] = CoalescingCache(name, ttl, stale_ttl, max_entries)
+        return cache
+
+
+def get_stats() -> Dict[str, Dict[str, Any]]:
+    with _registry_lock:
+        caches = list(_caches.values())
+    return {cache.name: cache.stats() for cache in sorted(caches, key=lambda c: c.name)}
+
+
+def reset_stats():
+    with _registry_lock:
+        caches = list(_caches.values())
+    for cache in caches:
+        cache.reset_stats()
@@ -1,3 +1,4 @@
 from . import printer
 from . import model
 from . import printing
+from . import queue
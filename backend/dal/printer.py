@@ -1,8 +1,14 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import case, desc, func, select
+from typing import Dict, List, Optional, Tuple, Union
 import models
 from schemas import PrinterCreate
 from sqlalchemy.exc import IntegrityError
+import logging
+import math
+import re
+
+logger = logging.getLogger(__name__)
 
 def create(db: Session, printer: PrinterCreate):
     # Check if printer with this name already exists
@@ -35,15 +41,146 @@ def get(db: Session, printer_id: int):
     try:
         return db.query(models.Printer).filter(models.Printer.id == printer_id).first()
     except Exception as e:
-        print(f"Database error in printer.get: {str(e)}")
+        logger.error("Database error in printer.get: %s", e)
         return None
 
-def get_all(db: Session, skip: int = 0, limit: int = 100, sort_by: str = None, sort_desc: bool = False):
-    query = db.query(models.Printer)
+def get_by_current_printing(db: Session, printing_id: int):
+    return db.query(models.Printer).filter(models.Printer.current_printing_id == printing_id).all()
+
+# Операторы сравнения для фильтра по параметрам
+CAPABILITY_OPERATORS = {
+    "=": lambda column, value: column == value,
+    "!=": lambda column, value: column != value,
+    ">=": lambda column, value: column >= value,
+    "<=": lambda column, value: column <= value,
+    ">": lambda column, value: column > value,
+    "<": lambda column, value: column < value,
+}
+
+# То же правило, что в migration_parameter_index.sql: без экспоненты, nan и inf
+NUMBER_PATTERN = re.compile(r"-?[0-9]+([.,][0-9]+)?")
+
+def parse_number(value: Optional[str]) -> Optional[float]:
+    """Числовое значение параметра (0.4, "0,4", " 220 ") или None"""
+    if value is None:
+        return None
+    # TRIM в миграции убирает только пробелы
+    text = str(value).strip(" ")
+    if not NUMBER_PATTERN.fullmatch(text):
+        return None
+    number = float(text.replace(",", "."))
+    return number if math.isfinite(number) else None
+
+def capability_filter(name: str, operator: str, value: Union[str, float]):
+    """
+    Подзапрос printer_id принтеров, у которых есть параметр name, удовлетворяющий условию.
+    Числа сравниваются по value_num, строки - по value; оба варианта идут по индексу (name, значение).
+    """
+    compare = CAPABILITY_OPERATORS[operator]
+    number = parse_number(value)
+    if number is not None:
+        condition = compare(models.PrinterParameter.value_num, number)
+    else:
+        condition = compare(models.PrinterParameter.value, str(value))
+    return select(models.PrinterParameter.printer_id).where(
+        models.PrinterParameter.name == name,
+        condition
+    )
+
+# Статусы принтера, занятого печатью
+ACTIVE_STATUSES = ["printing", "paused"]
+
+def _filtered_page(query, skip: int, limit: int, sort_by: str = None, sort_desc: bool = False,
+                   status: Union[str, List[str], None] = None,
+                   capabilities: Optional[List[Tuple[str, str, str]]] = None,
+                   name_prefix: Optional[str] = None, active_only: bool = False):
+    if status:
+        statuses = [status] if isinstance(status, str) else status
+        query = query.filter(models.Printer.status.in_(statuses))
+    if active_only:
+        query = query.filter(models.Printer.status.in_(ACTIVE_STATUSES))
+    if name_prefix:
+        # LIKE 'prefix%' с экранированием % и _ - идёт по индексу idx_printers_name_prefix
+        query = query.filter(models.Printer.name.startswith(name_prefix, autoescape=True))
+    for name, operator, value in capabilities or []:
+        query = query.filter(models.Printer.id.in_(capability_filter(name, operator, value)))
     if sort_by and hasattr(models.Printer, sort_by):
         order_by = desc(getattr(models.Printer, sort_by)) if sort_desc else getattr(models.Printer, sort_by)
         query = query.order_by(order_by)
-    return query.offset(skip).limit(limit).all()
+    return query.offset(skip).limit(limit)
+
+def get_all(db: Session, skip: int = 0, limit: int = 100, sort_by: str = None, sort_desc: bool = False,
+            status: Optional[str] = None, capabilities: Optional[List[Tuple[str, str, str]]] = None,
+            with_parameters: bool = False):
+    query = db.query(models.Printer)
+    if with_parameters:
+        # Параметры всей страницы одним SELECT ... IN вместо ленивой загрузки на каждый принтер
+        query = query.options(selectinload(models.Printer.parameters))
+    return _filtered_page(query, skip, limit, sort_by, sort_desc, status, capabilities).all()
+
+def get_all_rows(db: Session, skip: int = 0, limit: int = 100, sort_by: str = None, sort_desc: bool = False,
+                 status: Union[str, List[str], None] = None,
+                 capabilities: Optional[List[Tuple[str, str, str]]] = None,
+                 name_prefix: Optional[str] = None, active_only: bool = False):
+    """Страница принтеров кортежами (Row) только с колонками списка"""
+    query = db.query(
+        models.Printer.id,
+        models.Printer.name,
+        models.Printer.model,
+        models.Printer.status,
+        models.Printer.total_print_time,
+        models.Printer.total_downtime,
+        models.Printer.current_printing_id,
+        models.Printer.last_activity_at,
+    )
+    return _filtered_page(query, skip, limit, sort_by, sort_desc, status, capabilities,
+                          name_prefix, active_only).all()
+
+# Сколько принтеров загружать одним запросом параметров
+PARAMETERS_BATCH_SIZE = 10000
+
+def get_parameters_for(db: Session, printer_ids: List[int]) -> Dict[int, List[dict]]:
+    """Параметры набора принтеров одним запросом: printer_id -> список параметров"""
+    parameters: Dict[int, List[dict]] = {printer_id: [] for printer_id in printer_ids}
+    # Обычная страница укладывается в один запрос; огромные разбиваются, чтобы не упереться
+    # в лимит параметров SQLite
+    for start in range(0, len(printer_ids), PARAMETERS_BATCH_SIZE):
+        rows = db.query(
+            models.PrinterParameter.name,
+            models.PrinterParameter.value,
+            models.PrinterParameter.id,
+            models.PrinterParameter.printer_id,
+            models.PrinterParameter.created_at,
+        ).filter(
+            models.PrinterParameter.printer_id.in_(printer_ids[start:start + PARAMETERS_BATCH_SIZE])
+        ).order_by(models.PrinterParameter.id).all()
+        for row in rows:
+            parameters[row.printer_id].append(row._asdict())
+    return parameters
+
+def backfill_activity(db: Session) -> int:
+    """
+    Заполняет current_printing_id и last_activity_at у принтеров, где их ещё нет
+    (данные, созданные до появления колонок). Один UPDATE с коррелированными подзапросами.
+    """
+    printer, printing = models.Printer, models.Printing
+    own = printing.printer_id == printer.id
+    active = select(printing.id).where(own, printing.real_time_stop.is_(None)) \
+        .order_by(printing.start_time.desc()).limit(1).scalar_subquery()
+    latest = select(printing.id).where(own).order_by(printing.start_time.desc()).limit(1).scalar_subquery()
+    last_activity = select(
+        func.max(func.coalesce(printing.real_time_stop, printing.pause_time, printing.start_time))
+    ).where(own).scalar_subquery()
+    count = db.query(printer).filter(printer.last_activity_at.is_(None)).update({
+        printer.current_printing_id: case(
+            (printer.status.in_(["printing", "paused", "error"]), active),
+            (printer.status == "waiting", latest),
+            else_=None
+        ),
+        printer.last_activity_at: last_activity,
+    }, synchronize_session=False)
+    db.commit()
+    return count
 
 def update(db: Session, printer_id: int, printer_data: dict):
     db_printer = get(db, printer_id)
@@ -71,6 +208,7 @@ def add_parameter(db: Session, printer_id: int, param_name: str, param_value: st
     if existing_param:
         # Update existing parameter
         existing_param.value = param_value
+        existing_param.value_num = parse_number(param_value)
         db.commit()
         db.refresh(existing_param)
         return existing_param
@@ -79,7 +217,8 @@ def add_parameter(db: Session, printer_id: int, param_name: str, param_value: st
     db_param = models.PrinterParameter(
         printer_id=printer_id,
         name=param_name,
-        value=param_value
+        value=param_value,
+        value_num=parse_number(param_value)
     )
     db.add(db_param)
     db.commit()
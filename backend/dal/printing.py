@@ -1,12 +1,18 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from sqlalchemy import DateTime, and_, case, desc, func, literal, null, or_
+from typing import List, NamedTuple, Optional
 import models
+from .sql import date_trunc, epoch
 from schemas import PrintingCreate
 from datetime import datetime
 
-def create(db: Session, printing_data: dict):
+def create(db: Session, printing_data: dict, printer: Optional[models.Printer] = None):
     db_printing = models.Printing(**printing_data)
     db.add(db_printing)
+    if printer is not None:
+        # Указатель принтера на печать пишется в той же транзакции
+        printer.current_printing = db_printing
+        printer.last_activity_at = db_printing.start_time
     db.commit()
     db.refresh(db_printing)
     return db_printing
@@ -14,12 +20,180 @@ def create(db: Session, printing_data: dict):
 def get(db: Session, printing_id: int):
     return db.query(models.Printing).filter(models.Printing.id == printing_id).first()
 
-def get_all(db: Session, skip: int = 0, limit: int = 100, sort_by: str = None, sort_desc: bool = False):
-    query = db.query(models.Printing)
+def _sorted_page(query, skip: int, limit: int, sort_by: str = None, sort_desc: bool = False):
     if sort_by and hasattr(models.Printing, sort_by):
         order_by = desc(getattr(models.Printing, sort_by)) if sort_desc else getattr(models.Printing, sort_by)
         query = query.order_by(order_by)
-    return query.offset(skip).limit(limit).all()
+    return query.offset(skip).limit(limit)
+
+def get_all(db: Session, skip: int = 0, limit: int = 100, sort_by: str = None, sort_desc: bool = False):
+    return _sorted_page(db.query(models.Printing), skip, limit, sort_by, sort_desc).all()
+
+# Статусы печати, которая ещё идёт
+ACTIVE_STATUSES = ["printing", "paused"]
+
+class PrintingFilters(NamedTuple):
+    """Фильтры списка печатей; каждый превращается в условие WHERE по индексированным колонкам"""
+    statuses: Optional[List[str]] = None
+    printer_ids: Optional[List[int]] = None
+    model_ids: Optional[List[int]] = None
+    started_from: Optional[datetime] = None   # start_time >= started_from
+    started_to: Optional[datetime] = None     # start_time < started_to
+    active_only: bool = False                 # идущие печати - по частичному индексу idx_printings_active
+
+def apply_filters(query, filters: Optional[PrintingFilters]):
+    if filters is None:
+        return query
+    printing = models.Printing
+    if filters.statuses:
+        query = query.filter(printing.status.in_(filters.statuses))
+    if filters.printer_ids:
+        query = query.filter(printing.printer_id.in_(filters.printer_ids))
+    if filters.model_ids:
+        query = query.filter(printing.model_id.in_(filters.model_ids))
+    if filters.started_from is not None:
+        query = query.filter(printing.start_time >= filters.started_from)
+    if filters.started_to is not None:
+        query = query.filter(printing.start_time < filters.started_to)
+    if filters.active_only:
+        # То же условие, что у частичного индекса, иначе планировщик его не возьмёт
+        query = query.filter(printing.real_time_stop.is_(None), printing.status.in_(ACTIVE_STATUSES))
+    return query
+
+def progress_columns(now: datetime):
+    """
+    Прогресс (0-100) и секунды до окончания печати, вычисляемые в запросе.
+    Пауза учитывается сразу: пока печать стоит, прогресс не растёт, а окончание
+    сдвигается на длительность паузы (после возобновления это делает
+    calculated_time_stop, а прошлые паузы уже учтены в downtime).
+    """
+    printing = models.Printing
+    now_s = epoch(literal(now, DateTime()))
+    start_s = epoch(printing.start_time)
+    downtime_s = func.coalesce(printing.downtime, 0.0) * 60
+    # Сколько секунд длится текущая пауза
+    pause_s = case(
+        (and_(printing.status == "paused", printing.pause_time.isnot(None)), now_s - epoch(printing.pause_time)),
+        else_=0.0
+    )
+    planned_stop_s = func.coalesce(
+        epoch(printing.calculated_time_stop),
+        start_s + downtime_s + func.coalesce(printing.printing_time, 0.0) * 60
+    )
+    total_s = planned_stop_s - start_s - downtime_s
+    printed_s = now_s - pause_s - start_s - downtime_s
+    finished = or_(printing.real_time_stop.isnot(None), printing.status.in_(["completed", "cancelled"]))
+
+    progress = case(
+        (finished, 100.0),
+        (printing.start_time.is_(None), 0.0),
+        (total_s <= 0, case((printing.calculated_time_stop.isnot(None), 100.0), else_=0.0)),
+        (printed_s >= total_s, 100.0),
+        (printed_s <= 0, 0.0),
+        else_=printed_s * 100.0 / total_s
+    )
+    remaining = case((finished, null()), else_=planned_stop_s + pause_s - now_s)
+    return progress.label("progress"), remaining.label("remaining_seconds")
+
+def _list_query(db: Session, now: datetime):
+    """Колонки списка печатей с именами принтера и модели и прогрессом одним запросом"""
+    progress, remaining = progress_columns(now)
+    query = db.query(
+        models.Printing.id,
+        models.Printing.printer_id,
+        models.Printing.model_id,
+        models.Printing.printing_time,
+        models.Printing.start_time,
+        models.Printing.calculated_time_stop,
+        models.Printing.real_time_stop,
+        models.Printing.downtime,
+        models.Printing.status,
+        models.Printing.pause_time,
+        models.Printing.stop_reason,
+        models.Printing.printing_time_std,
+        models.Printer.name.label("printer_name"),
+        models.Model.name.label("model_name"),
+        progress,
+        remaining,
+    ).outerjoin(
+        models.Printer, models.Printer.id == models.Printing.printer_id
+    ).outerjoin(
+        models.Model, models.Model.id == models.Printing.model_id
+    )
+    return query, progress, remaining
+
+def get_all_rows(db: Session, now: datetime, skip: int = 0, limit: int = 100, sort_by: str = None,
+                 sort_desc: bool = False, filters: Optional[PrintingFilters] = None):
+    """
+    Страница печатей для списка: только нужные колонки, имена принтера и модели
+    и прогресс одним запросом; возвращает кортежи (Row), а не ORM-объекты.
+    """
+    query, _, _ = _list_query(db, now)
+    return _sorted_page(apply_filters(query, filters), skip, limit, sort_by, sort_desc).all()
+
+def get_active_rows(db: Session, now: datetime, skip: int = 0, limit: int = 100, sort_by: str = None,
+                    sort_desc: bool = False, status: Optional[str] = None, min_progress: Optional[float] = None,
+                    max_progress: Optional[float] = None, finishing_within: Optional[float] = None):
+    """
+    Идущие печати с фильтрами и сортировкой по прогрессу и времени до окончания
+    (sort_by="progress" или "eta"); finishing_within - в секундах, просроченные
+    печати в него тоже попадают.
+    """
+    query, progress, remaining = _list_query(db, now)
+    query = query.filter(
+        models.Printing.real_time_stop == None,
+        models.Printing.status.in_([status] if status else ACTIVE_STATUSES)
+    )
+    if min_progress is not None:
+        query = query.filter(progress >= min_progress)
+    if max_progress is not None:
+        query = query.filter(progress <= max_progress)
+    if finishing_within is not None:
+        query = query.filter(remaining <= finishing_within)
+
+    order_column = {"progress": progress, "eta": remaining}.get(sort_by)
+    if order_column is not None:
+        query = query.order_by(desc(order_column) if sort_desc else order_column, models.Printing.id)
+        return query.offset(skip).limit(limit).all()
+    return _sorted_page(query, skip, limit, sort_by, sort_desc).all()
+
+# Группировка аналитики печатей: имя -> колонка
+ANALYTICS_GROUPS = {
+    "printer": models.Printing.printer_id,
+    "model": models.Printing.model_id,
+    "status": models.Printing.status,
+}
+
+def get_bucket_stats(db: Session, unit: str, start: datetime, end: datetime, now: datetime,
+                     group_by: Optional[str] = None):
+    """
+    Печати, начатые в [start, end), по интервалам date_trunc(unit, start_time) и
+    (если задано) по принтеру, модели или статусу - агрегаты считает база.
+    Строки: bucket, key, count, print_minutes, downtime, completed, finished.
+    """
+    printing = models.Printing
+    downtime = func.coalesce(printing.downtime, 0.0)
+    # Фактическое время печати: до остановки (у идущих - до now) за вычетом простоя
+    elapsed = (
+        func.coalesce(epoch(printing.real_time_stop), epoch(literal(now, DateTime()))) - epoch(printing.start_time)
+    ) / 60.0 - downtime
+    bucket = date_trunc(unit, printing.start_time).label("bucket")
+    key = (ANALYTICS_GROUPS[group_by] if group_by else literal(None)).label("key")
+    query = db.query(
+        bucket,
+        key,
+        func.count(printing.id).label("count"),
+        func.sum(case((elapsed > 0, elapsed), else_=0.0)).label("print_minutes"),
+        func.sum(downtime).label("downtime"),
+        func.sum(case((printing.status == "completed", 1), else_=0)).label("completed"),
+        func.sum(case((printing.status.in_(["completed", "cancelled"]), 1), else_=0)).label("finished"),
+    ).filter(
+        printing.start_time >= start,
+        printing.start_time < end
+    )
+    if group_by:
+        return query.group_by(bucket, key).all()
+    return query.group_by(bucket).all()
 
 def update(db: Session, printing_id: int, printing_data: dict):
     db_printing = get(db, printing_id)
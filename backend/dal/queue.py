@@ -0,0 +1,65 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import desc, or_
+from typing import List
+import models
+from schemas import PrintQueueCreate
+
+def create(db: Session, item: PrintQueueCreate):
+    db_item = models.PrintQueue(**item.dict())
+    db.add(db_item)
+    db.commit()
+    db.refresh(db_item)
+    return db_item
+
+def get(db: Session, item_id: int, for_update: bool = False):
+    query = db.query(models.PrintQueue).filter(models.PrintQueue.id == item_id)
+    if for_update:
+        # Блокировка до коммита: диспетчер (SKIP LOCKED) не возьмёт строку, пока её меняют
+        query = query.with_for_update()
+    return query.first()
+
+def get_all(db: Session, skip: int = 0, limit: int = 100, status: str = None):
+    query = db.query(models.PrintQueue)
+    if status:
+        query = query.filter(models.PrintQueue.status == status)
+    query = query.order_by(desc(models.PrintQueue.priority), models.PrintQueue.created_at)
+    return query.offset(skip).limit(limit).all()
+
+def update(db: Session, item_id: int, item_data: dict):
+    db_item = get(db, item_id, for_update=True)
+    if db_item:
+        for key, value in item_data.items():
+            setattr(db_item, key, value)
+        db.commit()
+        db.refresh(db_item)
+    return db_item
+
+def delete(db: Session, item_id: int):
+    db_item = get(db, item_id)
+    if db_item:
+        db.delete(db_item)
+        db.commit()
+    return db_item
+
+def claim_idle_printers(db: Session, limit: int):
+    """
+    Блокирует свободные принтеры для назначения заданий.
+    SKIP LOCKED позволяет нескольким диспетчерам работать параллельно:
+    принтеры, уже захваченные другой транзакцией, просто пропускаются.
+    """
+    return db.query(models.Printer).filter(
+        models.Printer.status == "idle"
+    ).order_by(models.Printer.id).limit(limit).with_for_update(skip_locked=True).all()
+
+def claim_queued(db: Session, limit: int, printer_ids: List[int]):
+    """
+    Блокирует задания очереди в порядке приоритета и времени постановки - только
+    те, что можно выполнить на принтерах printer_ids: без привязки или привязанные
+    к одному из них. Задания, ждущие занятый принтер, не занимают место в лимите.
+    """
+    return db.query(models.PrintQueue).filter(
+        models.PrintQueue.status == "queued",
+        or_(models.PrintQueue.printer_id.is_(None), models.PrintQueue.printer_id.in_(printer_ids))
+    ).order_by(
+        desc(models.PrintQueue.priority), models.PrintQueue.created_at, models.PrintQueue.id
+    ).limit(limit).with_for_update(skip_locked=True).all()
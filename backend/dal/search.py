@@ -0,0 +1,75 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import case, desc, func, or_
+from typing import Dict, List
+import models
+
+# Есть ли pg_trgm в базе: engine -> bool (проверяется один раз)
+_trigram_support: Dict[object, bool] = {}
+
+def has_trigrams(db: Session) -> bool:
+    """Postgres с расширением pg_trgm: поиск идёт по GIN-индексам и ранжируется по похожести"""
+    bind = db.get_bind()
+    if bind not in _trigram_support:
+        _trigram_support[bind] = bind.dialect.name == "postgresql" and db.connection().exec_driver_sql(
+            "SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'"
+        ).first() is not None
+    return _trigram_support[bind]
+
+def _like_pattern(query: str, prefix: str = "%", suffix: str = "%") -> str:
+    return prefix + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + suffix
+
+def _trigram_query(db: Session, columns: list, fields: list, query: str, limit: int):
+    """
+    Подстрока (ILIKE '%q%') или похожая строка (оператор % - опечатки); оба условия
+    идут по GIN-индексам gin_trgm_ops. Сначала имена, начинающиеся с запроса, затем по похожести.
+    """
+    pattern = _like_pattern(query)
+    conditions = [field.ilike(pattern, escape="\\") for field in fields] + [field.op("%")(query) for field in fields]
+    similarities = [func.coalesce(func.similarity(field, query), 0.0) for field in fields]
+    score = (func.greatest(*similarities) if len(similarities) > 1 else similarities[0]).label("score")
+    prefix = case((fields[0].ilike(_like_pattern(query, prefix=""), escape="\\"), 1), else_=0)
+    return db.query(*columns, score).filter(or_(*conditions)) \
+        .order_by(desc(prefix), desc(score), fields[0]).limit(limit).all()
+
+def _portable_query(db: Session, columns: list, fields: list, query: str, limit: int):
+    """
+    Без pg_trgm (SQLite, Postgres без расширения): подстрока без учёта регистра.
+    Ранг: совпадение имени целиком, начало имени, начало слова в имени, подстрока
+    в имени, подстрока в остальных полях.
+    """
+    if db.get_bind().dialect.name == "sqlite":
+        # LIKE в SQLite и так не различает регистр (ASCII); ilike превратился бы
+        # в lower(...) LIKE lower(...) и замедлил просмотр таблицы в разы
+        def like(field, pattern):
+            return field.like(pattern, escape="\\")
+    else:
+        def like(field, pattern):
+            return field.ilike(pattern, escape="\\")
+
+    name = fields[0]
+    rank = case(
+        (like(name, _like_pattern(query, "", "")), 1.0),
+        (like(name, _like_pattern(query, prefix="")), 0.8),
+        (like(name, _like_pattern(query, prefix="% ")), 0.6),
+        (like(name, _like_pattern(query)), 0.4),
+        else_=0.2
+    ).label("score")
+    conditions = [like(field, _like_pattern(query)) for field in fields]
+    return db.query(*columns, rank).filter(or_(*conditions)) \
+        .order_by(desc(rank), func.length(name), name).limit(limit).all()
+
+def _search(db: Session, columns: list, fields: list, query: str, limit: int):
+    if has_trigrams(db):
+        return _trigram_query(db, columns, fields, query, limit)
+    return _portable_query(db, columns, fields, query, limit)
+
+def search_printers(db: Session, query: str, limit: int = 10) -> List:
+    """Принтеры по имени или модели принтера; строки (id, name, model, status, score)"""
+    printer = models.Printer
+    return _search(db, [printer.id, printer.name, printer.model, printer.status],
+                   [printer.name, printer.model], query, limit)
+
+def search_models(db: Session, query: str, limit: int = 10) -> List:
+    """Модели по имени; строки (id, name, printing_time, score)"""
+    model = models.Model
+    return _search(db, [model.id, model.name, model.printing_time], [model.name], query, limit)
@@ -0,0 +1,72 @@
+"""
+SQL-выражения, которые по-разному записываются в Postgres и SQLite.
+"""
+from sqlalchemy import DateTime, Float, literal_column
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.expression import FunctionElement
+
+
+class epoch(FunctionElement):
+    """Время (TIMESTAMP без часового пояса) в секундах от эпохи - для арифметики над датами в запросе"""
+    type = Float()
+    inherit_cache = True
+    name = "epoch"
+
+
+@compiles(epoch)
+def _epoch_default(element, compiler, **kw):
+    # В новых Postgres EXTRACT возвращает numeric - приводим, чтобы арифметика шла во float
+    return "CAST(EXTRACT(EPOCH FROM %s) AS DOUBLE PRECISION)" % compiler.process(element.clauses, **kw)
+
+
+@compiles(epoch, "sqlite")
+def _epoch_sqlite(element, compiler, **kw):
+    return "((julianday(%s) - 2440587.5) * 86400.0)" % compiler.process(element.clauses, **kw)
+
+
+# Единицы date_trunc и формат начала интервала для SQLite (strftime и модификаторы)
+TRUNC_UNITS = {
+    "hour": ("%Y-%m-%d %H:00:00",),
+    "day": ("%Y-%m-%d 00:00:00",),
+    # Понедельник недели, как date_trunc('week') в Postgres
+    "week": ("%Y-%m-%d 00:00:00", "weekday 0", "-6 days"),
+    "month": ("%Y-%m-01 00:00:00",),
+}
+
+
+class date_trunc(FunctionElement):
+    """Начало интервала (hour, day, week, month), в который попадает время"""
+    type = DateTime()
+    inherit_cache = True
+    name = "date_trunc"
+
+    def __init__(self, unit, expr):
+        if unit not in TRUNC_UNITS:
+            raise ValueError(f"Unknown date_trunc unit: {unit}")
+        self.unit = unit
+        # Единица - литерал в тексте запроса: одинаковое выражение в SELECT и GROUP BY
+        super().__init__(literal_column(f"'{unit}'"), expr)
+
+
+@compiles(date_trunc)
+def _date_trunc_default(element, compiler, **kw):
+    return "date_trunc(%s)" % compiler.process(element.clauses, **kw)
+
+
+@compiles(date_trunc, "sqlite")
+def _date_trunc_sqlite(element, compiler, **kw):
+    expr = compiler.process(element.clauses.clauses[1], **kw)
+    fmt, *modifiers = TRUNC_UNITS[element.unit]
+    return "strftime(%s)" % ", ".join(["'%s'" % fmt, expr] + ["'%s'" % m for m in modifiers])
+
+
+def insert_missing(db: Session, model, **values):
+    """
+    INSERT ... ON CONFLICT DO NOTHING: создаёт строку, если её ещё нет, не падая,
+    когда параллельная транзакция успела вставить такую же. После него строку
+    можно читать с FOR UPDATE - она точно есть.
+    """
+    insert = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+    db.execute(insert(model).values(**values).on_conflict_do_nothing())
@@ -6,10 +6,15 @@ import os
 # Get database URL from environment variable or use default
 SQLALCHEMY_DATABASE_URL = os.environ.get("DATABASE_URL", "postgresql://postgres:postgres@db:5432/3d_printer_db")
 
-# Create engine with proper encoding
+# Create engine with proper encoding (SQLite is used for local runs and benchmarks)
+if SQLALCHEMY_DATABASE_URL.startswith("sqlite"):
+    connect_args = {"check_same_thread": False}
+else:
+    connect_args = {"client_encoding": "utf8"}
+
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
-    connect_args={"client_encoding": "utf8"}
+    connect_args=connect_args
 )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
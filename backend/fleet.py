@@ -0,0 +1,102 @@
+"""
+Снимок фермы для дашборда: принтеры с идущими печатями и прогрессом, последние
+печати, счётчики статусов и эффективность - одним согласованным чтением.
+
+Снимок собирается не чаще раза в FLEET_SNAPSHOT_TTL секунд (coalescing.py): все
+дашборды, обновляющиеся одновременно, получают один и тот же результат, а пока
+он строится, остальные запросы ждут его, а не идут в базу сами.
+"""
+import os
+from datetime import datetime
+from typing import Any, Dict
+
+from sqlalchemy.orm import Session
+
+import coalescing
+import models
+from database import SessionLocal
+from dal import printing as printing_dal
+from services import printing as printing_service
+
+# Сколько секунд снимок считается свежим
+FLEET_SNAPSHOT_TTL = float(os.environ.get("FLEET_SNAPSHOT_TTL", "2"))
+# Сколько секунд после этого устаревший снимок ещё отдаётся, пока строится новый
+FLEET_SNAPSHOT_STALE_TTL = float(os.environ.get("FLEET_SNAPSHOT_STALE_TTL", "10"))
+# Сколько последних печатей отдавать в снимке
+RECENT_PRINTINGS = 5
+
+STATUS_COUNTS = ["idle", "printing", "paused", "error"]
+
+
+def _efficiency(total_print_time: float, total_downtime: float) -> float:
+    total_time = (total_print_time or 0) + (total_downtime or 0)
+    return (total_print_time or 0) / total_time * 100 if total_time > 0 else 0
+
+
+def build_snapshot(db: Session) -> Dict[str, Any]:
+    """Собирает снимок тремя запросами в одной транзакции"""
+    if db.get_bind().dialect.name == "postgresql":
+        # Все запросы видят одно и то же состояние базы
+        db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+
+    current_time = datetime.now()
+    printers = db.query(
+        models.Printer.id,
+        models.Printer.name,
+        models.Printer.model,
+        models.Printer.status,
+        models.Printer.total_print_time,
+        models.Printer.total_downtime,
+        models.Printer.current_printing_id,
+        models.Printer.last_activity_at,
+    ).order_by(models.Printer.id).all()
+    active = {
+        row.printer_id: printing_service.list_item(row, current_time)
+        for row in printing_dal.get_active_rows(db, current_time, limit=None)
+    }
+    recent = [
+        printing_service.list_item(row, current_time)
+        for row in printing_dal.get_all_rows(db, current_time, 0, RECENT_PRINTINGS, "start_time", True)
+    ]
+    db.commit()
+
+    status_counts = dict.fromkeys(STATUS_COUNTS, 0)
+    total_efficiency = 0.0
+    items = []
+    for row in printers:
+        if row.status in status_counts:
+            status_counts[row.status] += 1
+        efficiency = _efficiency(row.total_print_time, row.total_downtime)
+        total_efficiency += efficiency
+        item = row._asdict()
+        item["efficiency"] = round(efficiency, 1)
+        item["active_printing"] = active.get(row.id)
+        items.append(item)
+
+    return {
+        "generated_at": current_time,
+        "total_printers": len(items),
+        "status_counts": status_counts,
+        "average_efficiency": round(total_efficiency / len(items), 1) if items else 0,
+        "printers": items,
+        "recent_printings": recent,
+    }
+
+
+_cache = coalescing.get_cache("fleet.snapshot", FLEET_SNAPSHOT_TTL, FLEET_SNAPSHOT_STALE_TTL)
+
+
+def _build() -> Dict[str, Any]:
+    db = SessionLocal()
+    try:
+        return build_snapshot(db)
+    finally:
+        db.close()
+
+
+def get_snapshot() -> Dict[str, Any]:
+    return _cache.get("snapshot", _build)
+
+
+def invalidate():
+    _cache.invalidate()
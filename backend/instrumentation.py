@@ -0,0 +1,239 @@
+"""
+Инструментирование API: время ответа по маршрутам, число и время SQL-запросов
+на каждый запрос и выборочное профилирование обработчиков.
+
+Каждый ответ получает заголовок Server-Timing (app, db), сводные гистограммы
+доступны на /metrics, последние профили - на /metrics/profiles.
+"""
+import asyncio
+import bisect
+import cProfile
+import functools
+import io
+import os
+import pstats
+import random
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Границы корзин гистограммы времени ответа, мс
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+# Доля запросов, которые профилируются (0 - профилирование выключено)
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+# Разрешить принудительное профилирование запроса заголовком X-Profile: 1
+PROFILE_HEADER_ENABLED = os.environ.get("PROFILE_HEADER_ENABLED", "false").lower() == "true"
+# Сколько последних профилей хранить
+PROFILE_HISTORY = 20
+PROFILE_TOP_FUNCTIONS = 30
+
+
+class RequestStats:
+    """Счётчики текущего запроса; живут в contextvar и видны из потоков обработчиков"""
+
+    __slots__ = ("db_queries", "db_time", "profile")
+
+    def __init__(self, profile: bool = False):
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.profile = profile
+
+
+class RouteMetrics:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.db_queries = 0
+        self.db_ms = 0.0
+
+    def observe(self, elapsed_ms: float, status: int, stats: RequestStats):
+        self.count += 1
+        if status >= 500:
+            self.errors += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+        self.db_queries += stats.db_queries
+        self.db_ms += stats.db_time * 1000
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Оценка квантиля по гистограмме (верхняя граница корзины)"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, bucket in enumerate(self.buckets):
+            seen += bucket
+            if seen >= rank:
+                return LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+    def as_dict(self) -> Dict[str, Any]:
+        count = self.count or 1
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "mean_ms": round(self.total_ms / count, 2),
+            "max_ms": round(self.max_ms, 2),
+            "p50_ms": self.quantile(0.5),
+            "p90_ms": self.quantile(0.9),
+            "p99_ms": self.quantile(0.99),
+            "histogram_ms": dict(zip([str(b) for b in LATENCY_BUCKETS_MS] + ["+Inf"], self.buckets)),
+            "db_queries_per_request": round(self.db_queries / count, 2),
+            "db_ms_per_request": round(self.db_ms / count, 2),
+        }
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+_lock = threading.Lock()
+_routes: Dict[str, RouteMetrics] = {}
+_profiles = deque(maxlen=PROFILE_HISTORY)
+_sample_rate = PROFILE_SAMPLE_RATE
+
+
+def current_stats() -> Optional[RequestStats]:
+    return _current.get()
+
+
+def set_profile_sample_rate(rate: float):
+    global _sample_rate
+    _sample_rate = min(1.0, max(0.0, rate))
+
+
+def get_profile_sample_rate() -> float:
+    return _sample_rate
+
+
+class InstrumentationMiddleware:
+    """ASGI middleware: измеряет время запроса и добавляет заголовок Server-Timing"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile = _sample_rate > 0 and random.random() < _sample_rate
+        if not profile and PROFILE_HEADER_ENABLED:
+            profile = (b"x-profile", b"1") in scope.get("headers", [])
+        stats = RequestStats(profile)
+        token = _current.set(stats)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                timing = (
+                    f"app;dur={elapsed_ms:.1f}, "
+                    f'db;dur={stats.db_time * 1000:.1f};desc="{stats.db_queries} queries"'
+                )
+                message = dict(message)
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"server-timing", timing.encode("latin-1"))
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            route = scope.get("route")
+            # Группируем по шаблону маршрута, а не по конкретному URL
+            path = getattr(route, "path", None) or "<unmatched>"
+            key = f"{scope['method']} {path}"
+            with _lock:
+                metrics = _routes.get(key)
+                if metrics is None:
+                    metrics = _routes[key] = RouteMetrics()
+                metrics.observe(elapsed_ms, status, stats)
+            _current.reset(token)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_start"].pop()
+    stats = _current.get()
+    if stats is not None:
+        stats.db_queries += 1
+        stats.db_time += time.perf_counter() - started
+
+
+def instrument_engine(engine: Engine):
+    """Подключает подсчёт SQL-запросов к движку"""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def _profiled(route: APIRoute, call):
+    @functools.wraps(call)
+    def wrapper(*args, **kwargs):
+        stats = _current.get()
+        if stats is None or not stats.profile:
+            return call(*args, **kwargs)
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        try:
+            return profiler.runcall(call, *args, **kwargs)
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            output = io.StringIO()
+            pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(PROFILE_TOP_FUNCTIONS)
+            _profiles.append({
+                "route": f"{','.join(sorted(route.methods))} {route.path}",
+                "started_at": datetime.now(),
+                "duration_ms": round(elapsed_ms, 2),
+                "db_queries": stats.db_queries,
+                "profile": output.getvalue(),
+            })
+    return wrapper
+
+
+def instrument_routes(app):
+    """
+    Оборачивает синхронные обработчики для выборочного профилирования.
+    Обработчики выполняются в пуле потоков, поэтому профиль снимается
+    в том же потоке, где идёт работа с БД.
+    """
+    for route in app.routes:
+        if isinstance(route, APIRoute) and not getattr(route.dependant.call, "__profiled__", False):
+            if not asyncio.iscoroutinefunction(route.dependant.call):
+                route.dependant.call = _profiled(route, route.dependant.call)
+                route.dependant.call.__profiled__ = True
+
+
+def get_metrics() -> Dict[str, Any]:
+    with _lock:
+        routes = {key: metrics.as_dict() for key, metrics in sorted(_routes.items())}
+    return {
+        "routes": routes,
+        "profiling": {"sample_rate": _sample_rate, "header_enabled": PROFILE_HEADER_ENABLED},
+    }
+
+
+def get_profiles() -> List[Dict[str, Any]]:
+    return list(_profiles)
+
+
+def reset_metrics():
+    with _lock:
+        _routes.clear()
+    _profiles.clear()
@@ -1,5 +1,7 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey
-from sqlalchemy.sql import func
+from sqlalchemy import (
+    Column, Integer, String, Text, DateTime, Float, ForeignKey, Index, LargeBinary, UniqueConstraint
+)
+from sqlalchemy.sql import func, text
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
@@ -11,16 +13,30 @@ class Printer(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, unique=True, index=True)
     model = Column(String, nullable=True)  # Printer model e.g. Creality Ender 3 V2
-    status = Column(String, default="idle")  # idle, printing, waiting, paused, error
+    status = Column(String, default="idle", index=True)  # idle, printing, waiting, paused, error
     total_print_time = Column(Float, default=0.0)
     total_downtime = Column(Float, default=0.0)
     created_at = Column(DateTime, default=datetime.now)
+    # Печать, которая занимает принтер: идёт, стоит на паузе или ждёт подтверждения.
+    # Внешнего ключа нет: у секционированной td_printings id не уникален сам по себе
+    current_printing_id = Column(Integer, nullable=True)
+    # Когда на принтере последний раз начиналась, приостанавливалась, возобновлялась или заканчивалась печать
+    last_activity_at = Column(DateTime, nullable=True)
     
     # Define relationships after all classes
     printings = relationship("Printing", back_populates="printer")
+    # post_update: id новой печати известен только после её INSERT
+    current_printing = relationship("Printing", primaryjoin="foreign(Printer.current_printing_id) == Printing.id",
+                                    post_update=True)
     queue_items = relationship("PrintQueue", back_populates="printer")
     parameters = relationship("PrinterParameter", back_populates="printer", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # Фильтр списка по началу имени (name LIKE 'prefix%'): в Postgres с не-C локалью
+        # обычный индекс для LIKE не подходит
+        Index("idx_printers_name_prefix", "name", postgresql_ops={"name": "text_pattern_ops"}),
+    )
+
 class Model(Base):
     __tablename__ = "td_models"
     
@@ -44,6 +60,7 @@ class Printing(Base):
     status = Column(String, default="printing")  # printing, paused, completed, cancelled, pending_completion
     pause_time = Column(DateTime, nullable=True)
     stop_reason = Column(String, nullable=True)
+    printing_time_std = Column(Float, nullable=True)  # Разброс прогноза printing_time в минутах
     
     printer_id = Column(Integer, ForeignKey("td_printers.id"))
     model_id = Column(Integer, ForeignKey("td_models.id"))
@@ -51,12 +68,19 @@ class Printing(Base):
     printer = relationship("Printer", back_populates="printings")
     model = relationship("Model", back_populates="printings")
 
-    def __init__(self, **kwargs):
-        # Ensure printing_time is stored in minutes
-        if 'printing_time' in kwargs and kwargs['printing_time'] is not None:
-            if kwargs['printing_time'] < 10:  # If value is in hours (unlikely to have printing < 10 min)
-                kwargs['printing_time'] = kwargs['printing_time'] * 60
-        super().__init__(**kwargs)
+    __table_args__ = (
+        # Идущие печати (/printings/active): частичный индекс не растёт вместе с историей
+        Index("idx_printings_active", "status", "start_time",
+              postgresql_where=text("real_time_stop IS NULL"),
+              sqlite_where=text("real_time_stop IS NULL")),
+        # Отчёты за период (/reports/daily, /reports/printing-efficiency) - диапазон по start_time
+        Index("idx_printings_start_time", "start_time"),
+        # Печати принтера (заполнение current_printing_id, запасной поиск в stop/confirm)
+        Index("idx_printings_printer_start", "printer_id", "start_time"),
+        # Фильтры списка печатей по модели и по статусу с диапазоном start_time
+        Index("idx_printings_model_start", "model_id", "start_time"),
+        Index("idx_printings_status_start", "status", "start_time"),
+    )
 
 class PrintQueue(Base):
     __tablename__ = "print_queue"
@@ -65,8 +89,9 @@ class PrintQueue(Base):
     printer_id = Column(Integer, ForeignKey("td_printers.id"))
     model_id = Column(Integer, ForeignKey("td_models.id"))
     quantity = Column(Integer, default=1)
+    dispatched_count = Column(Integer, default=0)  # Сколько экземпляров уже отправлено на печать
     priority = Column(Integer, default=0)
-    status = Column(String, default="queued")
+    status = Column(String, default="queued")  # queued, dispatched, cancelled
     created_at = Column(DateTime, default=datetime.now)
     start_time = Column(DateTime, nullable=True)
     completed_at = Column(DateTime, nullable=True)
@@ -74,6 +99,73 @@ class PrintQueue(Base):
     printer = relationship("Printer", back_populates="queue_items")
     model = relationship("Model", back_populates="queue_items")
 
+    __table_args__ = (
+        # Выборка очереди диспетчером: WHERE status = 'queued' ORDER BY priority DESC, created_at
+        Index("idx_print_queue_dispatch", "status", priority.desc(), "created_at"),
+    )
+
+class DurationStats(Base):
+    """Потоковая статистика длительности печати (Уэлфорд): модель на принтере или на всех (printer_id = 0)"""
+    __tablename__ = "td_duration_stats"
+
+    id = Column(Integer, primary_key=True, index=True)
+    model_id = Column(Integer, ForeignKey("td_models.id"), nullable=False)
+    printer_id = Column(Integer, nullable=False, default=0)
+    count = Column(Integer, default=0)
+    mean = Column(Float, default=0.0)  # минут
+    m2 = Column(Float, default=0.0)    # сумма квадратов отклонений от среднего
+    updated_at = Column(DateTime, default=datetime.now)
+
+    __table_args__ = (
+        UniqueConstraint("model_id", "printer_id", name="uq_duration_stats_model_printer"),
+    )
+
+class DurationSketch(Base):
+    """Сжатый DDSketch длительностей печати или простоя модели либо принтера (quantiles.py)"""
+    __tablename__ = "td_duration_sketches"
+
+    id = Column(Integer, primary_key=True, index=True)
+    scope = Column(String, nullable=False)      # model или printer
+    scope_id = Column(Integer, nullable=False)
+    metric = Column(String, nullable=False)     # duration или downtime, минут
+    count = Column(Integer, default=0)
+    sketch = Column(LargeBinary, nullable=False)
+    updated_at = Column(DateTime, default=datetime.now)
+
+    __table_args__ = (
+        UniqueConstraint("scope", "scope_id", "metric", name="uq_duration_sketches_scope_metric"),
+    )
+
+class PrinterStatusCounter(Base):
+    """Число принтеров в статусе и суммы их показателей - поддерживается дельтами (status_counters.py)"""
+    __tablename__ = "td_printer_status_counters"
+
+    status = Column(String, primary_key=True)
+    printers = Column(Integer, nullable=False, default=0)
+    total_print_time = Column(Float, nullable=False, default=0.0)  # минут
+    total_downtime = Column(Float, nullable=False, default=0.0)    # минут
+    efficiency_sum = Column(Float, nullable=False, default=0.0)    # сумма эффективности принтеров, %
+
+class ReportJob(Base):
+    """Отчёт, считающийся вне запроса (report_jobs.py); result - JSON готового отчёта"""
+    __tablename__ = "td_report_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    report = Column(String, nullable=False)
+    params = Column(Text, nullable=False)        # JSON параметров в каноническом виде
+    spec_hash = Column(String, nullable=False)  # хеш отчёта и параметров - ключ переиспользования
+    status = Column(String, default="queued")   # queued, running, completed, failed
+    progress = Column(Float, default=0.0)       # 0..1
+    result = Column(Text, nullable=True)
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.now)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("idx_report_jobs_spec", "spec_hash", "created_at"),
+    )
+
 # Add this new model at the end of the file
 class PrinterParameter(Base):
     __tablename__ = "td_printer_parameters"
@@ -82,6 +174,13 @@ class PrinterParameter(Base):
     printer_id = Column(Integer, ForeignKey("td_printers.id"))
     name = Column(String, nullable=False)
     value = Column(String, nullable=True)
+    value_num = Column(Float, nullable=True)  # value, если это число - для сравнений в запросах
     created_at = Column(DateTime, default=datetime.now)
     
-    printer = relationship("Printer", back_populates="parameters")
\ No newline at end of file
+    printer = relationship("Printer", back_populates="parameters")
+
+    __table_args__ = (
+        # Обратные индексы для поиска принтеров по возможностям: name + значение -> printer_id
+        Index("idx_printer_param_name_value", "name", "value", "printer_id"),
+        Index("idx_printer_param_name_num", "name", "value_num", "printer_id"),
+    )
\ No newline at end of file
@@ -0,0 +1,356 @@
+"""
+Помесячное секционирование td_printings в Postgres и архивирование старой истории.
+
+Таблица печатей секционируется по start_time (PARTITION BY RANGE), поэтому
+отчёты с диапазоном дат читают только нужные месяцы. Фоновая задача заранее
+создаёт секции на PARTITION_MONTHS_AHEAD месяцев вперёд и уносит секции старше
+PRINTINGS_RETENTION_MONTHS в архивную таблицу или Parquet-файлы.
+
+Существующая таблица переводится командой (без остановки приложения):
+    python partitioning.py convert
+Состояние секций:
+    python partitioning.py status
+
+На SQLite и несекционированной таблице обслуживание ничего не делает.
+"""
+import argparse
+import logging
+import os
+import re
+from datetime import date, datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+import models
+
+logger = logging.getLogger(__name__)
+
+TABLE = models.Printing.__tablename__
+# Рабочее имя новой таблицы на время перевода и имя старой после него
+CONVERT_TABLE = f"{TABLE}_partitioned"
+OLD_TABLE = f"{TABLE}_unpartitioned"
+DEFAULT_PARTITION = f"{TABLE}_default"
+ARCHIVE_TABLE = f"{TABLE}_archive"
+
+# На сколько месяцев вперёд держать готовые секции
+PARTITION_MONTHS_AHEAD = int(os.environ.get("PARTITION_MONTHS_AHEAD", "3"))
+# Сколько месяцев истории хранить в основной таблице (0 - не архивировать)
+PRINTINGS_RETENTION_MONTHS = int(os.environ.get("PRINTINGS_RETENTION_MONTHS", "24"))
+# Куда уносить старые секции: table (td_printings_archive) или parquet
+PRINTINGS_ARCHIVE_MODE = os.environ.get("PRINTINGS_ARCHIVE_MODE", "table").lower()
+PRINTINGS_ARCHIVE_DIR = os.environ.get("PRINTINGS_ARCHIVE_DIR", "archive")
+# Как часто запускать обслуживание секций, часов
+PARTITION_MAINTENANCE_HOURS = float(os.environ.get("PARTITION_MAINTENANCE_HOURS", "6"))
+
+CONVERT_BATCH_SIZE = 50000
+PARQUET_BATCH_SIZE = 100000
+
+_BOUND_PATTERN = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+def _month_start(day: date) -> date:
+    return date(day.year, day.month, 1)
+
+
+def _add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date, table: str = TABLE) -> str:
+    return f"{table}_p{month:%Y_%m}"
+
+
+def is_partitioned(conn: Connection, table: str = TABLE) -> bool:
+    if conn.dialect.name != "postgresql":
+        return False
+    return bool(conn.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table pt "
+        "JOIN pg_class c ON c.oid = pt.partrelid "
+        "WHERE c.relname = :table AND pg_table_is_visible(c.oid))"
+    ), {"table": table}).scalar())
+
+
+def list_partitions(conn: Connection, table: str = TABLE) -> List[Tuple[str, Optional[date], Optional[date]]]:
+    """Секции таблицы: (имя, начало, конец); у секции DEFAULT границ нет"""
+    partitions = []
+    for name, bound in conn.execute(text(
+        "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :table ORDER BY c.relname"
+    ), {"table": table}):
+        match = _BOUND_PATTERN.search(bound or "")
+        if match:
+            lower, upper = (datetime.fromisoformat(value).date() for value in match.groups())
+            partitions.append((name, lower, upper))
+        else:
+            partitions.append((name, None, None))
+    return partitions
+
+
+def _create_partition(conn: Connection, table: str, name: str, month: date, default: Optional[str]):
+    """
+    Создаёт секцию месяца. Строки этого месяца, уже попавшие в DEFAULT (например,
+    печать с датой дальше PARTITION_MONTHS_AHEAD), Postgres не даст оставить там:
+    DEFAULT отсоединяется, строки переносятся в новую секцию, DEFAULT присоединяется обратно.
+    """
+    lower, upper = month.isoformat(), _add_months(month, 1).isoformat()
+    bounds = {"lower": lower, "upper": upper}
+    moved = default is not None and conn.execute(text(
+        f"SELECT EXISTS (SELECT 1 FROM {default} WHERE start_time >= :lower AND start_time < :upper)"
+    ), bounds).scalar()
+    if moved:
+        conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {default}"))
+    conn.execute(text(
+        f"CREATE TABLE {name} PARTITION OF {table} FOR VALUES FROM ('{lower}') TO ('{upper}')"
+    ))
+    if moved:
+        count = conn.execute(text(
+            f"INSERT INTO {name} SELECT * FROM {default} WHERE start_time >= :lower AND start_time < :upper"
+        ), bounds).rowcount
+        conn.execute(text(f"DELETE FROM {default} WHERE start_time >= :lower AND start_time < :upper"), bounds)
+        conn.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {default} DEFAULT"))
+        logger.info("Moved %d rows from %s to %s", count, default, name)
+
+
+def ensure_partitions(conn: Connection, table: str = TABLE, start: Optional[date] = None,
+                      months_ahead: int = PARTITION_MONTHS_AHEAD) -> List[str]:
+    """
+    Создаёт недостающие помесячные секции от start (по умолчанию - текущий месяц) до months_ahead вперёд.
+    Каждая секция создаётся в своей точке сохранения: ошибка пишется в лог и не мешает остальным.
+    """
+    current = _month_start(date.today())
+    month = _month_start(start) if start else current
+    last = _add_months(current, months_ahead)
+    partitions = list_partitions(conn, table)
+    existing = {name for name, _, _ in partitions}
+    default = next((name for name, lower, _ in partitions if lower is None), None)
+    created = []
+    while month <= last:
+        # Во время перевода секции висят на рабочей таблице, но сразу получают итоговые имена
+        name = partition_name(month)
+        if name not in existing:
+            try:
+                with conn.begin_nested():
+                    _create_partition(conn, table, name, month, default)
+                created.append(name)
+            except Exception as e:
+                logger.error("Failed to create partition %s: %s", name, e)
+        month = _add_months(month, 1)
+    return created
+
+
+def _export_parquet(conn: Connection, partition: str, directory: str) -> str:
+    """Выгружает секцию в Parquet потоком, не загружая её в память целиком"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("PRINTINGS_ARCHIVE_MODE=parquet requires pyarrow")
+
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{partition}.parquet")
+    result = conn.execution_options(stream_results=True).execute(text(f"SELECT * FROM {partition} ORDER BY id"))
+    columns = list(result.keys())
+    writer = None
+    try:
+        for rows in result.partitions(PARQUET_BATCH_SIZE):
+            batch = pa.Table.from_pydict({column: [row[i] for row in rows] for i, column in enumerate(columns)})
+            if writer is None:
+                writer = pq.ParquetWriter(path, batch.schema, compression="zstd")
+            writer.write_table(batch)
+    finally:
+        if writer is not None:
+            writer.close()
+    return path
+
+
+def archive_partitions(engine: Engine, retention_months: int = PRINTINGS_RETENTION_MONTHS,
+                       mode: str = PRINTINGS_ARCHIVE_MODE, directory: str = PRINTINGS_ARCHIVE_DIR) -> List[str]:
+    """
+    Уносит секции, целиком лежащие старше retention_months месяцев, в архив:
+    mode=table - в таблицу td_printings_archive, mode=parquet - в файлы.
+    Каждая секция обрабатывается отдельной транзакцией.
+    """
+    if retention_months <= 0:
+        return []
+    cutoff = _add_months(_month_start(date.today()), -retention_months)
+    with engine.connect() as conn:
+        expired = [name for name, _, upper in list_partitions(conn) if upper is not None and upper <= cutoff]
+
+    archived = []
+    for name in expired:
+        with engine.begin() as conn:
+            if mode == "parquet":
+                path = _export_parquet(conn, name, directory)
+                logger.info("Partition %s exported to %s", name, path)
+            conn.execute(text(f"ALTER TABLE {TABLE} DETACH PARTITION {name}"))
+            if mode != "parquet":
+                conn.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {ARCHIVE_TABLE} (LIKE {TABLE} INCLUDING DEFAULTS)"
+                ))
+                conn.execute(text(
+                    f"CREATE INDEX IF NOT EXISTS idx_{ARCHIVE_TABLE}_start_time ON {ARCHIVE_TABLE} (start_time)"
+                ))
+                conn.execute(text(f"INSERT INTO {ARCHIVE_TABLE} SELECT * FROM {name}"))
+            conn.execute(text(f"DROP TABLE {name}"))
+        archived.append(name)
+        logger.info("Partition %s archived (%s)", name, mode)
+    return archived
+
+
+def maintain_partitions(engine: Engine) -> Tuple[List[str], List[str]]:
+    """Создаёт секции наперёд и архивирует старые; возвращает (созданные, архивированные)"""
+    with engine.begin() as conn:
+        if not is_partitioned(conn):
+            return [], []
+        created = ensure_partitions(conn)
+    archived = archive_partitions(engine)
+    return created, archived
+
+
+def _copy_indexes(conn: Connection, source: str, target: str) -> List[Tuple[str, str]]:
+    """
+    Повторяет на target индексы source (кроме первичного ключа) под временными
+    именами; возвращает пары (итоговое имя, временное имя).
+    """
+    renames = []
+    for name, definition in conn.execute(text(
+        "SELECT indexname, indexdef FROM pg_indexes WHERE tablename = :table AND indexname <> :pkey"
+    ), {"table": source, "pkey": f"{source}_pkey"}):
+        temporary = f"{name}_new"
+        definition = re.sub(r"^CREATE (UNIQUE )?INDEX \S+ ON (\S+\.)?\S+ ",
+                            lambda m: f"CREATE {m.group(1) or ''}INDEX {temporary} ON {target} ", definition)
+        conn.execute(text(definition))
+        renames.append((name, temporary))
+    return renames
+
+
+def convert_table(engine: Engine, batch_size: int = CONVERT_BATCH_SIZE, drop_old: bool = False):
+    """
+    Переводит td_printings в секционированную таблицу без остановки записи:
+    1. создаёт секционированную копию структуры и секции по всему диапазону дат;
+    2. триггер на старой таблице повторяет в копии все новые изменения;
+    3. история переносится пачками по id (строки пачки блокируются FOR SHARE,
+       чтобы параллельное UPDATE не разошлось с копией);
+    4. короткая транзакция под эксклюзивной блокировкой меняет таблицы местами.
+    """
+    with engine.begin() as conn:
+        if conn.dialect.name != "postgresql":
+            raise RuntimeError("Partitioning requires PostgreSQL")
+        if is_partitioned(conn):
+            logger.info("%s is already partitioned", TABLE)
+            return
+
+        # Ключ секционирования входит в первичный ключ, поэтому NULL недопустим
+        conn.execute(text(
+            f"UPDATE {TABLE} SET start_time = COALESCE(real_time_stop, calculated_time_stop, now()) "
+            f"WHERE start_time IS NULL"
+        ))
+        first_start = conn.execute(text(f"SELECT min(start_time) FROM {TABLE}")).scalar()
+
+        conn.execute(text(f"DROP TABLE IF EXISTS {CONVERT_TABLE}"))
+        conn.execute(text(
+            f"CREATE TABLE {CONVERT_TABLE} (LIKE {TABLE} INCLUDING DEFAULTS) PARTITION BY RANGE (start_time)"
+        ))
+        conn.execute(text(f"ALTER TABLE {CONVERT_TABLE} ADD PRIMARY KEY (id, start_time)"))
+        conn.execute(text(f"ALTER TABLE {CONVERT_TABLE} ADD FOREIGN KEY (printer_id) REFERENCES td_printers (id)"))
+        conn.execute(text(f"ALTER TABLE {CONVERT_TABLE} ADD FOREIGN KEY (model_id) REFERENCES td_models (id)"))
+        created = ensure_partitions(conn, CONVERT_TABLE, start=first_start.date() if first_start else None)
+        conn.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {CONVERT_TABLE} DEFAULT"))
+        index_renames = _copy_indexes(conn, TABLE, CONVERT_TABLE)
+
+        conn.execute(text(f"""
+            CREATE OR REPLACE FUNCTION {TABLE}_mirror() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                    DELETE FROM {CONVERT_TABLE} WHERE id = OLD.id;
+                END IF;
+                IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                    INSERT INTO {CONVERT_TABLE} SELECT (NEW).*;
+                END IF;
+                RETURN NULL;
+            END $$ LANGUAGE plpgsql
+        """))
+        conn.execute(text(
+            f"CREATE TRIGGER {TABLE}_mirror AFTER INSERT OR UPDATE OR DELETE ON {TABLE} "
+            f"FOR EACH ROW EXECUTE FUNCTION {TABLE}_mirror()"
+        ))
+    # Граница копирования читается после того, как триггер закоммичен: CREATE TRIGGER
+    # дождался всех начатых вставок, и всё, что записано позже, повторит триггер
+    with engine.connect() as conn:
+        max_id = conn.execute(text(f"SELECT max(id) FROM {TABLE}")).scalar()
+    logger.info("Created %s with %d partitions, copying rows up to id %s", CONVERT_TABLE, len(created), max_id)
+
+    copied = 0
+    lower = 0
+    while max_id is not None and lower <= max_id:
+        upper = lower + batch_size
+        with engine.begin() as conn:
+            copied += conn.execute(text(
+                f"INSERT INTO {CONVERT_TABLE} SELECT * FROM {TABLE} WHERE id >= :lower AND id < :upper "
+                f"FOR SHARE ON CONFLICT DO NOTHING"
+            ), {"lower": lower, "upper": upper}).rowcount
+        lower = upper
+        logger.info("Copied %d rows (id < %d)", copied, upper)
+
+    with engine.begin() as conn:
+        conn.execute(text(f"LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE"))
+        # Последняя сверка под блокировкой: строки за последней пачкой, если триггер их не повторил
+        caught_up = conn.execute(text(
+            f"INSERT INTO {CONVERT_TABLE} SELECT * FROM {TABLE} WHERE id >= :lower ON CONFLICT DO NOTHING"
+        ), {"lower": lower}).rowcount
+        if caught_up:
+            logger.warning("Copied %d rows missed by the batches before the swap", caught_up)
+            copied += caught_up
+        conn.execute(text(f"DROP TRIGGER {TABLE}_mirror ON {TABLE}"))
+        conn.execute(text(f"DROP FUNCTION {TABLE}_mirror()"))
+        sequence = conn.execute(text("SELECT pg_get_serial_sequence(:table, 'id')"), {"table": TABLE}).scalar()
+        conn.execute(text(f"ALTER TABLE {TABLE} RENAME TO {OLD_TABLE}"))
+        conn.execute(text(f"ALTER TABLE {OLD_TABLE} RENAME CONSTRAINT {TABLE}_pkey TO {OLD_TABLE}_pkey"))
+        for name, temporary in index_renames:
+            conn.execute(text(f"ALTER INDEX {name} RENAME TO {name}_old"))
+            conn.execute(text(f"ALTER INDEX {temporary} RENAME TO {name}"))
+        conn.execute(text(f"ALTER TABLE {CONVERT_TABLE} RENAME TO {TABLE}"))
+        conn.execute(text(f"ALTER TABLE {TABLE} RENAME CONSTRAINT {CONVERT_TABLE}_pkey TO {TABLE}_pkey"))
+        if sequence:
+            conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {TABLE}.id"))
+        if drop_old:
+            conn.execute(text(f"DROP TABLE {OLD_TABLE}"))
+    with engine.connect() as conn:
+        conn.execute(text(f"ANALYZE {TABLE}"))
+    logger.info("%s is now partitioned by month (%d rows copied)%s", TABLE, copied,
+                "" if drop_old else f", old table kept as {OLD_TABLE}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["convert", "maintain", "status"])
+    parser.add_argument("--batch-size", type=int, default=CONVERT_BATCH_SIZE)
+    parser.add_argument("--drop-old", action="store_true", help="удалить старую таблицу после перевода")
+    args = parser.parse_args()
+
+    from database import engine
+    from log_config import setup_logging
+    setup_logging()
+
+    if args.command == "convert":
+        convert_table(engine, args.batch_size, args.drop_old)
+    elif args.command == "maintain":
+        created, archived = maintain_partitions(engine)
+        logger.info("Partitions created: %s, archived: %s", created or "-", archived or "-")
+    else:
+        with engine.connect() as conn:
+            if not is_partitioned(conn):
+                logger.info("%s is not partitioned", TABLE)
+            for name, lower, upper in list_partitions(conn):
+                rows = conn.execute(text(
+                    "SELECT reltuples::bigint FROM pg_class WHERE relname = :name"
+                ), {"name": name}).scalar()
+                logger.info("%s: %s .. %s, ~%s rows", name, lower or "DEFAULT", upper or "", rows)
+
+
+if __name__ == "__main__":
+    main()
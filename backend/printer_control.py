@@ -1,9 +1,15 @@
 from sqlalchemy.orm import Session
 from datetime import datetime
 import models
-from services.printer import format_minutes_to_hhmm, get_printers, get_printer
+from services.printer import (
+    format_minutes_to_hhmm, get_printers, get_printer, touch_printer, release_printer
+)
 from services.printing import get_printings, get_printing
 from dal import printer as printer_dal
+from services import prediction
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 def calculate_printer_downtime(db: Session, printer_id: int, current_time: datetime = None) -> float:
@@ -19,20 +25,18 @@ def calculate_printer_downtime(db: Session, printer_id: int, current_time: datet
     if not printer:
         return 0.0
         
-    # Получаем время последней активности принтера
-    last_printing = db.query(models.Printing).filter(
-        models.Printing.printer_id == printer_id
-    ).order_by(models.Printing.real_time_stop.desc()).first()
-    
-    if last_printing and last_printing.real_time_stop:
-        # Время простоя от завершения последней печати до текущего момента в минутах
-        idle_time = (current_time - last_printing.real_time_stop).total_seconds() / 60
-        print(f"Printer {printer_id} idle time since last print: {format_minutes_to_hhmm(idle_time)}")
+    # Время последней активности принтера хранится в нём самом
+    if printer.last_activity_at:
+        # Время простоя от последней активности до текущего момента в минутах
+        idle_time = (current_time - printer.last_activity_at).total_seconds() / 60
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Printer %s idle time since last activity: %s", printer_id, format_minutes_to_hhmm(idle_time))
         return idle_time
     else:
-        # Если печатей не было или нет завершенных, считаем с момента добавления принтера в систему
+        # Если печатей не было, считаем с момента добавления принтера в систему
         idle_time = (current_time - printer.created_at).total_seconds() / 60
-        print(f"Printer {printer_id} idle time since creation: {format_minutes_to_hhmm(idle_time)}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Printer %s idle time since creation: %s", printer_id, format_minutes_to_hhmm(idle_time))
         return idle_time
 
 def update_printer_status(db: Session, printer_id: int, new_status: str) -> models.Printer:
@@ -73,10 +77,12 @@ def complete_printing(db: Session, printing_id: int, auto_complete: bool = False
     if not printing.real_time_stop:
         printing.real_time_stop = current_time
     
-    # Обновляем статус печати
+    # Обновляем статус печати; принтер меняется в той же транзакции
     if auto_complete:
         printing.status = "completed"
-        update_printer_status(db, printer.id, "waiting")
+        # Принтер остаётся за печатью до подтверждения
+        printer.status = "waiting"
+        touch_printer(printer, printing.real_time_stop)
     else:
         printing.status = "completed"
         # Вычисляем фактическое время печати без учета простоев в минутах
@@ -89,13 +95,17 @@ def complete_printing(db: Session, printing_id: int, auto_complete: bool = False
         total_print_time = (printer.total_print_time or 0) + actual_printing_time
         
         # Обновляем статус принтера на idle и общее время печати
-        printer_dal.update(db, printer.id, {
-            "status": "idle",
-            "total_print_time": total_print_time
-        })
+        printer.status = "idle"
+        printer.total_print_time = total_print_time
+        release_printer(printer, printing.real_time_stop)
+
+        # Пополняем статистику длительностей (автозавершение по расчётному времени не учитываем -
+        # его длительность и так равна прогнозу)
+        prediction.record_finished_printing(db, printing)
     
     # Сохраняем изменения в печати
     db.add(printing)
+    db.add(printer)
     db.commit()
     db.refresh(printing)
         
@@ -110,17 +120,32 @@ def pause_printing(db: Session, printing_id: int):
     if not printer:
         return None
     
-    # Обновляем статус принтера на "paused"
-    update_printer_status(db, printer.id, "paused")
-    
     printing.status = "paused"
     printing.pause_time = datetime.now()
     
+    # Обновляем статус принтера на "paused"
+    printer.status = "paused"
+    touch_printer(printer, printing.pause_time)
+    
     db.add(printing)
+    db.add(printer)
     db.commit()
     db.refresh(printing)
     return printing
 
+def apply_resume(printing: models.Printing, current_time: datetime):
+    """Снимает печать с паузы: длительность паузы уходит в downtime и сдвигает расчётное окончание"""
+    if printing.pause_time:
+        # Обновляем время простоя (в минутах)
+        pause_duration = (current_time - printing.pause_time).total_seconds() / 60
+        printing.downtime = (printing.downtime or 0) + pause_duration
+        # Корректируем ожидаемое время завершения
+        if printing.calculated_time_stop:
+            printing.calculated_time_stop = printing.calculated_time_stop + \
+                (current_time - printing.pause_time)
+    printing.status = "printing"
+    printing.pause_time = None
+
 def resume_printing(db: Session, printing_id: int):
     printing = get_printing(db, printing_id)
     if not printing or printing.real_time_stop is not None:
@@ -131,22 +156,14 @@ def resume_printing(db: Session, printing_id: int):
         return None
     
     current_time = datetime.now()
-    if printing.pause_time:
-        # Обновляем время простоя (в минутах)
-        pause_duration = (current_time - printing.pause_time).total_seconds() / 60
-        printing.downtime = (printing.downtime or 0) + pause_duration
-        # Корректируем ожидаемое время завершения
-        if printing.calculated_time_stop:
-            printing.calculated_time_stop = printing.calculated_time_stop + \
-                (current_time - printing.pause_time)
+    apply_resume(printing, current_time)
     
     # Обновляем статус принтера на "printing"
-    update_printer_status(db, printer.id, "printing")
-    
-    printing.status = "printing"
-    printing.pause_time = None
+    printer.status = "printing"
+    touch_printer(printer, current_time)
     
     db.add(printing)
+    db.add(printer)
     db.commit()
     db.refresh(printing)
     return printing
@@ -175,13 +192,13 @@ def cancel_printing(db: Session, printing_id: int):
     total_print_time = (printer.total_print_time or 0) + actual_printing_time
     
     # Обновляем статус принтера на "idle" и общее время печати
-    printer_dal.update(db, printer.id, {
-        "status": "idle",
-        "total_print_time": total_print_time
-    })
+    printer.status = "idle"
+    printer.total_print_time = total_print_time
+    release_printer(printer, current_time)
     
     # Сохраняем изменения
     db.add(printing)
+    db.add(printer)
     db.commit()
     
     # Обновляем объект печати из базы данных
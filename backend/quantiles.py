@@ -0,0 +1,258 @@
+"""
+Квантили длительности печати и простоя (пауз) по моделям и принтерам.
+
+На каждую модель и каждый принтер хранится DDSketch: гистограмма с
+логарифмическими корзинами, в которой любая квантиль находится с
+относительной погрешностью не больше QUANTILE_RELATIVE_ACCURACY. Скетчи
+пополняются, когда печать завершается (prediction.record_finished_printing),
+хранятся сжатыми в td_duration_sketches и объединяются сложением корзин -
+поэтому p50/p90/p99 для любой группы моделей или принтеров считаются по
+нескольким строкам, без чтения истории печатей.
+"""
+import logging
+import math
+import struct
+import zlib
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+import models
+from dal.sql import insert_missing
+
+logger = logging.getLogger(__name__)
+
+# Относительная погрешность квантилей (1%)
+QUANTILE_RELATIVE_ACCURACY = 0.01
+# Больше корзин не храним: самые нижние сливаются (хвост p99 важнее)
+MAX_BINS = 2048
+# Значения меньше этого (в минутах) считаются нулём - например, печать без пауз
+MIN_VALUE = 1e-3
+
+SCOPES = ["model", "printer"]
+METRICS = ["duration", "downtime"]
+
+_HEADER = struct.Struct("<BdQQddd")
+_BIN = struct.Struct("<iQ")
+_VERSION = 1
+
+
+class DDSketch:
+    """Скетч квантилей с относительной погрешностью (DDSketch), объединяемый сложением"""
+
+    def __init__(self, relative_accuracy: float = QUANTILE_RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self.sum = 0.0
+
+    def add(self, value: float):
+        value = max(value, 0.0)
+        if value < MIN_VALUE:
+            self.zero_count += 1
+        else:
+            index = math.ceil(math.log(value) / self._log_gamma)
+            self.bins[index] = self.bins.get(index, 0) + 1
+            if len(self.bins) > MAX_BINS:
+                self._collapse()
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other: "DDSketch"):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        if len(self.bins) > MAX_BINS:
+            self._collapse()
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def _collapse(self):
+        indexes = sorted(self.bins)
+        excess = indexes[:len(indexes) - MAX_BINS + 1]
+        target = indexes[len(excess)]
+        self.bins[target] += sum(self.bins.pop(index) for index in excess)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                value = 2 * self.gamma ** index / (self.gamma + 1)
+                # Оценка корзины не выходит за реальные границы данных
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def to_bytes(self) -> bytes:
+        """Заголовок и пары (индекс, число) корзин, сжатые zlib"""
+        data = [_HEADER.pack(_VERSION, self.relative_accuracy, self.count, self.zero_count,
+                             self.min if self.count else 0.0, self.max if self.count else 0.0, self.sum)]
+        data.extend(_BIN.pack(index, self.bins[index]) for index in sorted(self.bins))
+        return zlib.compress(b"".join(data))
+
+    @classmethod
+    def from_bytes(cls, blob: bytes) -> "DDSketch":
+        data = zlib.decompress(blob)
+        version, accuracy, count, zero_count, min_value, max_value, total = _HEADER.unpack_from(data)
+        if version != _VERSION:
+            raise ValueError(f"Unsupported sketch version: {version}")
+        sketch = cls(accuracy)
+        sketch.count, sketch.zero_count, sketch.sum = count, zero_count, total
+        if count:
+            sketch.min, sketch.max = min_value, max_value
+        for index, bin_count in _BIN.iter_unpack(data[_HEADER.size:]):
+            sketch.bins[index] = bin_count
+        return sketch
+
+
+def printing_values(printing: models.Printing) -> Optional[Dict[str, float]]:
+    """Длительность (без пауз) и простой завершённой печати в минутах"""
+    if not printing.real_time_stop or not printing.start_time:
+        return None
+    downtime = printing.downtime or 0.0
+    duration = (printing.real_time_stop - printing.start_time).total_seconds() / 60 - downtime
+    if duration <= 0:
+        return None
+    return {"duration": duration, "downtime": downtime}
+
+
+def _get_row(db: Session, scope: str, scope_id: int, metric: str) -> models.DurationSketch:
+    """Строка скетча под блокировкой; первую строку создаёт без гонки параллельных вставок"""
+    query = db.query(models.DurationSketch).filter(
+        models.DurationSketch.scope == scope,
+        models.DurationSketch.scope_id == scope_id,
+        models.DurationSketch.metric == metric
+    ).with_for_update()
+    row = query.first()
+    if row is None:
+        insert_missing(db, models.DurationSketch, scope=scope, scope_id=scope_id, metric=metric, count=0,
+                       sketch=DDSketch().to_bytes())
+        row = query.one()
+    return row
+
+
+def record_printing(db: Session, printing: models.Printing):
+    """
+    Добавляет завершённую печать в скетчи её модели и принтера.
+    Коммит остаётся за вызывающим кодом.
+    """
+    values = printing_values(printing)
+    if values is None:
+        return
+    for scope, scope_id in (("model", printing.model_id), ("printer", printing.printer_id)):
+        if not scope_id:
+            continue
+        for metric, value in values.items():
+            row = _get_row(db, scope, int(scope_id), metric)
+            sketch = DDSketch.from_bytes(row.sketch)
+            sketch.add(value)
+            row.sketch = sketch.to_bytes()
+            row.count = sketch.count
+            row.updated_at = datetime.now()
+
+
+def rebuild(db: Session, batch_size: int = 10000) -> int:
+    """Пересобирает все скетчи по истории завершённых печатей; возвращает число печатей"""
+    sketches: Dict[Tuple[str, int, str], DDSketch] = {}
+    printings = 0
+    query = db.query(
+        models.Printing.model_id, models.Printing.printer_id, models.Printing.start_time,
+        models.Printing.real_time_stop, models.Printing.downtime
+    ).filter(
+        models.Printing.status == "completed",
+        models.Printing.real_time_stop.isnot(None)
+    ).yield_per(batch_size)
+    for row in query:
+        values = printing_values(row)
+        if values is None:
+            continue
+        printings += 1
+        for scope, scope_id in (("model", row.model_id), ("printer", row.printer_id)):
+            if not scope_id:
+                continue
+            for metric, value in values.items():
+                sketches.setdefault((scope, int(scope_id), metric), DDSketch()).add(value)
+
+    db.query(models.DurationSketch).delete(synchronize_session=False)
+    now = datetime.now()
+    db.bulk_insert_mappings(models.DurationSketch, [
+        {"scope": scope, "scope_id": scope_id, "metric": metric, "count": sketch.count,
+         "sketch": sketch.to_bytes(), "updated_at": now}
+        for (scope, scope_id, metric), sketch in sketches.items()
+    ])
+    db.commit()
+    return printings
+
+
+def is_empty(db: Session) -> bool:
+    return db.query(models.DurationSketch.id).first() is None
+
+
+def _summary(sketch: DDSketch, quantiles: List[float]) -> Dict[str, Optional[float]]:
+    summary = {
+        "count": sketch.count,
+        "mean": round(sketch.sum / sketch.count, 2) if sketch.count else None,
+        "min": round(sketch.min, 2) if sketch.count else None,
+        "max": round(sketch.max, 2) if sketch.count else None,
+    }
+    for q in quantiles:
+        value = sketch.quantile(q)
+        summary[f"p{q * 100:g}"] = round(value, 2) if value is not None else None
+    return summary
+
+
+def get_quantiles(db: Session, scope: str, metric: str, ids: Optional[Iterable[int]] = None,
+                  quantiles: Iterable[float] = (0.5, 0.9, 0.99)) -> Dict[str, object]:
+    """
+    Квантили метрики для группы моделей или принтеров ids (None - все) и,
+    если ids заданы, для каждого по отдельности. ValueError - если параметры неверны.
+    """
+    if scope not in SCOPES:
+        raise ValueError(f"Unknown scope: {scope}. Available: {', '.join(SCOPES)}")
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric: {metric}. Available: {', '.join(METRICS)}")
+    quantiles = sorted(set(quantiles))
+    if any(not 0 <= q <= 1 for q in quantiles):
+        raise ValueError("Quantiles must be between 0 and 1")
+
+    query = db.query(models.DurationSketch.scope_id, models.DurationSketch.sketch).filter(
+        models.DurationSketch.scope == scope,
+        models.DurationSketch.metric == metric
+    )
+    if ids is not None:
+        query = query.filter(models.DurationSketch.scope_id.in_(list(ids)))
+
+    merged = DDSketch()
+    items = []
+    for scope_id, blob in query.order_by(models.DurationSketch.scope_id).all():
+        sketch = DDSketch.from_bytes(blob)
+        merged.merge(sketch)
+        if ids is not None:
+            items.append({"id": scope_id, **_summary(sketch, quantiles)})
+
+    report = {
+        "scope": scope,
+        "metric": metric,
+        "relative_accuracy": QUANTILE_RELATIVE_ACCURACY,
+        "merged": _summary(merged, quantiles),
+    }
+    if ids is not None:
+        report["items"] = items
+    return report
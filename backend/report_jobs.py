@@ -0,0 +1,251 @@
+"""
+Фоновые задания отчётов: длинные отчёты (например, эффективность за год или
+полная история принтера) считаются вне запроса.
+
+Клиент отправляет спецификацию (отчёт и параметры) и получает задание; пул
+потоков считает отчёт и сохраняет результат в td_report_jobs. Спецификация
+приводится к каноническому виду и хешируется: одинаковая спецификация, пока
+задание идёт или его результат моложе REPORT_JOB_RESULT_TTL, получает то же
+задание. Прогресс и результат забираются опросом.
+"""
+import hashlib
+import inspect
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import orjson
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.orm import Session
+
+import models
+import reports
+from database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Сколько отчётов считается одновременно
+REPORT_JOB_WORKERS = int(os.environ.get("REPORT_JOB_WORKERS", "2"))
+# Сколько секунд готовый результат переиспользуется для той же спецификации
+REPORT_JOB_RESULT_TTL = float(os.environ.get("REPORT_JOB_RESULT_TTL", "3600"))
+# Через сколько дней задания удаляются
+REPORT_JOB_RETENTION_DAYS = float(os.environ.get("REPORT_JOB_RETENTION_DAYS", "7"))
+# Прогресс пишется в базу не чаще, чем с таким шагом
+PROGRESS_STEP = 0.05
+
+ACTIVE_STATUSES = ["queued", "running"]
+
+
+def _parse_bool(value: Any) -> bool:
+    if isinstance(value, str):
+        if value.lower() not in ("true", "false", "1", "0"):
+            raise ValueError(value)
+        return value.lower() in ("true", "1")
+    return bool(value)
+
+
+# Отчёт -> (функция из reports.py, параметры: имя -> разбор значения)
+REPORTS: Dict[str, Tuple[Callable[..., Any], Dict[str, Callable[[Any], Any]]]] = {
+    "printing-efficiency": (reports.get_printing_efficiency_report, {"days": int}),
+    "daily": (reports.get_daily_report, {"date": lambda value: date.fromisoformat(str(value))}),
+    "printer-status": (reports.get_printer_status_report, {"include_printers": _parse_bool}),
+    "printer": (reports.get_printer_report, {"printer_id": int}),
+    "model": (reports.get_model_report, {"model_id": int}),
+    "analytics": (reports.get_analytics_report, {
+        "bucket": str,
+        "group_by": str,
+        "days": int,
+        "start": lambda value: reports.to_naive_local(datetime.fromisoformat(str(value))),
+        "end": lambda value: reports.to_naive_local(datetime.fromisoformat(str(value))),
+        "metrics": lambda value: value.split(",") if isinstance(value, str) else [str(item) for item in value],
+    }),
+}
+
+_executor = ThreadPoolExecutor(max_workers=REPORT_JOB_WORKERS, thread_name_prefix="report-job")
+
+
+def normalize_spec(report: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Проверяет отчёт и параметры и приводит значения к типам; ValueError - если спецификация неверна"""
+    if report not in REPORTS:
+        raise ValueError(f"Unknown report: {report}. Available: {', '.join(sorted(REPORTS))}")
+    function, parsers = REPORTS[report]
+    unknown = set(params) - set(parsers)
+    if unknown:
+        raise ValueError(f"Unknown parameters for {report}: {', '.join(sorted(unknown))}")
+    normalized = {}
+    for name, parse in parsers.items():
+        if name in params:
+            try:
+                normalized[name] = parse(params[name])
+            except (TypeError, ValueError):
+                raise ValueError(f"Invalid value for {name}: {params[name]!r}")
+        elif inspect.signature(function).parameters[name].default is inspect.Parameter.empty:
+            raise ValueError(f"Missing parameter for {report}: {name}")
+    return normalized
+
+
+def spec_hash(report: str, params: Dict[str, Any]) -> str:
+    canonical = json.dumps({"report": report, "params": params}, sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()[:32]
+
+
+def _to_json(value: Any) -> Any:
+    """ORM-объекты в отчётах (принтер, печати) -> словари их колонок"""
+    if isinstance(value, dict):
+        return {key: _to_json(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_json(item) for item in value]
+    if isinstance(value, models.Base):
+        return {attr.key: getattr(value, attr.key) for attr in sa_inspect(value).mapper.column_attrs}
+    return value
+
+
+def as_dict(job: models.ReportJob) -> Dict[str, Any]:
+    return {
+        "id": job.id,
+        "report": job.report,
+        "params": json.loads(job.params),
+        "spec_hash": job.spec_hash,
+        "status": job.status,
+        "progress": job.progress or 0.0,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+
+def submit(db: Session, report: str, params: Dict[str, Any]) -> Tuple[models.ReportJob, bool]:
+    """
+    Ставит отчёт в очередь или возвращает задание с той же спецификацией
+    (идущее или с достаточно свежим результатом). Возвращает (задание, переиспользовано ли).
+    """
+    params = normalize_spec(report, params)
+    key = spec_hash(report, params)
+    fresh_after = datetime.now() - timedelta(seconds=REPORT_JOB_RESULT_TTL)
+    for job in db.query(models.ReportJob).filter(
+        models.ReportJob.spec_hash == key
+    ).order_by(models.ReportJob.created_at.desc()).limit(5):
+        if job.status in ACTIVE_STATUSES:
+            return job, True
+        if job.status == "completed" and job.finished_at and job.finished_at >= fresh_after:
+            return job, True
+
+    job = models.ReportJob(
+        report=report,
+        params=json.dumps(params, sort_keys=True, default=str),
+        spec_hash=key,
+        status="queued",
+        progress=0.0,
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    _executor.submit(run_job, job.id)
+    return job, False
+
+
+def get_job(db: Session, job_id: int) -> Optional[models.ReportJob]:
+    return db.query(models.ReportJob).filter(models.ReportJob.id == job_id).first()
+
+
+def _claim(db: Session, job_id: int) -> bool:
+    """Переводит задание в running; False, если его уже взял другой воркер"""
+    claimed = db.query(models.ReportJob).filter(
+        models.ReportJob.id == job_id,
+        models.ReportJob.status == "queued"
+    ).update({"status": "running", "started_at": datetime.now()}, synchronize_session=False)
+    db.commit()
+    return claimed == 1
+
+
+def run_job(job_id: int):
+    """Считает отчёт задания в своей сессии и сохраняет результат"""
+    db = SessionLocal()
+    try:
+        if not _claim(db, job_id):
+            return
+        job = get_job(db, job_id)
+        function, _ = REPORTS[job.report]
+        params = normalize_spec(job.report, json.loads(job.params))
+        if "progress" in inspect.signature(function).parameters:
+            params["progress"] = _progress_writer(job_id)
+
+        # Отчёт читает в отдельной сессии, чтобы запись прогресса не мешала его транзакции
+        report = reports.run_report(lambda report_db: function(report_db, **params))
+        if report is None:
+            raise LookupError(f"{job.report} not found: {job.params}")
+        db.query(models.ReportJob).filter(models.ReportJob.id == job_id).update({
+            "status": "completed",
+            "progress": 1.0,
+            "result": orjson.dumps(_to_json(report)).decode(),
+            "finished_at": datetime.now(),
+        }, synchronize_session=False)
+        db.commit()
+        logger.info("Report job %s (%s) completed", job_id, job.report)
+    except Exception as e:
+        logger.exception("Report job %s failed", job_id)
+        db.rollback()
+        db.query(models.ReportJob).filter(models.ReportJob.id == job_id).update({
+            "status": "failed",
+            "error": str(e)[:1000],
+            "finished_at": datetime.now(),
+        }, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _progress_writer(job_id: int) -> Callable[[float], None]:
+    last = [0.0]
+
+    def write(fraction: float):
+        # Последний шаг не пишем - его заменит запись результата
+        if fraction - last[0] < PROGRESS_STEP or fraction >= 1:
+            return
+        last[0] = fraction
+        db = SessionLocal()
+        try:
+            db.query(models.ReportJob).filter(models.ReportJob.id == job_id).update(
+                {"progress": round(fraction, 3)}, synchronize_session=False
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    return write
+
+
+def resume_pending() -> int:
+    """
+    Запускает задания, оставшиеся в очереди после перезапуска; прерванные
+    на середине (running) начинаются заново.
+    """
+    db = SessionLocal()
+    try:
+        db.query(models.ReportJob).filter(models.ReportJob.status == "running").update(
+            {"status": "queued", "progress": 0.0, "started_at": None}, synchronize_session=False
+        )
+        db.commit()
+        job_ids = [job_id for job_id, in db.query(models.ReportJob.id).filter(
+            models.ReportJob.status == "queued"
+        ).order_by(models.ReportJob.id)]
+    finally:
+        db.close()
+    for job_id in job_ids:
+        _executor.submit(run_job, job_id)
+    return len(job_ids)
+
+
+def cleanup(db: Session) -> int:
+    """Удаляет завершённые задания старше REPORT_JOB_RETENTION_DAYS"""
+    cutoff = datetime.now() - timedelta(days=REPORT_JOB_RETENTION_DAYS)
+    deleted = db.query(models.ReportJob).filter(
+        models.ReportJob.status.notin_(ACTIVE_STATUSES),
+        models.ReportJob.created_at < cutoff
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
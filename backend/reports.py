@@ -3,8 +3,20 @@ from sqlalchemy import func, and_
 from datetime import datetime, timedelta
 from crud import get_model
 import models
-from typing import Dict, Any
+from typing import Callable, Dict, Any, List, Optional
 from models import Printer, Model, Printing
+from database import SessionLocal
+import status_counters
+from dal import printing as printing_dal
+from dal.sql import TRUNC_UNITS
+
+# Метрики аналитики печатей
+ANALYTICS_METRICS = ["count", "print_minutes", "downtime", "success_rate"]
+# Больше интервалов в одном ответе не отдаём (например, часы за полгода)
+ANALYTICS_MAX_BUCKETS = 2000
+
+# Окно чтения печатей в отчёте эффективности, дней
+EFFICIENCY_WINDOW_DAYS = 30
 
 def get_daily_report(db: Session, date: datetime.date) -> Dict[str, Any]:
     start_datetime = datetime.combine(date, datetime.min.time())
@@ -84,4 +96,238 @@ def get_model_report(db: Session, model_id: int):
         "success_rate": len([p for p in printings if p.real_time_stop and 
                            (p.real_time_stop - p.start_time).total_seconds() / 3600 <= model.printing_time * 1.1]) / 
                        len([p for p in printings if p.real_time_stop]) * 100 if [p for p in printings if p.real_time_stop] else 0
-    }
\ No newline at end of file
+    }
+
+def get_printer_status_report(db: Session, include_printers: bool = True) -> Dict[str, Any]:
+    """
+    Отчёт по статусам принтеров. Счётчики и средняя эффективность берутся
+    из status_counters; без include_printers отчёт не читает таблицу принтеров.
+    """
+    counters = status_counters.get_counters(db)
+    
+    # Count printers by status
+    status_counts = {
+        "idle": 0,
+        "printing": 0,
+        "paused": 0,
+        "error": 0
+    }
+    for status, count in counters["status_counts"].items():
+        if status in status_counts:
+            status_counts[status] = count
+    
+    report = {
+        "total_printers": counters["total_printers"],
+        "status_counts": status_counts,
+        "average_efficiency": round(counters["average_efficiency"], 1)
+    }
+    
+    if include_printers:
+        # Только нужные колонки - без загрузки ORM-объектов принтеров
+        printers = db.query(
+            Printer.id, Printer.name, Printer.status, Printer.total_print_time, Printer.total_downtime
+        ).all()
+        report["printers"] = [
+            {
+                "id": printer_id,
+                "name": name,
+                "status": status,
+                # Calculate printer efficiency (time printing vs. total time available)
+                "efficiency": round(status_counters.efficiency(total_print_time, total_downtime), 1),
+                "total_print_time": round(total_print_time or 0, 1),
+                "total_downtime": round(total_downtime or 0, 1)
+            }
+            for printer_id, name, status, total_print_time, total_downtime in printers
+        ]
+    
+    return report
+
+def get_printing_efficiency_report(db: Session, days: int = 30,
+                                   progress: Optional[Callable[[float], None]] = None) -> Dict[str, Any]:
+    """
+    Печати по дням, успешность по моделям и простой по принтерам за последние days дней.
+    Печати читаются окнами по EFFICIENCY_WINDOW_DAYS дней, после каждого окна
+    вызывается progress(доля) - для длинных периодов в фоновых заданиях.
+    """
+    # Get data for the specified time period
+    start_date = datetime.now() - timedelta(days=days)
+    models = db.query(Model.id, Model.name).all()
+    
+    # Group printings by day
+    daily_printings = {}
+    end_date = datetime.now()
+    current_date = start_date
+    
+    # Initialize all days in the range
+    while current_date <= end_date:
+        date_str = current_date.strftime("%Y-%m-%d")
+        daily_printings[date_str] = 0
+        current_date += timedelta(days=1)
+    
+    # Count printings by day and by model in a single pass over each window
+    total_printings = 0
+    model_totals = {}
+    model_completed = {}
+    window_start = start_date
+    while window_start < end_date:
+        window_end = min(window_start + timedelta(days=EFFICIENCY_WINDOW_DAYS), end_date)
+        query = db.query(Printing.start_time, Printing.model_id, Printing.status).filter(
+            Printing.start_time >= window_start
+        )
+        if window_end < end_date:
+            query = query.filter(Printing.start_time < window_end)
+        printings = query.all()
+        total_printings += len(printings)
+        for start_time, model_id, status in printings:
+            date_str = start_time.strftime("%Y-%m-%d")
+            if date_str in daily_printings:
+                daily_printings[date_str] += 1
+            model_totals[model_id] = model_totals.get(model_id, 0) + 1
+            if status == 'completed':
+                model_completed[model_id] = model_completed.get(model_id, 0) + 1
+        window_start = window_end
+        if progress is not None:
+            progress((window_end - start_date) / (end_date - start_date))
+    
+    # Calculate downtime by printer
+    downtime_by_printer = {}
+    
+    for name, total_downtime in db.query(Printer.name, Printer.total_downtime).all():
+        if name not in downtime_by_printer:
+            downtime_by_printer[name] = 0
+        
+        # Add current downtime
+        downtime_by_printer[name] += total_downtime * 60  # Convert to minutes
+    
+    # Get model data for the report
+    model_data = []
+    for model_id, name in models:
+        total_prints = model_totals.get(model_id, 0)
+        
+        if total_prints > 0:
+            success_rate = model_completed.get(model_id, 0) / total_prints * 100
+        else:
+            success_rate = 0
+            
+        model_data.append({
+            "id": model_id,
+            "name": name,
+            "total_prints": total_prints,
+            "success_rate": round(success_rate, 1)
+        })
+    
+    return {
+        "total_printings": total_printings,
+        "daily_printings": daily_printings,
+        "downtime_by_printer": downtime_by_printer,
+        "models": model_data
+    }
+
+def _truncate(unit: str, moment: datetime) -> datetime:
+    """То же, что dal.sql.date_trunc, но в Python - для сетки интервалов"""
+    moment = moment.replace(minute=0, second=0, microsecond=0)
+    if unit == "hour":
+        return moment
+    moment = moment.replace(hour=0)
+    if unit == "week":
+        return moment - timedelta(days=moment.weekday())
+    if unit == "month":
+        return moment.replace(day=1)
+    return moment
+
+def _next_bucket(unit: str, moment: datetime) -> datetime:
+    if unit == "month":
+        return moment.replace(year=moment.year + moment.month // 12, month=moment.month % 12 + 1)
+    return moment + timedelta(**{"hours": 1} if unit == "hour" else {"days": 7 if unit == "week" else 1})
+
+def to_naive_local(moment: Optional[datetime]) -> Optional[datetime]:
+    """Время с часовым поясом -> наивное местное: так хранятся даты печатей и считаются интервалы"""
+    if moment is not None and moment.tzinfo is not None:
+        return moment.astimezone().replace(tzinfo=None)
+    return moment
+
+def get_analytics_report(db: Session, bucket: str = "day", group_by: Optional[str] = None, days: int = 30,
+                         start: Optional[datetime] = None, end: Optional[datetime] = None,
+                         metrics: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Печати по интервалам (hour, day, week, month) и, если задано, по принтеру,
+    модели или статусу. Агрегаты считает база (date_trunc); ответ колоночный:
+    общий список начал интервалов и по массиву на каждую метрику в каждой серии,
+    пустые интервалы - нули. ValueError - если параметры неверны.
+    """
+    if bucket not in TRUNC_UNITS:
+        raise ValueError(f"Unknown bucket: {bucket}. Available: {', '.join(TRUNC_UNITS)}")
+    if group_by is not None and group_by not in printing_dal.ANALYTICS_GROUPS:
+        raise ValueError(f"Unknown group_by: {group_by}. Available: {', '.join(printing_dal.ANALYTICS_GROUPS)}")
+    metrics = metrics or ANALYTICS_METRICS
+    unknown = [metric for metric in metrics if metric not in ANALYTICS_METRICS]
+    if unknown:
+        raise ValueError(f"Unknown metrics: {', '.join(unknown)}. Available: {', '.join(ANALYTICS_METRICS)}")
+
+    now = datetime.now()
+    end = to_naive_local(end) or now
+    start = to_naive_local(start) or end - timedelta(days=days)
+    if start >= end:
+        raise ValueError("start must be before end")
+
+    buckets = []
+    current = _truncate(bucket, start)
+    while current < end:
+        buckets.append(current)
+        if len(buckets) > ANALYTICS_MAX_BUCKETS:
+            raise ValueError(f"Too many buckets (more than {ANALYTICS_MAX_BUCKETS}); use a larger bucket")
+        current = _next_bucket(bucket, current)
+    index = {moment: i for i, moment in enumerate(buckets)}
+
+    series = {}
+    for row in printing_dal.get_bucket_stats(db, bucket, start, end, now, group_by):
+        values = series.get(row.key)
+        if values is None:
+            values = series[row.key] = {
+                name: [0] * len(buckets) for name in ("count", "print_minutes", "downtime", "completed", "finished")
+            }
+        i = index[row.bucket]
+        values["count"][i] = row.count
+        values["print_minutes"][i] = round(row.print_minutes or 0, 1)
+        values["downtime"][i] = round(row.downtime or 0, 1)
+        values["completed"][i] = row.completed or 0
+        values["finished"][i] = row.finished or 0
+
+    names = {}
+    if group_by == "printer":
+        names = dict(db.query(Printer.id, Printer.name).filter(Printer.id.in_(list(series))).all())
+    elif group_by == "model":
+        names = dict(db.query(Model.id, Model.name).filter(Model.id.in_(list(series))).all())
+
+    result_series = []
+    for key in sorted(series, key=lambda key: (key is None, str(key))):
+        values = series[key]
+        # Успешность - доля завершённых среди законченных печатей, %
+        values["success_rate"] = [
+            round(completed / finished * 100, 1) if finished else None
+            for completed, finished in zip(values["completed"], values["finished"])
+        ]
+        item = {"key": key, "name": names.get(key, key) if group_by else "all"}
+        item.update({metric: values[metric] for metric in metrics})
+        result_series.append(item)
+
+    return {
+        "bucket": bucket,
+        "group_by": group_by,
+        "start": start,
+        "end": end,
+        "metrics": metrics,
+        "buckets": buckets,
+        "series": result_series,
+    }
+
+def run_report(report: Callable[..., Dict[str, Any]], *args) -> Dict[str, Any]:
+    """
+    Считает отчёт в собственной сессии: результат кешируется и может
+    пересчитываться в фоне, когда сессии запроса уже нет.
+    """
+    db = SessionLocal()
+    try:
+        return report(db, *args)
+    finally:
+        db.close()
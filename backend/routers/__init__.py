@@ -5,3 +5,8 @@ from . import printings
 from . import models
 from . import reports
 from . import printer_parameters
+from . import telemetry
+from . import queue
+from . import metrics
+from . import fleet
+from . import search
@@ -0,0 +1,25 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import ORJSONResponse
+import logging
+
+import fleet
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(
+    prefix="/fleet",
+    tags=["fleet"]
+)
+
+@router.get("/snapshot")
+def read_fleet_snapshot():
+    """
+    Всё, что нужно дашборду, одним ответом: принтеры с идущими печатями,
+    последние печати, счётчики статусов и эффективность. Снимок кешируется
+    на FLEET_SNAPSHOT_TTL секунд и строится одним запросом на всех.
+    """
+    try:
+        return ORJSONResponse(fleet.get_snapshot())
+    except Exception as e:
+        logger.error("Error in read_fleet_snapshot: %s", e)
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
@@ -0,0 +1,36 @@
+from fastapi import APIRouter, Body
+
+import coalescing
+import instrumentation
+
+router = APIRouter(
+    prefix="/metrics",
+    tags=["metrics"]
+)
+
+@router.get("/")
+def read_metrics():
+    """
+    Время ответа по маршрутам (гистограммы, p50/p90/p99), число SQL-запросов на запрос
+    и объединение запросов к отчётам: сколько ответов обошлись без своего вычисления
+    """
+    metrics = instrumentation.get_metrics()
+    metrics["coalescing"] = coalescing.get_stats()
+    return metrics
+
+@router.get("/profiles")
+def read_profiles():
+    """Последние снятые профили обработчиков"""
+    return instrumentation.get_profiles()
+
+@router.post("/profiling")
+def set_profiling(sample_rate: float = Body(..., embed=True)):
+    """Включает выборочное профилирование: доля профилируемых запросов от 0 до 1"""
+    instrumentation.set_profile_sample_rate(sample_rate)
+    return {"sample_rate": instrumentation.get_profile_sample_rate()}
+
+@router.delete("/")
+def reset_metrics():
+    instrumentation.reset_metrics()
+    coalescing.reset_stats()
+    return {"message": "Metrics reset"}
@@ -5,6 +5,9 @@ from database import get_db
 from schemas import PrinterParameter, PrinterParameterCreate
 from dal import printer as printer_dal
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(
     prefix="/printers",
@@ -45,7 +48,7 @@ def add_printer_parameter(
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Unexpected error in add_printer_parameter: {str(e)}")
+        logger.exception("Unexpected error in add_printer_parameter")
         raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
 
 @router.get("/{printer_id}/parameters", response_model=List[PrinterParameter])
@@ -67,7 +70,7 @@ def get_printer_parameters(printer_id: int, db: Session = Depends(get_db)):
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Unexpected error in get_printer_parameters: {str(e)}")
+        logger.exception("Unexpected error in get_printer_parameters")
         raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
 
 @router.delete("/{printer_id}/parameters/{param_id}", response_model=PrinterParameter)
@@ -94,5 +97,5 @@ def delete_printer_parameter(printer_id: int, param_id: int, db: Session = Depen
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Unexpected error in delete_printer_parameter: {str(e)}")
+        logger.exception("Unexpected error in delete_printer_parameter")
         raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}") 
\ No newline at end of file
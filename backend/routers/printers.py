@@ -1,17 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime, timedelta
 from database import get_db
 from schemas import PrinterCreate, Printer, Printing, PrintingCreate
 from crud import (
-    create_printer, get_printer, get_printers, 
-    update_printer, delete_printer
+    create_printer, get_printer, get_printers, get_printer_list,
+    update_printer, delete_printer, parse_capabilities,
+    occupy_printer, touch_printer, release_printer, get_active_printing
 )
-from printer_control import calculate_printer_downtime
+from printer_control import calculate_printer_downtime, apply_resume
+from services import prediction
 import models
 from models import Model, Printer as PrinterModel
 from sqlalchemy.exc import IntegrityError
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Что можно запросить в списке принтеров через include=
+PRINTER_LIST_INCLUDES = {"parameters"}
 
 router = APIRouter(
     prefix="/printers",
@@ -37,13 +46,32 @@ def read_printers(
     limit: int = 100, 
     sort_by: Optional[str] = None,
     sort_desc: bool = False,
+    status: Optional[List[str]] = Query(None, description="Статусы через запятую: idle,waiting"),
+    name_prefix: Optional[str] = Query(None, description="Имя принтера начинается с"),
+    active_only: bool = False,
+    param: Optional[List[str]] = Query(None, description="Фильтр по параметрам: nozzle=0.4, material=PETG, bed_x>=220"),
+    include: Optional[List[str]] = Query(None, description="Дополнительные данные в списке: parameters"),
     db: Session = Depends(get_db)
 ):
     try:
-        printers = get_printers(db, skip=skip, limit=limit, sort_by=sort_by, sort_desc=sort_desc)
-        return printers
+        capabilities = parse_capabilities(param)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # include=parameters или include=parameters,... - параметры нужны не всем клиентам списка
+    includes = {item.strip() for value in include or [] for item in value.split(",") if item.strip()}
+    unknown = includes - PRINTER_LIST_INCLUDES
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown include: {', '.join(sorted(unknown))}")
+    try:
+        # Готовые словари отдаются напрямую через orjson, минуя валидацию response_model
+        statuses = [item.strip() for value in status or [] for item in value.split(",") if item.strip()]
+        printers = get_printer_list(db, skip=skip, limit=limit, sort_by=sort_by, sort_desc=sort_desc,
+                                    status=statuses or None, capabilities=capabilities,
+                                    include_parameters="parameters" in includes,
+                                    name_prefix=name_prefix, active_only=active_only)
+        return ORJSONResponse(printers)
     except Exception as e:
-        print(f"Error in read_printers: {str(e)}")
+        logger.error("Error in read_printers: %s", e)
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 @router.get("/{printer_id}", response_model=Printer)
@@ -60,7 +88,7 @@ def read_printer(printer_id: int, db: Session = Depends(get_db)):
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error in read_printer: {str(e)}")
+        logger.error("Error in read_printer: %s", e)
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 @router.put("/{printer_id}", response_model=Printer)
@@ -97,25 +125,24 @@ def resume_printer(printer_id: int, db: Session = Depends(get_db)):
         if printer.status not in ["paused", "waiting"]:
             raise HTTPException(status_code=400, detail="Printer is not in paused or waiting state")
         
-        # Find current printing
-        current_printing = db.query(models.Printing).filter(
-            models.Printing.printer_id == printer_id,
-            models.Printing.real_time_stop == None
-        ).first()
+        # Current printing by the printer's pointer (primary key lookup)
+        current_printing = get_active_printing(printer)
+        current_time = datetime.now()
         
         if current_printing:
             if current_printing.status == "paused":
-                current_printing.status = "printing"
-                current_printing.pause_time = None
+                # Пауза учитывается в downtime и сдвигает расчётное окончание
+                apply_resume(current_printing, current_time)
                 db.add(current_printing)
         
         printer.status = "printing"
+        touch_printer(printer, current_time)
         db.add(printer)
         db.commit()
         db.refresh(printer)
         return printer
     except Exception as e:
-        print(f"Error in resume_printer: {str(e)}")
+        logger.error("Error in resume_printer: %s", e)
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
@@ -130,23 +157,32 @@ def confirm_printing(printer_id: int, db: Session = Depends(get_db)):
         # Allow confirmation from any state to handle race conditions
         # Printer status might have been changed but the UI still shows it as waiting
         
-        # Find the most recent printing that needs confirmation
-        current_printing = db.query(models.Printing).filter(
-            models.Printing.printer_id == printer_id
-        ).order_by(models.Printing.real_time_stop.desc() if models.Printing.real_time_stop else models.Printing.start_time.desc()).first()
+        # The printing awaiting confirmation is the one the printer still points to;
+        # fall back to the most recent printing if the pointer is empty
+        current_printing = printer.current_printing if printer.current_printing_id is not None else None
+        if current_printing is None:
+            current_printing = db.query(models.Printing).filter(
+                models.Printing.printer_id == printer_id
+            ).order_by(models.Printing.start_time.desc()).first()
         
         if not current_printing:
             raise HTTPException(status_code=404, detail="No printings found for this printer")
         
         # Mark as completed
+        was_completed = current_printing.status == "completed"
         current_printing.status = "completed"
         
         # Set real_time_stop if it's not already set to ensure cards disappear
         if not current_printing.real_time_stop:
             current_printing.real_time_stop = datetime.now()
+
+        # Learn from the finished job unless it was already counted when it completed
+        if not was_completed:
+            prediction.record_finished_printing(db, current_printing)
         
-        # Update printer status to idle
+        # Update printer status to idle and free it
         printer.status = "idle"
+        release_printer(printer)
         
         # Save changes
         db.add(printer)
@@ -156,7 +192,7 @@ def confirm_printing(printer_id: int, db: Session = Depends(get_db)):
         
         return printer
     except Exception as e:
-        print(f"Error confirming print job: {str(e)}")
+        logger.error("Error confirming print job: %s", e)
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
@@ -178,20 +214,25 @@ def start_printer(printer_id: int, printing_data: PrintingCreate, db: Session =
         if not model:
             raise HTTPException(status_code=404, detail="Model not found")
         
+        # Expected duration learned from finished printings (falls back to the model's time)
+        estimate = prediction.predict_duration(db, model.id, printer_id, model.printing_time)
+
         # Create new printing record
         new_printing = models.Printing(
             printer_id=printer_id,
             model_id=printing_data.model_id,
             status="printing",
             start_time=datetime.now(),
-            printing_time=model.printing_time
+            printing_time=estimate.minutes,
+            printing_time_std=estimate.std
         )
         
-        # Calculate expected end time based on model printing time
-        new_printing.calculated_time_stop = new_printing.start_time + timedelta(minutes=model.printing_time)
+        # Calculate expected end time based on the predicted printing time
+        new_printing.calculated_time_stop = new_printing.start_time + timedelta(minutes=estimate.minutes)
         
-        # Update printer status
+        # Update printer status and point it at the new printing
         printer.status = "printing"
+        occupy_printer(printer, new_printing, new_printing.start_time)
         
         db.add(new_printing)
         db.add(printer)
@@ -200,7 +241,7 @@ def start_printer(printer_id: int, printing_data: PrintingCreate, db: Session =
         
         return printer
     except Exception as e:
-        print(f"Error in start_printer: {str(e)}")
+        logger.error("Error in start_printer: %s", e)
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
@@ -215,26 +256,24 @@ def pause_printer(printer_id: int, db: Session = Depends(get_db)):
         if printer.status != "printing":
             raise HTTPException(status_code=400, detail=f"Printer is not printing, current status: {printer.status}")
         
-        # Find current printing
-        current_printing = db.query(models.Printing).filter(
-            models.Printing.printer_id == printer_id,
-            models.Printing.status == "printing",
-            models.Printing.real_time_stop == None
-        ).first()
+        # Current printing by the printer's pointer (primary key lookup)
+        current_printing = get_active_printing(printer)
+        current_time = datetime.now()
         
-        if current_printing:
+        if current_printing and current_printing.status == "printing":
             current_printing.status = "paused"
-            current_printing.pause_time = datetime.now()
+            current_printing.pause_time = current_time
             db.add(current_printing)
         
         printer.status = "paused"
+        touch_printer(printer, current_time)
         db.add(printer)
         db.commit()
         db.refresh(printer)
         
         return printer
     except Exception as e:
-        print(f"Error in pause_printer: {str(e)}")
+        logger.error("Error in pause_printer: %s", e)
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
@@ -251,17 +290,16 @@ def stop_printer(printer_id: int, data: dict = {}, db: Session = Depends(get_db)
         if printer.status not in allowed_states:
             raise HTTPException(status_code=400, detail=f"Printer cannot be stopped from current status: {printer.status}")
         
-        # Find current printing
-        current_printing = db.query(models.Printing).filter(
-            models.Printing.printer_id == printer_id,
-            models.Printing.real_time_stop == None
-        ).first()
+        # Current printing by the printer's pointer (primary key lookup)
+        current_printing = get_active_printing(printer)
         
         if not current_printing:
-            # Try to find the most recent printing
-            current_printing = db.query(models.Printing).filter(
-                models.Printing.printer_id == printer_id
-            ).order_by(models.Printing.start_time.desc()).first()
+            # Try the printing the printer still points to, then the most recent one
+            current_printing = printer.current_printing if printer.current_printing_id is not None else None
+            if current_printing is None:
+                current_printing = db.query(models.Printing).filter(
+                    models.Printing.printer_id == printer_id
+                ).order_by(models.Printing.start_time.desc()).first()
             
             if not current_printing:
                 raise HTTPException(status_code=404, detail="No printing found for this printer")
@@ -271,8 +309,8 @@ def stop_printer(printer_id: int, data: dict = {}, db: Session = Depends(get_db)
                 current_printing.status = "cancelled"
                 current_printing.stop_reason = data.get("reason", "other")
                 db.add(current_printing)
-                db.commit()
                 printer.status = "idle"
+                release_printer(printer)
                 db.add(printer)
                 db.commit()
                 db.refresh(printer)
@@ -282,8 +320,8 @@ def stop_printer(printer_id: int, data: dict = {}, db: Session = Depends(get_db)
                 current_printing.real_time_stop = datetime.now()
                 current_printing.stop_reason = data.get("reason", "other")
                 db.add(current_printing)
-                db.commit()
                 printer.status = "idle"
+                release_printer(printer, current_printing.real_time_stop)
                 db.add(printer)
                 db.commit()
                 db.refresh(printer)
@@ -307,10 +345,16 @@ def stop_printer(printer_id: int, data: dict = {}, db: Session = Depends(get_db)
             if current_printing.downtime:
                 actual_printing_time -= current_printing.downtime
             printer.total_print_time = (printer.total_print_time or 0) + actual_printing_time
-        
-        # If print was successful, mark as waiting for confirmation
-        # Otherwise mark as idle
-        printer.status = "waiting" if is_success else "idle"
+            prediction.record_finished_printing(db, current_printing)
+        
+        # If print was successful, mark as waiting for confirmation (the printer keeps
+        # pointing at the printing until it is confirmed). Otherwise mark as idle
+        if is_success:
+            printer.status = "waiting"
+            touch_printer(printer, current_time)
+        else:
+            printer.status = "idle"
+            release_printer(printer, current_time)
         
         # Save changes
         db.add(printer)
@@ -1,4 +1,5 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime, timedelta
@@ -11,6 +12,10 @@ from services import (
 )
 from printer_control import complete_printing, pause_printing, resume_printing, cancel_printing
 from models import Printing as PrintingModel
+from dal.printing import ACTIVE_STATUSES, PrintingFilters
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(
     prefix="/printings",
@@ -45,22 +50,70 @@ def create_new_printing(printing: PrintingCreate, db: Session = Depends(get_db))
         return result
     except Exception as e:
         db.rollback()
-        print(f"Error creating printing: {str(e)}")
+        logger.error("Error creating printing: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
+def _split(values: Optional[List[str]]) -> List[str]:
+    """status=printing,paused и status=printing&status=paused - одно и то же"""
+    return [item.strip() for value in values or [] for item in value.split(",") if item.strip()]
+
 @router.get("/", response_model=List[Printing])
 def read_printings(
     skip: int = 0, 
     limit: int = 100, 
     sort_by: Optional[str] = None,
     sort_desc: bool = False,
+    status: Optional[List[str]] = Query(None, description="Статусы через запятую: completed,cancelled"),
+    printer_id: Optional[List[str]] = Query(None, description="Принтеры через запятую"),
+    model_id: Optional[List[str]] = Query(None, description="Модели через запятую"),
+    started_from: Optional[datetime] = Query(None, description="Начаты не раньше"),
+    started_to: Optional[datetime] = Query(None, description="Начаты раньше"),
+    active_only: bool = False,
+    db: Session = Depends(get_db)
+):
+    try:
+        filters = PrintingFilters(
+            statuses=_split(status) or None,
+            printer_ids=[int(item) for item in _split(printer_id)] or None,
+            model_ids=[int(item) for item in _split(model_id)] or None,
+            started_from=started_from,
+            started_to=started_to,
+            active_only=active_only,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid id filter: {e}")
+    try:
+        # Готовые словари отдаются напрямую через orjson, минуя валидацию response_model
+        printings = printing_service.get_printing_list(db, skip=skip, limit=limit, sort_by=sort_by,
+                                                       sort_desc=sort_desc, filters=filters)
+        return ORJSONResponse(printings)
+    except Exception as e:
+        logger.error("Error in read_printings: %s", e)
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+@router.get("/active", response_model=List[Printing])
+def read_active_printings(
+    skip: int = 0,
+    limit: int = 100,
+    sort_by: Optional[str] = Query(None, description="progress, eta или поле печати"),
+    sort_desc: bool = False,
+    status: Optional[str] = Query(None, description="printing или paused"),
+    min_progress: Optional[float] = Query(None, ge=0, le=100),
+    max_progress: Optional[float] = Query(None, ge=0, le=100),
+    finishing_within: Optional[float] = Query(None, description="Закончатся в ближайшие N минут"),
     db: Session = Depends(get_db)
 ):
+    """Идущие печати: прогресс и время окончания считаются в запросе с учётом пауз"""
+    if status is not None and status not in ACTIVE_STATUSES:
+        raise HTTPException(status_code=400, detail=f"Status must be one of: {', '.join(ACTIVE_STATUSES)}")
     try:
-        printings = printing_service.get_printings(db, skip=skip, limit=limit, sort_by=sort_by, sort_desc=sort_desc)
-        return printings
+        printings = printing_service.get_active_printings(
+            db, skip=skip, limit=limit, sort_by=sort_by, sort_desc=sort_desc, status=status,
+            min_progress=min_progress, max_progress=max_progress, finishing_within=finishing_within
+        )
+        return ORJSONResponse(printings)
     except Exception as e:
-        print(f"Error in read_printings: {str(e)}")
+        logger.error("Error in read_active_printings: %s", e)
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 @router.get("/{printing_id}", response_model=Printing)
@@ -73,7 +126,7 @@ def read_printing(printing_id: int, db: Session = Depends(get_db)):
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error in read_printing: {str(e)}")
+        logger.error("Error in read_printing: %s", e)
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 @router.put("/{printing_id}", response_model=Printing)
@@ -84,7 +137,7 @@ def update_existing_printing(printing_id: int, printing: PrintingCreate, db: Ses
             raise HTTPException(status_code=404, detail="Printing not found")
         return db_printing
     except Exception as e:
-        print(f"Error updating printing: {str(e)}")
+        logger.error("Error updating printing: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/{printing_id}", response_model=Printing)
@@ -95,7 +148,7 @@ def delete_existing_printing(printing_id: int, db: Session = Depends(get_db)):
             raise HTTPException(status_code=404, detail="Printing not found")
         return db_printing
     except Exception as e:
-        print(f"Error deleting printing: {str(e)}")
+        logger.error("Error deleting printing: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/{printing_id}/complete", response_model=Printing)
@@ -106,7 +159,7 @@ def complete_existing_printing(printing_id: int, db: Session = Depends(get_db)):
             raise HTTPException(status_code=404, detail="Printing not found or already completed")
         return db_printing
     except Exception as e:
-        print(f"Error completing printing: {str(e)}")
+        logger.error("Error completing printing: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/{printing_id}/pause", response_model=Printing)
@@ -117,7 +170,7 @@ def pause_existing_printing(printing_id: int, db: Session = Depends(get_db)):
             raise HTTPException(status_code=404, detail="Printing not found or already completed")
         return db_printing
     except Exception as e:
-        print(f"Error pausing printing: {str(e)}")
+        logger.error("Error pausing printing: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/{printing_id}/resume", response_model=Printing)
@@ -128,7 +181,7 @@ def resume_existing_printing(printing_id: int, db: Session = Depends(get_db)):
             raise HTTPException(status_code=404, detail="Printing not found or already completed")
         return db_printing
     except Exception as e:
-        print(f"Error resuming printing: {str(e)}")
+        logger.error("Error resuming printing: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/{printing_id}/cancel", response_model=Printing)
@@ -139,7 +192,7 @@ def cancel_existing_printing(printing_id: int, db: Session = Depends(get_db)):
             raise HTTPException(status_code=404, detail="Printing not found or already completed")
         return db_printing
     except Exception as e:
-        print(f"Error canceling printing: {str(e)}")
+        logger.error("Error canceling printing: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/{printing_id}/confirm", response_model=Printing)
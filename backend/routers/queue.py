@@ -0,0 +1,93 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from database import get_db
+from schemas import PrintQueueCreate, PrintQueue
+from services import queue as queue_service
+from services import model as model_service
+from services import printer as printer_service
+from services import planner
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(
+    prefix="/queue",
+    tags=["queue"]
+)
+
+@router.post("/", response_model=PrintQueue)
+def create_queue_item(item: PrintQueueCreate, db: Session = Depends(get_db)):
+    """Поставить модель в очередь печати"""
+    if item.quantity < 1:
+        raise HTTPException(status_code=400, detail="Quantity must be at least 1")
+    if not model_service.get_model(db, item.model_id):
+        raise HTTPException(status_code=404, detail="Model not found")
+    if item.printer_id is not None and not printer_service.get_printer(db, item.printer_id):
+        raise HTTPException(status_code=404, detail="Printer not found")
+    return queue_service.create_queue_item(db, item)
+
+@router.get("/", response_model=List[PrintQueue])
+def read_queue(
+    skip: int = 0,
+    limit: int = 100,
+    status: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    return queue_service.get_queue_items(db, skip=skip, limit=limit, status=status)
+
+@router.post("/dispatch")
+def dispatch_queue(db: Session = Depends(get_db)):
+    """Назначить задания из очереди свободным принтерам"""
+    try:
+        printings = queue_service.dispatch_queue(db)
+        return {"dispatched": len(printings), "printing_ids": [p.id for p in printings]}
+    except Exception as e:
+        db.rollback()
+        logger.error("Error dispatching queue: %s", e)
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+@router.get("/plan")
+def read_queue_plan(db: Session = Depends(get_db)):
+    """
+    План распределения очереди по принтерам, минимизирующий время завершения
+    всей очереди, с ожидаемым временем окончания каждого задания
+    """
+    try:
+        return planner.build_plan(db)
+    except Exception as e:
+        logger.error("Error building queue plan: %s", e)
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+@router.get("/{item_id}", response_model=PrintQueue)
+def read_queue_item(item_id: int, db: Session = Depends(get_db)):
+    db_item = queue_service.get_queue_item(db, item_id)
+    if db_item is None:
+        raise HTTPException(status_code=404, detail="Queue item not found")
+    return db_item
+
+@router.put("/{item_id}", response_model=PrintQueue)
+def update_queue_item(item_id: int, item: PrintQueueCreate, db: Session = Depends(get_db)):
+    """Изменить задание, которое ещё ждёт в очереди"""
+    if item.quantity < 1:
+        raise HTTPException(status_code=400, detail="Quantity must be at least 1")
+    # Строка заблокирована до коммита - диспетчер не отправит задание посреди изменения
+    db_item = queue_service.get_queue_item(db, item_id, for_update=True)
+    if db_item is None:
+        raise HTTPException(status_code=404, detail="Queue item not found")
+    if db_item.status != "queued":
+        raise HTTPException(status_code=409, detail=f"Queue item is already {db_item.status}")
+    if item.quantity < (db_item.dispatched_count or 0):
+        raise HTTPException(status_code=409, detail="Quantity is less than the number already dispatched")
+    if not model_service.get_model(db, item.model_id):
+        raise HTTPException(status_code=404, detail="Model not found")
+    if item.printer_id is not None and not printer_service.get_printer(db, item.printer_id):
+        raise HTTPException(status_code=404, detail="Printer not found")
+    return queue_service.update_queue_item(db, item_id, item)
+
+@router.delete("/{item_id}", response_model=PrintQueue)
+def delete_queue_item(item_id: int, db: Session = Depends(get_db)):
+    db_item = queue_service.delete_queue_item(db, item_id)
+    if db_item is None:
+        raise HTTPException(status_code=404, detail="Queue item not found")
+    return db_item
@@ -1,25 +1,42 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
 from typing import Optional, Dict, Any
 from datetime import datetime, timedelta
-from fastapi.responses import StreamingResponse
+from fastapi.responses import ORJSONResponse, StreamingResponse
 import csv
+import os
 from io import StringIO
 
 from database import get_db
 from crud import get_printers, get_models, get_printings
-from reports import get_daily_report, get_printer_report, get_model_report
-from models import Printer, Model, Printing
+from reports import (
+    get_daily_report, get_printer_report, get_model_report,
+    get_printer_status_report, get_printing_efficiency_report, get_analytics_report, run_report
+)
+import coalescing
+import quantiles
+import report_jobs
+import schemas
 
 router = APIRouter(
     prefix="/reports",
     tags=["reports"]
 )
 
+# Одинаковые одновременные запросы отчётов считаются один раз; результат свежий
+# REPORTS_CACHE_TTL секунд и ещё REPORTS_STALE_TTL отдаётся, пока идёт пересчёт
+REPORTS_CACHE_TTL = float(os.environ.get("REPORTS_CACHE_TTL", "30"))
+REPORTS_STALE_TTL = float(os.environ.get("REPORTS_STALE_TTL", "300"))
+
+_daily_cache = coalescing.get_cache("reports.daily", REPORTS_CACHE_TTL, REPORTS_STALE_TTL)
+_efficiency_cache = coalescing.get_cache("reports.printing_efficiency", REPORTS_CACHE_TTL, REPORTS_STALE_TTL)
+_analytics_cache = coalescing.get_cache("reports.analytics", REPORTS_CACHE_TTL, REPORTS_STALE_TTL)
+_printer_status_cache = coalescing.get_cache("reports.printer_status", REPORTS_CACHE_TTL, REPORTS_STALE_TTL)
+
 @router.get("/daily/")
-def get_daily_report_endpoint(date: Optional[str] = None, db: Session = Depends(get_db)):
+def get_daily_report_endpoint(date: Optional[str] = None):
     report_date = datetime.strptime(date, "%Y-%m-%d").date() if date else datetime.now().date()
-    return get_daily_report(db, report_date)
+    return _daily_cache.get(report_date, lambda: run_report(get_daily_report, report_date))
 
 @router.get("/printers/{printer_id}")
 def get_printer_report_endpoint(printer_id: int, db: Session = Depends(get_db)):
@@ -36,111 +53,94 @@ def get_model_report_endpoint(model_id: int, db: Session = Depends(get_db)):
     return report
 
 @router.get("/printer-status")
-def get_printer_status_report(db: Session = Depends(get_db)) -> Dict[str, Any]:
-    """Get a comprehensive report on the status of all printers"""
-    printers = db.query(Printer).all()
-    
-    # Count printers by status
-    status_counts = {
-        "idle": 0,
-        "printing": 0,
-        "paused": 0,
-        "error": 0
-    }
-    
-    printer_data = []
-    total_efficiency = 0
-    
-    for printer in printers:
-        # Count by status
-        if printer.status in status_counts:
-            status_counts[printer.status] += 1
-        
-        # Calculate printer efficiency (time printing vs. total time available)
-        total_time = printer.total_print_time + printer.total_downtime
-        efficiency = (printer.total_print_time / total_time * 100) if total_time > 0 else 0
-        total_efficiency += efficiency
-        
-        printer_data.append({
-            "id": printer.id,
-            "name": printer.name,
-            "status": printer.status,
-            "efficiency": round(efficiency, 1),
-            "total_print_time": round(printer.total_print_time, 1),
-            "total_downtime": round(printer.total_downtime, 1)
-        })
-    
-    average_efficiency = total_efficiency / len(printers) if printers else 0
-    
-    return {
-        "total_printers": len(printers),
-        "status_counts": status_counts,
-        "printers": printer_data,
-        "average_efficiency": round(average_efficiency, 1)
-    }
+def get_printer_status_report_endpoint(include_printers: bool = True) -> Dict[str, Any]:
+    """
+    Get a comprehensive report on the status of all printers.
+    Counts and average efficiency come from the maintained status counters;
+    include_printers=false skips the per-printer list and makes the report O(1).
+    """
+    report = _printer_status_cache.get(
+        include_printers, lambda: run_report(get_printer_status_report, include_printers)
+    )
+    return ORJSONResponse(report)
 
 @router.get("/printing-efficiency")
-def get_printing_efficiency_report(db: Session = Depends(get_db),
-                                  days: int = 30) -> Dict[str, Any]:
+def get_printing_efficiency_report_endpoint(days: int = 30) -> Dict[str, Any]:
     """Get report on printing efficiency over time"""
-    # Get data for the specified time period
-    start_date = datetime.now() - timedelta(days=days)
-    
-    printings = db.query(Printing).filter(Printing.start_time >= start_date).all()
-    models = db.query(Model).all()
-    
-    # Group printings by day
-    daily_printings = {}
-    end_date = datetime.now()
-    current_date = start_date
-    
-    # Initialize all days in the range
-    while current_date <= end_date:
-        date_str = current_date.strftime("%Y-%m-%d")
-        daily_printings[date_str] = 0
-        current_date += timedelta(days=1)
-    
-    # Count printings by day
-    for printing in printings:
-        date_str = printing.start_time.strftime("%Y-%m-%d")
-        if date_str in daily_printings:
-            daily_printings[date_str] += 1
-    
-    # Calculate downtime by printer
-    downtime_by_printer = {}
-    printers = db.query(Printer).all()
-    
-    for printer in printers:
-        if printer.name not in downtime_by_printer:
-            downtime_by_printer[printer.name] = 0
-        
-        # Add current downtime
-        downtime_by_printer[printer.name] += printer.total_downtime * 60  # Convert to minutes
-    
-    # Get model data for the report
-    model_data = []
-    for model in models:
-        model_printings = [p for p in printings if p.model_id == model.id]
-        total_prints = len(model_printings)
-        
-        if total_prints > 0:
-            success_rate = len([p for p in model_printings if p.status == 'completed']) / total_prints * 100
-        else:
-            success_rate = 0
-            
-        model_data.append({
-            "id": model.id,
-            "name": model.name,
-            "total_prints": total_prints,
-            "success_rate": round(success_rate, 1)
-        })
-    
-    return {
-        "total_printings": len(printings),
-        "daily_printings": daily_printings,
-        "downtime_by_printer": downtime_by_printer,
-        "models": model_data
-    }
+    report = _efficiency_cache.get(days, lambda: run_report(get_printing_efficiency_report, days))
+    return ORJSONResponse(report)
+
+@router.get("/analytics")
+def get_analytics_report_endpoint(bucket: str = "day", group_by: Optional[str] = None, days: int = 30,
+                                  start: Optional[datetime] = None, end: Optional[datetime] = None,
+                                  metrics: Optional[str] = None):
+    """
+    Printings per time bucket (hour, day, week, month), optionally grouped by
+    printer, model or status. Metrics: count, print_minutes, downtime, success_rate
+    (comma-separated, all by default). Columnar: one array per metric per series,
+    aligned with "buckets".
+    """
+    metric_list = [metric.strip() for metric in metrics.split(",") if metric.strip()] if metrics else None
+    key = (bucket, group_by, days, start, end, tuple(metric_list or ()))
+    try:
+        report = _analytics_cache.get(key, lambda: run_report(
+            get_analytics_report, bucket, group_by, days, start, end, metric_list
+        ))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return ORJSONResponse(report)
+
+@router.get("/quantiles")
+def get_quantiles_report(scope: str = "model", metric: str = "duration", ids: Optional[str] = None,
+                         q: str = "0.5,0.9,0.99", db: Session = Depends(get_db)):
+    """
+    Quantiles of print duration or pause downtime (minutes) from per-model or
+    per-printer sketches. ids is a comma-separated list of model or printer ids;
+    the merged group is always returned, each id separately when ids are given.
+    """
+    try:
+        id_list = [int(item) for item in ids.split(",") if item.strip()] if ids else None
+        quantile_list = [float(item) for item in q.split(",") if item.strip()]
+        report = quantiles.get_quantiles(db, scope, metric, id_list, quantile_list)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return ORJSONResponse(report)
+
+@router.post("/jobs", status_code=202)
+def submit_report_job(job_in: schemas.ReportJobCreate, db: Session = Depends(get_db)):
+    """
+    Queue a report to be computed off the request path. An identical spec that is
+    still running or finished within REPORT_JOB_RESULT_TTL returns the existing job.
+    """
+    try:
+        job, reused = report_jobs.submit(db, job_in.report, job_in.params)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return ORJSONResponse({**report_jobs.as_dict(job), "reused": reused}, status_code=202)
+
+@router.get("/jobs/{job_id}", response_model=schemas.ReportJob)
+def get_report_job(job_id: int, db: Session = Depends(get_db)):
+    """Job status and progress for polling"""
+    job = report_jobs.get_job(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Report job not found")
+    return report_jobs.as_dict(job)
+
+@router.get("/jobs/{job_id}/result")
+def get_report_job_result(job_id: int, request: Request, db: Session = Depends(get_db)):
+    """Stored report result; the ETag is the spec hash, so clients can revalidate cheaply"""
+    job = report_jobs.get_job(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Report job not found")
+    if job.status == "failed":
+        raise HTTPException(status_code=409, detail=f"Report job failed: {job.error}")
+    if job.status != "completed":
+        raise HTTPException(status_code=409, detail=f"Report job is {job.status}")
+    etag = f'"{job.spec_hash}-{job.id}"'
+    headers = {"ETag": etag, "Cache-Control": f"private, max-age={int(report_jobs.REPORT_JOB_RESULT_TTL)}"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=job.result, media_type="application/json", headers=headers)
 
 @router.get("/printers/export/", response_class=StreamingResponse)
 def export_printers_report(db: Session = Depends(get_db)):
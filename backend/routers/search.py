@@ -0,0 +1,36 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.orm import Session
+from typing import List, Optional
+import logging
+
+from database import get_db
+from services import search as search_service
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(
+    prefix="/search",
+    tags=["search"]
+)
+
+@router.get("/")
+def search(
+    q: str,
+    type: Optional[List[str]] = Query(None, description="printers, models (через запятую); по умолчанию оба"),
+    limit: int = Query(10, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    """
+    Поиск принтеров (по имени и модели принтера) и моделей (по имени) по части
+    имени. В Postgres с pg_trgm находит и строки с опечатками; результаты
+    каждого типа отсортированы по релевантности.
+    """
+    types = [item.strip() for value in type or [] for item in value.split(",") if item.strip()]
+    try:
+        return ORJSONResponse(search_service.search(db, q, types or None, limit))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error("Error in search: %s", e)
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
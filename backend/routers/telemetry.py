@@ -0,0 +1,21 @@
+from fastapi import APIRouter, Body
+from typing import Any, Dict, List, Union
+
+import telemetry
+
+router = APIRouter(
+    prefix="/telemetry",
+    tags=["telemetry"]
+)
+
+@router.post("/")
+def receive_telemetry(data: Union[Dict[str, Any], List[Dict[str, Any]]] = Body(...)):
+    """Приём пакетов телеметрии в формате getter_data (один пакет или список)"""
+    packets = data if isinstance(data, list) else [data]
+    accepted = sum(1 for packet in packets if telemetry.ingest(packet))
+    return {"received": len(packets), "accepted": accepted}
+
+@router.get("/")
+def read_telemetry():
+    """Текущее состояние принтеров по данным телеметрии"""
+    return telemetry.get_snapshot()
@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
-from typing import Optional, List, Union
+from typing import Any, Dict, Optional, List, Union
 
 class PrinterBase(BaseModel):
     name: Optional[str]
@@ -29,6 +29,8 @@ class PrinterParameter(PrinterParameterBase):
 
 class Printer(PrinterBase):
     id: Union[int, str]
+    current_printing_id: Optional[int] = None
+    last_activity_at: Optional[datetime] = None
     parameters: Optional[List[PrinterParameter]] = []
     
     class Config:
@@ -70,6 +72,46 @@ class Printing(PrintingBase):
     status: Optional[str] = "printing"
     pause_time: Optional[datetime] = None
     stop_reason: Optional[str] = None
+    printing_time_std: Optional[float] = None  # в минутах
+    eta_low: Optional[datetime] = None   # 90% интервал времени окончания
+    eta_high: Optional[datetime] = None
+    eta: Optional[datetime] = None       # ожидаемое окончание с учётом текущей паузы
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class PrintQueueBase(BaseModel):
+    model_id: int
+    printer_id: Optional[int] = None  # Если задан, задание печатается только на этом принтере
+    quantity: int = 1
+    priority: int = 0
+
+class PrintQueueCreate(PrintQueueBase):
+    pass
+
+class PrintQueue(PrintQueueBase):
+    id: int
+    dispatched_count: int = 0
+    status: str = "queued"
+    created_at: Optional[datetime] = None
+    start_time: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class ReportJobCreate(BaseModel):
+    report: str                        # printing-efficiency, daily, printer-status, printer, model
+    params: Dict[str, Any] = {}
+
+class ReportJob(BaseModel):
+    id: int
+    report: str
+    params: Dict[str, Any]
+    spec_hash: str
+    status: str                        # queued, running, completed, failed
+    progress: float = 0.0              # 0..1
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
@@ -0,0 +1,213 @@
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from typing import Dict, List, NamedTuple, Optional
+import heapq
+import time
+import models
+from . import prediction
+
+# Ограничения локального поиска: план должен строиться за доли секунды
+LOCAL_SEARCH_MAX_ITERATIONS = 200
+LOCAL_SEARCH_TIME_BUDGET = 0.3  # секунд
+
+class PlanJob(NamedTuple):
+    key: int                      # порядковый номер экземпляра задания
+    queue_item_id: int
+    model_id: int
+    duration: float               # минут
+    priority: int = 0
+    printer_id: Optional[int] = None  # привязка к принтеру
+
+class PlanPrinter(NamedTuple):
+    printer_id: int
+    available_in: float           # через сколько минут принтер освободится
+
+def _lpt(jobs: List[PlanJob], printers: List[PlanPrinter]):
+    """
+    Жадное распределение LPT: задания по убыванию длительности, каждое - на
+    принтер, который освободится раньше всех. Привязанные задания ставятся
+    на свой принтер до остальных.
+    """
+    loads = {p.printer_id: p.available_in for p in printers}
+    assigned: Dict[int, List[PlanJob]] = {p.printer_id: [] for p in printers}
+    unassigned = []
+
+    free_jobs = []
+    for job in jobs:
+        if job.printer_id is None:
+            free_jobs.append(job)
+        elif job.printer_id in loads:
+            assigned[job.printer_id].append(job)
+            loads[job.printer_id] += job.duration
+        else:
+            unassigned.append(job)
+
+    heap = [(load, printer_id) for printer_id, load in loads.items()]
+    heapq.heapify(heap)
+    for job in sorted(free_jobs, key=lambda j: j.duration, reverse=True):
+        load, printer_id = heapq.heappop(heap)
+        assigned[printer_id].append(job)
+        load += job.duration
+        loads[printer_id] = load
+        heapq.heappush(heap, (load, printer_id))
+
+    return assigned, loads, unassigned
+
+def _improve(assigned: Dict[int, List[PlanJob]], loads: Dict[int, float]) -> int:
+    """
+    Локальный поиск: переносит задание с самого загруженного принтера на
+    самый свободный или меняет их задания местами, пока это сокращает
+    максимальную загрузку. Возвращает число улучшений.
+    """
+    improvements = 0
+    deadline = time.perf_counter() + LOCAL_SEARCH_TIME_BUDGET
+    for _ in range(LOCAL_SEARCH_MAX_ITERATIONS):
+        if time.perf_counter() > deadline:
+            break
+        busiest = max(loads, key=loads.get)
+        idlest = min(loads, key=loads.get)
+        gap = loads[busiest] - loads[idlest]
+        if gap <= 0:
+            break
+
+        movable = [j for j in assigned[busiest] if j.printer_id is None]
+        best = None  # (новый максимум пары, задание с busiest, задание с idlest)
+
+        # Перенос: задание короче разрыва уменьшает загрузку busiest, не делая idlest хуже
+        for job in movable:
+            if 0 < job.duration < gap:
+                pair_max = max(loads[busiest] - job.duration, loads[idlest] + job.duration)
+                if best is None or pair_max < best[0]:
+                    best = (pair_max, job, None)
+
+        # Обмен: разница длительностей должна лежать в (0, gap)
+        for job in movable:
+            for other in assigned[idlest]:
+                if other.printer_id is not None:
+                    continue
+                delta = job.duration - other.duration
+                if 0 < delta < gap:
+                    pair_max = max(loads[busiest] - delta, loads[idlest] + delta)
+                    if best is None or pair_max < best[0]:
+                        best = (pair_max, job, other)
+
+        if best is None or best[0] >= loads[busiest]:
+            break
+
+        _, job, other = best
+        assigned[busiest].remove(job)
+        assigned[idlest].append(job)
+        loads[busiest] -= job.duration
+        loads[idlest] += job.duration
+        if other is not None:
+            assigned[idlest].remove(other)
+            assigned[busiest].append(other)
+            loads[idlest] -= other.duration
+            loads[busiest] += other.duration
+        improvements += 1
+    return improvements
+
+def plan_assignments(jobs: List[PlanJob], printers: List[PlanPrinter]) -> Dict:
+    """
+    Строит план печати, минимизирующий время завершения всей очереди.
+    Время в результате - в минутах от текущего момента.
+    """
+    if not printers:
+        return {"makespan": 0.0, "printers": {}, "unassigned": list(jobs), "improvements": 0}
+
+    assigned, loads, unassigned = _lpt(jobs, printers)
+    improvements = _improve(assigned, loads)
+
+    schedule = {}
+    available = {p.printer_id: p.available_in for p in printers}
+    for printer_id, printer_jobs in assigned.items():
+        # Порядок на принтере не влияет на общий срок, поэтому важные задания - первыми
+        printer_jobs.sort(key=lambda j: (-j.priority, j.queue_item_id, j.key))
+        current = available[printer_id]
+        entries = []
+        for job in printer_jobs:
+            entries.append((job, current, current + job.duration))
+            current += job.duration
+        schedule[printer_id] = entries
+
+    return {
+        "makespan": max(loads.values()),
+        "printers": schedule,
+        "unassigned": unassigned,
+        "improvements": improvements,
+    }
+
+def _printer_available_in(printer: models.Printer, printing: Optional[models.Printing], now: datetime) -> Optional[float]:
+    """Через сколько минут принтер освободится; None - принтер недоступен для плана"""
+    if printer.status == "error":
+        return None
+    if printer.status in ["printing", "paused"] and printing is not None and printing.calculated_time_stop:
+        finish = printing.calculated_time_stop
+        if printing.status == "paused" and printing.pause_time:
+            # Пока принтер стоит на паузе, окончание сдвигается
+            finish += now - printing.pause_time
+        return max(0.0, (finish - now).total_seconds() / 60)
+    return 0.0
+
+def build_plan(db: Session) -> Dict:
+    """Строит план распределения очереди по текущему состоянию принтеров"""
+    now = datetime.now()
+
+    active_printings = {
+        p.printer_id: p for p in db.query(models.Printing).filter(
+            models.Printing.real_time_stop == None,
+            models.Printing.status.in_(["printing", "paused"])
+        ).all()
+    }
+    printers = []
+    for printer in db.query(models.Printer).all():
+        available_in = _printer_available_in(printer, active_printings.get(printer.id), now)
+        if available_in is not None:
+            printers.append(PlanPrinter(printer.id, available_in))
+
+    durations = prediction.predict_model_durations(db)
+    jobs = []
+    for item in db.query(models.PrintQueue).filter(models.PrintQueue.status == "queued").all():
+        remaining = (item.quantity or 1) - (item.dispatched_count or 0)
+        for _ in range(max(0, remaining)):
+            jobs.append(PlanJob(
+                key=len(jobs),
+                queue_item_id=item.id,
+                model_id=item.model_id,
+                duration=durations.get(item.model_id) or 0.0,
+                priority=item.priority or 0,
+                printer_id=item.printer_id
+            ))
+
+    plan = plan_assignments(jobs, printers)
+
+    def at(minutes: float) -> datetime:
+        return now + timedelta(minutes=minutes)
+
+    return {
+        "generated_at": now,
+        "total_jobs": len(jobs),
+        "makespan_minutes": round(plan["makespan"], 1),
+        "expected_completion": at(plan["makespan"]),
+        "printers": [
+            {
+                "printer_id": printer_id,
+                "expected_completion": at(entries[-1][2]) if entries else None,
+                "jobs": [
+                    {
+                        "queue_item_id": job.queue_item_id,
+                        "model_id": job.model_id,
+                        "expected_start": at(start),
+                        "expected_completion": at(finish),
+                    }
+                    for job, start, finish in entries
+                ],
+            }
+            for printer_id, entries in plan["printers"].items()
+            if entries
+        ],
+        "unassigned": [
+            {"queue_item_id": job.queue_item_id, "model_id": job.model_id, "printer_id": job.printer_id}
+            for job in plan["unassigned"]
+        ],
+    }
@@ -0,0 +1,117 @@
+from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import Dict, NamedTuple, Optional, Tuple
+import math
+import models
+import quantiles
+from dal.sql import insert_missing
+
+# printer_id для статистики модели по всем принтерам
+ALL_PRINTERS = 0
+# Сколько завершённых печатей нужно, чтобы доверять статистике
+MIN_SAMPLES = 3
+# Квантиль нормального распределения для 90% интервала
+INTERVAL_Z = 1.645
+
+class Prediction(NamedTuple):
+    minutes: float               # ожидаемая длительность печати
+    std: Optional[float]         # стандартное отклонение прогноза (None - нет истории)
+    samples: int                 # по скольким печатям построен прогноз
+    source: str                  # printer, model или static
+
+    @property
+    def low(self) -> float:
+        return max(0.0, self.minutes - INTERVAL_Z * self.std) if self.std is not None else self.minutes
+
+    @property
+    def high(self) -> float:
+        return self.minutes + INTERVAL_Z * self.std if self.std is not None else self.minutes
+
+def actual_duration(printing: models.Printing) -> Optional[float]:
+    """Чистое время печати в минутах: real_time_stop - start_time - downtime"""
+    if not printing.real_time_stop or not printing.start_time:
+        return None
+    minutes = (printing.real_time_stop - printing.start_time).total_seconds() / 60 - (printing.downtime or 0)
+    return minutes if minutes > 0 else None
+
+def _get_stats(db: Session, model_id: int, printer_id: int) -> models.DurationStats:
+    """Строка статистики под блокировкой; первую строку пары создаёт без гонки параллельных вставок"""
+    query = db.query(models.DurationStats).filter(
+        models.DurationStats.model_id == model_id,
+        models.DurationStats.printer_id == printer_id
+    ).with_for_update()
+    stats = query.first()
+    if stats is None:
+        insert_missing(db, models.DurationStats, model_id=model_id, printer_id=printer_id, count=0, mean=0.0, m2=0.0)
+        stats = query.one()
+    return stats
+
+def record_duration(db: Session, model_id: int, printer_id: int, minutes: float):
+    """
+    Добавляет длительность печати в статистику модели на принтере и модели в целом.
+    Среднее и дисперсия обновляются по Уэлфорду, история не перечитывается.
+    Коммит остаётся за вызывающим кодом.
+    """
+    for scope in (printer_id, ALL_PRINTERS):
+        stats = _get_stats(db, model_id, scope)
+        stats.count = (stats.count or 0) + 1
+        delta = minutes - (stats.mean or 0.0)
+        stats.mean = (stats.mean or 0.0) + delta / stats.count
+        stats.m2 = (stats.m2 or 0.0) + delta * (minutes - stats.mean)
+        stats.updated_at = datetime.now()
+
+def record_finished_printing(db: Session, printing: models.Printing):
+    """Учитывает завершённую печать в статистике длительностей и скетчах квантилей"""
+    if printing.status != "completed" or not printing.model_id or not printing.printer_id:
+        return
+    minutes = actual_duration(printing)
+    if minutes is not None:
+        record_duration(db, printing.model_id, int(printing.printer_id), minutes)
+        quantiles.record_printing(db, printing)
+
+def _to_prediction(stats: Optional[models.DurationStats], source: str) -> Optional[Prediction]:
+    if stats is None or (stats.count or 0) < MIN_SAMPLES:
+        return None
+    variance = stats.m2 / (stats.count - 1)
+    # Интервал для отдельной печати, а не для среднего: sqrt(var * (1 + 1/n))
+    std = math.sqrt(variance * (1 + 1 / stats.count))
+    return Prediction(stats.mean, std, stats.count, source)
+
+def load_stats(db: Session, model_ids) -> Dict[Tuple[int, int], models.DurationStats]:
+    """Статистика длительностей для набора моделей одним запросом: (model_id, printer_id) -> строка"""
+    return {
+        (s.model_id, s.printer_id): s for s in db.query(models.DurationStats).filter(
+            models.DurationStats.model_id.in_(set(model_ids))
+        ).all()
+    }
+
+def predict_from_stats(stats: Dict[Tuple[int, int], models.DurationStats], model_id: int,
+                       printer_id: Optional[int], fallback: Optional[float]) -> Prediction:
+    """
+    Прогноз длительности печати модели на принтере: сначала по истории этой пары,
+    затем по истории модели на всех принтерах, иначе - статическое время модели.
+    """
+    if printer_id is not None:
+        prediction = _to_prediction(stats.get((model_id, int(printer_id))), "printer")
+        if prediction:
+            return prediction
+    prediction = _to_prediction(stats.get((model_id, ALL_PRINTERS)), "model")
+    if prediction:
+        return prediction
+    return Prediction(fallback or 0.0, None, 0, "static")
+
+def predict_duration(db: Session, model_id: int, printer_id: Optional[int], fallback: Optional[float]) -> Prediction:
+    return predict_from_stats(load_stats(db, [model_id]), model_id, printer_id, fallback)
+
+def predict_model_durations(db: Session) -> Dict[int, float]:
+    """Ожидаемая длительность каждой модели по всем принтерам (для планировщика очереди)"""
+    durations = {
+        model_id: printing_time or 0.0
+        for model_id, printing_time in db.query(models.Model.id, models.Model.printing_time).all()
+    }
+    for stats in db.query(models.DurationStats).filter(
+        models.DurationStats.printer_id == ALL_PRINTERS,
+        models.DurationStats.count >= MIN_SAMPLES
+    ).all():
+        durations[stats.model_id] = stats.mean
+    return durations
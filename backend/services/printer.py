@@ -1,6 +1,15 @@
 from sqlalchemy.orm import Session
+from typing import Any, Dict, List, Optional, Tuple, Union
+from datetime import datetime
+import re
 from dal import printer as printer_dal
 from schemas import PrinterCreate
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Условие на параметр принтера: nozzle=0.4, material=PETG, bed_x>=220
+CAPABILITY_PATTERN = re.compile(r"^\s*([^=!<>]+?)\s*(>=|<=|!=|=|>|<)\s*(.*?)\s*$")
 
 def format_hours_to_hhmm(hours: float) -> str:
     """Конвертирует часы в формат HH:mm"""
@@ -56,7 +65,7 @@ def create_printer(db: Session, printer: PrinterCreate):
             result.id = str(result.id)
         return result
     except Exception as e:
-        print(f"Error in create_printer: {str(e)}")
+        logger.error("Error in create_printer: %s", e)
         raise
 
 def get_printer(db: Session, printer_id: int):
@@ -67,19 +76,90 @@ def get_printer(db: Session, printer_id: int):
             result.id = str(result.id)
         return result
     except Exception as e:
-        print(f"Error in get_printer: {str(e)}")
+        logger.error("Error in get_printer: %s", e)
+        return None
+
+def occupy_printer(printer, printing, current_time: datetime):
+    """
+    Принтер занят печатью. Вызывается в той же транзакции, что и смена статуса,
+    поэтому указатель на печать не расходится со статусом принтера.
+    """
+    printer.current_printing = printing
+    printer.last_activity_at = current_time
+
+def touch_printer(printer, current_time: datetime):
+    """Пауза, возобновление или окончание печати - принтер остаётся за ней (ждёт подтверждения)"""
+    printer.last_activity_at = current_time
+
+def release_printer(printer, current_time: Optional[datetime] = None):
+    """Принтер свободен; current_time - если освобождение само является окончанием печати"""
+    printer.current_printing = None
+    if current_time is not None:
+        printer.last_activity_at = current_time
+
+def get_active_printing(printer):
+    """Идущая (или стоящая на паузе) печать принтера по указателю - выборка по первичному ключу"""
+    printing = printer.current_printing if printer.current_printing_id is not None else None
+    if printing is None or printing.real_time_stop is not None:
         return None
+    return printing
 
-def get_printers(db: Session, skip: int = 0, limit: int = 100, sort_by: str = None, sort_desc: bool = False):
+def parse_capabilities(expressions: Optional[List[str]]) -> List[Tuple[str, str, str]]:
+    """Разбирает условия вида name=value; при ошибке формата бросает ValueError"""
+    capabilities = []
+    for expression in expressions or []:
+        match = CAPABILITY_PATTERN.match(expression)
+        if not match or not match.group(3):
+            raise ValueError(f"Invalid parameter filter: {expression!r}")
+        capabilities.append(match.groups())
+    return capabilities
+
+def get_printers(db: Session, skip: int = 0, limit: int = 100, sort_by: str = None, sort_desc: bool = False,
+                 status: Optional[str] = None, capabilities: Optional[List[Tuple[str, str, str]]] = None,
+                 with_parameters: bool = False):
     try:
-        printers = printer_dal.get_all(db, skip, limit, sort_by, sort_desc)
+        printers = printer_dal.get_all(db, skip, limit, sort_by, sort_desc, status, capabilities, with_parameters)
         # Convert ID to string for each printer
         for printer in printers:
             if hasattr(printer, 'id'):
                 printer.id = str(printer.id)
         return printers
     except Exception as e:
-        print(f"Error in get_printers: {str(e)}")
+        logger.error("Error in get_printers: %s", e)
+        return []
+
+def get_printer_list(db: Session, skip: int = 0, limit: int = 100, sort_by: str = None, sort_desc: bool = False,
+                     status: Union[str, List[str], None] = None,
+                     capabilities: Optional[List[Tuple[str, str, str]]] = None,
+                     include_parameters: bool = False, name_prefix: Optional[str] = None,
+                     active_only: bool = False) -> List[Dict[str, Any]]:
+    """
+    Список принтеров для GET /printers/ в виде готовых к сериализации словарей:
+    колонки принтеров одним запросом, параметры всей страницы (если нужны) - вторым.
+    Число запросов не зависит от размера страницы.
+    """
+    try:
+        rows = printer_dal.get_all_rows(db, skip, limit, sort_by, sort_desc, status, capabilities,
+                                        name_prefix, active_only)
+        parameters = printer_dal.get_parameters_for(db, [row.id for row in rows]) if include_parameters else None
+        result = []
+        for row in rows:
+            item = {
+                "name": row.name,
+                "model": row.model,
+                "status": row.status,
+                "total_print_time": row.total_print_time,
+                "total_downtime": row.total_downtime,
+                "current_printing_id": row.current_printing_id,
+                "last_activity_at": row.last_activity_at,
+                "id": str(row.id),
+            }
+            if parameters is not None:
+                item["parameters"] = parameters[row.id]
+            result.append(item)
+        return result
+    except Exception as e:
+        logger.error("Error in get_printer_list: %s", e)
         return []
 
 def update_printer(db: Session, printer_id: int, printer: PrinterCreate):
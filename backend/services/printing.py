@@ -1,10 +1,44 @@
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
 from dal import printing as printing_dal
 from dal import printer as printer_dal
 from schemas import PrintingCreate
 from . import printer as printer_service 
 from . import model as model_service
+from . import prediction
+import telemetry
+import logging
+
+logger = logging.getLogger(__name__)
+
+def _eta_interval(calculated_time_stop: datetime, printing_time_std: float) -> Tuple[datetime, datetime]:
+    spread = timedelta(minutes=prediction.INTERVAL_Z * printing_time_std)
+    return calculated_time_stop - spread, calculated_time_stop + spread
+
+def _estimate_progress(start_time: datetime, calculated_time_stop: Optional[datetime],
+                       printing_time: Optional[float], current_time: datetime,
+                       downtime: Optional[float] = None, pause_time: Optional[datetime] = None) -> float:
+    """
+    Прогресс активной печати (0-100) по расчётному времени окончания или printing_time.
+    Та же формула, что и dal.printing.progress_columns: на паузе прогресс стоит.
+    """
+    downtime_seconds = (downtime or 0) * 60
+    if pause_time:
+        current_time = min(current_time, pause_time)
+    printed = (current_time - start_time).total_seconds() - downtime_seconds
+    if calculated_time_stop:
+        # Если есть расчётное время окончания
+        total_time = (calculated_time_stop - start_time).total_seconds() - downtime_seconds
+        if total_time <= 0:
+            return 100
+    elif printing_time:
+        # Если нет calculated_time_stop, но есть printing_time (в минутах)
+        total_time = printing_time * 60
+    else:
+        # Если нет ни расчётного времени окончания, ни printing_time
+        return 0
+    return max(0, min(100, printed / total_time * 100))
 
 def create_printing(db: Session, printing: PrintingCreate):
     try:
@@ -16,9 +50,11 @@ def create_printing(db: Session, printing: PrintingCreate):
             
         printing_data = printing.dict()
         
-        # Если время печати не указано, берем из модели
+        # Если время печати не указано, берем прогноз по истории (или время из модели)
         if not printing_data.get('printing_time'):
-            printing_data['printing_time'] = model.printing_time
+            estimate = prediction.predict_duration(db, model.id, printer.id, model.printing_time)
+            printing_data['printing_time'] = estimate.minutes
+            printing_data['printing_time_std'] = estimate.std
             
         # Устанавливаем время начала печати, если не задано
         if not printing_data.get('start_time'):
@@ -30,10 +66,9 @@ def create_printing(db: Session, printing: PrintingCreate):
             seconds = printing_data['printing_time'] * 60
             printing_data['calculated_time_stop'] = printing_data['start_time'] + timedelta(seconds=seconds)
         
-        db_printing = printing_dal.create(db, printing_data)
-        
-        # Обновляем статус принтера
-        printer_dal.update(db, printer.id, {"status": "printing"})
+        # Печать и занятый ею принтер записываются одной транзакцией
+        printer.status = "printing"
+        db_printing = printing_dal.create(db, printing_data, printer=printer)
         
         # Добавляем дополнительные поля для ответа
         db_printing.printer_name = printer.name
@@ -42,7 +77,7 @@ def create_printing(db: Session, printing: PrintingCreate):
         
         return db_printing
     except Exception as e:
-        print(f"Error in create_printing: {str(e)}")
+        logger.error("Error in create_printing: %s", e)
         raise
 
 def get_printing(db: Session, printing_id: int):
@@ -64,41 +99,33 @@ def get_printing_with_details(db: Session, printing_id: int):
             printing.printer_name = printer.name if printer else "Unknown Printer"
             printing.model_name = model.name if model else "Unknown Model"
         except Exception as e:
-            print(f"Error getting printer/model details: {str(e)}")
+            logger.error("Error getting printer/model details: %s", e)
             printing.printer_name = "Unknown Printer"
             printing.model_name = "Unknown Model"
             
+        # 90% интервал времени окончания по разбросу прогноза
+        if printing.calculated_time_stop and printing.printing_time_std:
+            printing.eta_low, printing.eta_high = _eta_interval(printing.calculated_time_stop, printing.printing_time_std)
+
         # Если печать завершена, прогресс = 100%
         if printing.real_time_stop or printing.status in ["completed", "cancelled"]:
             printing.progress = 100
             return printing
-            
+
+        # Если есть свежая телеметрия с принтера - берём реальный прогресс,
+        # завершение печати в этом случае делает telemetry.flush()
+        live_progress = telemetry.get_live_progress(printing.printer_name)
+        if live_progress is not None:
+            printing.progress = min(100, live_progress)
+            return printing
+
         # Вычисляем прогресс для активных печатей
         try:
             if printing.start_time:
-                current_time = datetime.now()
-                
-                if printing.calculated_time_stop:
-                    # Если есть расчётное время окончания
-                    total_time = (printing.calculated_time_stop - printing.start_time).total_seconds()
-                    elapsed_time = (current_time - printing.start_time).total_seconds()
-                    
-                    if total_time > 0:
-                        printing.progress = min(100, (elapsed_time / total_time) * 100)
-                    else:
-                        printing.progress = 100
-                elif printing.printing_time:
-                    # Если нет calculated_time_stop, но есть printing_time (в минутах)
-                    total_seconds = printing.printing_time * 60  # переводим минуты в секунды
-                    elapsed_time = (current_time - printing.start_time).total_seconds()
-                    
-                    if total_seconds > 0:
-                        printing.progress = min(100, (elapsed_time / total_seconds) * 100)
-                    else:
-                        printing.progress = 0
-                else:
-                    # Если нет ни расчётного времени окончания, ни printing_time
-                    printing.progress = 0
+                printing.progress = _estimate_progress(
+                    printing.start_time, printing.calculated_time_stop, printing.printing_time, datetime.now(),
+                    printing.downtime, printing.pause_time if printing.status == "paused" else None
+                )
                     
                 # Автоматически завершаем печать при достижении 100%
                 if printing.progress >= 100 and printing.status == "printing":
@@ -115,15 +142,15 @@ def get_printing_with_details(db: Session, printing_id: int):
                             printing.printer_name = printer.name if printer else "Unknown Printer"
                             printing.model_name = model.name if model else "Unknown Model"
                     except Exception as e:
-                        print(f"Error auto-completing printing: {str(e)}")
+                        logger.error("Error auto-completing printing: %s", e)
         except Exception as e:
-            print(f"Error calculating progress for printing {printing_id}: {str(e)}")
+            logger.error("Error calculating progress for printing %s: %s", printing_id, e)
             # В случае ошибки используем безопасное значение
             printing.progress = 0
             
         return printing
     except Exception as e:
-        print(f"Unexpected error in get_printing_with_details for printing {printing_id}: {str(e)}")
+        logger.exception("Unexpected error in get_printing_with_details for printing %s", printing_id)
         return None
 
 def get_printings(db: Session, skip: int = 0, limit: int = 100, sort_by: str = None, sort_desc: bool = False):
@@ -137,7 +164,7 @@ def get_printings(db: Session, skip: int = 0, limit: int = 100, sort_by: str = N
                 if printing_with_details:
                     result.append(printing_with_details)
             except Exception as e:
-                print(f"Error processing printing {p.id}: {str(e)}")
+                logger.error("Error processing printing %s: %s", p.id, e)
                 # Добавляем базовые детали без расчета прогресса
                 p.progress = 0
                 p.printer_name = "Unknown Printer"
@@ -146,11 +173,88 @@ def get_printings(db: Session, skip: int = 0, limit: int = 100, sort_by: str = N
                 
         return result
     except Exception as e:
-        print(f"Error in get_printings: {str(e)}")
+        logger.error("Error in get_printings: %s", e)
         return []
 
+def list_item(row, current_time: datetime) -> Dict[str, Any]:
+    """Строка списка печатей -> словарь в формате schemas.Printing (плюс eta)"""
+    item = row._asdict()
+    remaining = item.pop("remaining_seconds")
+    item["downtime"] = item["downtime"] or 0.0
+    item["printer_name"] = item["printer_name"] or "Unknown Printer"
+    item["model_name"] = item["model_name"] or "Unknown Model"
+    item["eta_low"] = item["eta_high"] = None
+    if item["calculated_time_stop"] and item["printing_time_std"]:
+        item["eta_low"], item["eta_high"] = _eta_interval(item["calculated_time_stop"], item["printing_time_std"])
+    # Ожидаемое окончание с учётом текущей паузы
+    item["eta"] = current_time + timedelta(seconds=remaining) if remaining is not None else None
+
+    if not item["real_time_stop"] and item["status"] not in ["completed", "cancelled"]:
+        # Свежая телеметрия с принтера точнее расчёта по времени
+        live_progress = telemetry.get_live_progress(item["printer_name"])
+        if live_progress is not None:
+            item["progress"] = min(100, live_progress)
+    return item
+
+def _auto_complete(db: Session, items: List[Dict[str, Any]]):
+    """Автоматически завершает печати, дошедшие по расчёту до 100% (редкий случай - по одной)"""
+    # Печати со свежей телеметрией завершает telemetry.flush() по данным принтера
+    finished = [item for item in items if item["progress"] >= 100 and item["status"] == "printing"
+                and telemetry.get_live_progress(item["printer_name"]) is None]
+    if not finished:
+        return
+    from printer_control import complete_printing
+    for item in finished:
+        try:
+            printing = complete_printing(db, item["id"], auto_complete=True)
+            if printing:
+                item["status"] = printing.status
+                item["real_time_stop"] = printing.real_time_stop
+                item["eta"] = None
+        except Exception as e:
+            logger.error("Error auto-completing printing: %s", e)
+
+def get_printing_list(db: Session, skip: int = 0, limit: int = 100, sort_by: str = None,
+                      sort_desc: bool = False,
+                      filters: Optional[printing_dal.PrintingFilters] = None) -> List[Dict[str, Any]]:
+    """
+    Список печатей для GET /printings/: страница с именами принтеров и моделей
+    и прогрессом одним запросом, строки - словари для прямой сериализации
+    (без ORM и pydantic). Фильтры применяются в запросе, до skip/limit.
+    Автозавершение - как в get_printing_with_details.
+    """
+    try:
+        current_time = datetime.now()
+        rows = printing_dal.get_all_rows(db, current_time, skip, limit, sort_by, sort_desc, filters)
+        result = [list_item(row, current_time) for row in rows]
+        _auto_complete(db, result)
+        return result
+    except Exception as e:
+        logger.error("Error in get_printing_list: %s", e)
+        return []
+
+def get_active_printings(db: Session, skip: int = 0, limit: int = 100, sort_by: str = None, sort_desc: bool = False,
+                         status: Optional[str] = None, min_progress: Optional[float] = None,
+                         max_progress: Optional[float] = None,
+                         finishing_within: Optional[float] = None) -> List[Dict[str, Any]]:
+    """
+    Идущие печати с фильтрами по прогрессу и времени до окончания (finishing_within - в минутах).
+    Фильтры и сортировка считаются в запросе по расчётному прогрессу.
+    """
+    current_time = datetime.now()
+    rows = printing_dal.get_active_rows(
+        db, current_time, skip, limit, sort_by, sort_desc, status, min_progress, max_progress,
+        finishing_within * 60 if finishing_within is not None else None
+    )
+    result = [list_item(row, current_time) for row in rows]
+    _auto_complete(db, result)
+    return result
+
 def update_printing(db: Session, printing_id: int, printing: PrintingCreate):
     return printing_dal.update(db, printing_id, printing.dict())
 
 def delete_printing(db: Session, printing_id: int):
+    # Принтер, который указывал на удаляемую печать, освобождается в той же транзакции
+    for printer in printer_dal.get_by_current_printing(db, printing_id):
+        printer_service.release_printer(printer)
     return printing_dal.delete(db, printing_id)
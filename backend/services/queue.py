@@ -0,0 +1,103 @@
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+import models
+from dal import queue as queue_dal
+from . import prediction
+from . import printer as printer_service
+from schemas import PrintQueueCreate
+
+# Сколько свободных принтеров диспетчер обрабатывает за одну транзакцию
+DISPATCH_BATCH_SIZE = 500
+
+def create_queue_item(db: Session, item: PrintQueueCreate):
+    return queue_dal.create(db, item)
+
+def get_queue_item(db: Session, item_id: int, for_update: bool = False):
+    return queue_dal.get(db, item_id, for_update)
+
+def get_queue_items(db: Session, skip: int = 0, limit: int = 100, status: str = None):
+    return queue_dal.get_all(db, skip, limit, status)
+
+def update_queue_item(db: Session, item_id: int, item: PrintQueueCreate):
+    return queue_dal.update(db, item_id, item.dict())
+
+def delete_queue_item(db: Session, item_id: int):
+    return queue_dal.delete(db, item_id)
+
+def dispatch_queue(db: Session, batch_size: int = DISPATCH_BATCH_SIZE):
+    """
+    Назначает задания из очереди свободным принтерам.
+
+    Задания берутся по убыванию приоритета, при равном приоритете - более старые
+    первыми. Каждое задание разворачивается в quantity печатей: один экземпляр
+    на один свободный принтер. Задание с printer_id ждёт именно этот принтер
+    и получает его раньше заданий без привязки.
+    Всё назначение выполняется одной транзакцией; строки принтеров и очереди
+    захватываются через FOR UPDATE SKIP LOCKED, поэтому несколько воркеров
+    бэкенда могут вызывать диспетчер одновременно.
+    Возвращает список созданных печатей.
+    """
+    printers = queue_dal.claim_idle_printers(db, batch_size)
+    if not printers:
+        db.rollback()
+        return []
+
+    # Каждое задание даёт хотя бы одну печать, так что больше заданий, чем принтеров, не нужно
+    items = queue_dal.claim_queued(db, len(printers), [printer.id for printer in printers])
+    if not items:
+        db.rollback()
+        return []
+
+    model_ids = {item.model_id for item in items}
+    models_by_id = {
+        m.id: m for m in db.query(models.Model).filter(models.Model.id.in_(model_ids)).all()
+    }
+    duration_stats = prediction.load_stats(db, model_ids)
+
+    free_printers = {printer.id: printer for printer in printers}
+    current_time = datetime.now()
+    created = []
+
+    # Сортировка стабильная: внутри каждой группы сохраняется порядок приоритета
+    for item in sorted(items, key=lambda i: i.printer_id is None):
+        model = models_by_id.get(item.model_id)
+        if model is None:
+            item.status = "cancelled"
+            continue
+
+        remaining = (item.quantity or 1) - (item.dispatched_count or 0)
+        while remaining > 0 and free_printers:
+            if item.printer_id is not None:
+                printer = free_printers.pop(item.printer_id, None)
+                if printer is None:
+                    break
+            else:
+                _, printer = free_printers.popitem()
+
+            estimate = prediction.predict_from_stats(duration_stats, model.id, printer.id, model.printing_time)
+            printing = models.Printing(
+                printer_id=printer.id,
+                model_id=model.id,
+                status="printing",
+                start_time=current_time,
+                printing_time=estimate.minutes,
+                printing_time_std=estimate.std,
+                calculated_time_stop=current_time + timedelta(minutes=estimate.minutes)
+            )
+            db.add(printing)
+            created.append(printing)
+
+            printer.status = "printing"
+            printer_service.occupy_printer(printer, printing, current_time)
+            item.dispatched_count = (item.dispatched_count or 0) + 1
+            if item.start_time is None:
+                item.start_time = current_time
+            remaining -= 1
+
+        if remaining <= 0:
+            item.status = "dispatched"
+        if not free_printers:
+            break
+
+    db.commit()
+    return created
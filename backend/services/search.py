@@ -0,0 +1,37 @@
+from sqlalchemy.orm import Session
+from typing import Any, Dict, List, Optional
+from dal import search as search_dal
+
+# Что можно искать через type=
+SEARCH_TYPES = ["printers", "models"]
+# Короче этого запрос не имеет смысла: совпадёт почти всё
+MIN_QUERY_LENGTH = 2
+
+def search(db: Session, query: str, types: Optional[List[str]] = None, limit: int = 10) -> Dict[str, Any]:
+    """
+    Поиск принтеров и моделей по части имени. Каждый тип - отдельный запрос
+    с лимитом, строки отсортированы по релевантности (score от 0 до 1).
+    ValueError - если запрос слишком короткий или тип неизвестен.
+    """
+    query = query.strip()
+    if len(query) < MIN_QUERY_LENGTH:
+        raise ValueError(f"Query must be at least {MIN_QUERY_LENGTH} characters")
+    types = types or SEARCH_TYPES
+    unknown = [item for item in types if item not in SEARCH_TYPES]
+    if unknown:
+        raise ValueError(f"Unknown type: {', '.join(unknown)}. Available: {', '.join(SEARCH_TYPES)}")
+
+    result: Dict[str, Any] = {"query": query}
+    if "printers" in types:
+        result["printers"] = [
+            {"id": row.id, "name": row.name, "model": row.model, "status": row.status,
+             "score": round(float(row.score), 3)}
+            for row in search_dal.search_printers(db, query, limit)
+        ]
+    if "models" in types:
+        result["models"] = [
+            {"id": row.id, "name": row.name, "printing_time": row.printing_time,
+             "score": round(float(row.score), 3)}
+            for row in search_dal.search_models(db, query, limit)
+        ]
+    return result
@@ -0,0 +1,142 @@
+"""
+Счётчики принтеров по статусам для /reports/printer-status.
+
+td_printer_status_counters хранит на каждый статус число принтеров, суммы
+времени печати и простоя и сумму их эффективности. Любое изменение принтера
+через ORM (роутеры, printer_control, диспетчер, телеметрия, учёт простоя)
+при flush превращается в дельты, которые пишутся в ту же транзакцию - поэтому
+отчёт читает несколько строк вместо всей таблицы принтеров.
+При старте счётчики пересчитываются целиком (rebuild), это же исправляет
+накопленную погрешность сумм и изменения, сделанные мимо ORM.
+"""
+import logging
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import case, event, func, inspect, insert, update
+from sqlalchemy.orm import Session
+
+import models
+
+logger = logging.getLogger(__name__)
+
+COUNTER = models.PrinterStatusCounter
+# Статусы, строки которых создаются заранее (остальные - при первой дельте)
+KNOWN_STATUSES = ["idle", "printing", "paused", "waiting", "error"]
+_FIELDS = ("status", "total_print_time", "total_downtime")
+
+
+def efficiency(total_print_time: Optional[float], total_downtime: Optional[float]) -> float:
+    """Доля времени печати от всего учтённого времени принтера, %"""
+    total_time = (total_print_time or 0) + (total_downtime or 0)
+    return (total_print_time or 0) / total_time * 100 if total_time > 0 else 0
+
+
+def _contribution(status, total_print_time, total_downtime) -> Tuple[str, List[float]]:
+    return status, [1, total_print_time or 0, total_downtime or 0, efficiency(total_print_time, total_downtime)]
+
+
+def _old_and_new(printer: models.Printer):
+    """Значения полей принтера до и после flush"""
+    state = inspect(printer)
+    old, new = [], []
+    for name in _FIELDS:
+        history = state.attrs[name].history
+        current = history.added[0] if history.added else getattr(printer, name)
+        new.append(current)
+        old.append(history.deleted[0] if history.deleted else (None if history.added else current))
+    return old, new
+
+
+def collect_deltas(session: Session) -> Dict[str, List[float]]:
+    """Дельты счётчиков по новым, изменённым и удалённым в сессии принтерам"""
+    deltas: Dict[str, List[float]] = defaultdict(lambda: [0, 0.0, 0.0, 0.0])
+
+    def add(contribution, sign):
+        status, values = contribution
+        if status is None:
+            return
+        for i, value in enumerate(values):
+            deltas[status][i] += sign * value
+
+    for printer in session.new:
+        if isinstance(printer, models.Printer):
+            add(_contribution(printer.status, printer.total_print_time, printer.total_downtime), 1)
+    for printer in session.deleted:
+        if isinstance(printer, models.Printer):
+            old, _ = _old_and_new(printer)
+            add(_contribution(*old), -1)
+    for printer in session.dirty:
+        if isinstance(printer, models.Printer) and session.is_modified(printer):
+            old, new = _old_and_new(printer)
+            if old != new:
+                add(_contribution(*old), -1)
+                add(_contribution(*new), 1)
+    return {status: values for status, values in deltas.items() if any(values)}
+
+
+def apply_deltas(connection, deltas: Dict[str, List[float]]):
+    for status, (printers, print_time, downtime, efficiency_sum) in sorted(deltas.items()):
+        result = connection.execute(update(COUNTER).where(COUNTER.status == status).values(
+            printers=COUNTER.printers + printers,
+            total_print_time=COUNTER.total_print_time + print_time,
+            total_downtime=COUNTER.total_downtime + downtime,
+            efficiency_sum=COUNTER.efficiency_sum + efficiency_sum,
+        ))
+        if result.rowcount == 0:
+            connection.execute(insert(COUNTER).values(
+                status=status, printers=printers, total_print_time=print_time,
+                total_downtime=downtime, efficiency_sum=efficiency_sum,
+            ))
+
+
+@event.listens_for(Session, "after_flush")
+def _after_flush(session: Session, flush_context):
+    # После flush, но до commit: дельты попадают в ту же транзакцию, что и изменения принтеров
+    deltas = collect_deltas(session)
+    if deltas:
+        apply_deltas(session.connection(), deltas)
+
+
+def rebuild(db: Session) -> int:
+    """Пересчитывает счётчики по таблице принтеров; возвращает число принтеров"""
+    if db.get_bind().dialect.name == "postgresql":
+        # Дельты параллельных транзакций ждут пересчёта и ложатся уже поверх него
+        db.connection().exec_driver_sql(f"LOCK TABLE {COUNTER.__tablename__} IN EXCLUSIVE MODE")
+
+    print_time = func.coalesce(models.Printer.total_print_time, 0.0)
+    downtime = func.coalesce(models.Printer.total_downtime, 0.0)
+    printer_efficiency = case(
+        (print_time + downtime > 0, print_time * 100.0 / (print_time + downtime)),
+        else_=0.0
+    )
+    rows = db.query(
+        models.Printer.status,
+        func.count(models.Printer.id),
+        func.sum(print_time),
+        func.sum(downtime),
+        func.sum(printer_efficiency),
+    ).filter(models.Printer.status.isnot(None)).group_by(models.Printer.status).all()
+
+    db.query(COUNTER).delete(synchronize_session=False)
+    counters = {status: [0, 0.0, 0.0, 0.0] for status in KNOWN_STATUSES}
+    for status, printers, total_print_time, total_downtime, efficiency_sum in rows:
+        counters[status] = [printers, total_print_time or 0.0, total_downtime or 0.0, efficiency_sum or 0.0]
+    db.execute(insert(COUNTER), [
+        {"status": status, "printers": values[0], "total_print_time": values[1],
+         "total_downtime": values[2], "efficiency_sum": values[3]}
+        for status, values in counters.items()
+    ])
+    db.commit()
+    return sum(values[0] for values in counters.values())
+
+
+def get_counters(db: Session) -> Dict[str, Any]:
+    """Число принтеров по статусам и средняя эффективность - чтение нескольких строк"""
+    rows = db.query(COUNTER.status, COUNTER.printers, COUNTER.efficiency_sum).all()
+    total = sum(row.printers for row in rows)
+    return {
+        "total_printers": total,
+        "status_counts": {row.status: row.printers for row in rows},
+        "average_efficiency": sum(row.efficiency_sum for row in rows) / total if total else 0,
+    }
@@ -0,0 +1,238 @@
+"""
+Мост между телеметрией Moonraker (getter_data) и машиной состояний принтеров.
+
+Данные от принтеров приходят часто (каждый опрос sender_data), но в базу
+попадают только изменения состояния: входящие пакеты сворачиваются в памяти
+(последний пакет на принтер), новое состояние применяется только после того,
+как оно продержалось TELEMETRY_DEBOUNCE_SECONDS, а реальный прогресс печати
+хранится в памяти и отдаётся без записи в БД.
+"""
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import requests
+from sqlalchemy.orm import Session
+
+import models
+from services import prediction
+from services import printer as printer_service
+
+logger = logging.getLogger(__name__)
+
+# Сколько секунд новое состояние должно держаться, прежде чем попасть в БД
+TELEMETRY_DEBOUNCE_SECONDS = float(os.environ.get("TELEMETRY_DEBOUNCE_SECONDS", "5"))
+# Через сколько секунд без данных телеметрия считается устаревшей
+TELEMETRY_STALE_SECONDS = float(os.environ.get("TELEMETRY_STALE_SECONDS", "60"))
+# Как часто накопленные изменения применяются к БД
+TELEMETRY_FLUSH_INTERVAL = float(os.environ.get("TELEMETRY_FLUSH_INTERVAL", "5"))
+# Адрес getter_data, откуда забирать телеметрию (если не задан - только push через /telemetry)
+TELEMETRY_GETTER_URL = os.environ.get("TELEMETRY_GETTER_URL")
+TELEMETRY_REQUEST_TIMEOUT = 5
+
+# Состояния print_stats.state Moonraker -> события машины состояний
+MOONRAKER_STATE_MAP = {
+    "printing": "printing",
+    "paused": "paused",
+    "complete": "complete",
+    "cancelled": "cancelled",
+    "error": "error",
+    "standby": "standby",
+}
+
+
+class PrinterTelemetry:
+    """Последнее известное состояние принтера по данным телеметрии"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.state: Optional[str] = None          # последнее наблюдаемое состояние
+        self.state_since: float = 0.0             # когда это состояние впервые наблюдалось
+        self.applied_state: Optional[str] = None  # состояние, уже записанное в БД
+        self.progress: Optional[float] = None     # 0..100
+        self.print_duration: Optional[float] = None  # секунды чистой печати
+        self.updated_at: float = 0.0
+
+    def eta_seconds(self) -> Optional[float]:
+        if not self.progress or self.print_duration is None:
+            return None
+        fraction = self.progress / 100
+        return max(0.0, self.print_duration / fraction - self.print_duration)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "printer_name": self.name,
+            "state": self.state,
+            "applied_state": self.applied_state,
+            "progress": self.progress,
+            "eta_seconds": self.eta_seconds(),
+            "updated_at": self.updated_at,
+        }
+
+
+_lock = threading.Lock()
+_printers: Dict[str, PrinterTelemetry] = {}
+
+
+def parse_payload(data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Извлекает состояние и прогресс из пакета getter_data/sender_data.
+    Возвращает None, если пакет не содержит данных print_stats.
+    """
+    printer_name = data.get("printer_name")
+    if not printer_name or data.get("status") != "online":
+        return None
+
+    result = data.get("result") or {}
+    # sender_data кладёт ответ Moonraker целиком: {"result": {"status": {...}}}
+    status = (result.get("result") or {}).get("status") or result.get("status") or {}
+    print_stats = status.get("print_stats") or {}
+    state = MOONRAKER_STATE_MAP.get(print_stats.get("state"))
+    if state is None:
+        return None
+
+    progress = (status.get("virtual_sdcard") or {}).get("progress")
+    if progress is None:
+        progress = (status.get("display_status") or {}).get("progress")
+
+    return {
+        "printer_name": printer_name,
+        "state": state,
+        "progress": progress * 100 if progress is not None else None,
+        "print_duration": print_stats.get("print_duration"),
+        "timestamp": data.get("timestamp") or time.time(),
+    }
+
+
+def ingest(data: Dict[str, Any]) -> bool:
+    """
+    Принимает пакет телеметрии. Ничего не пишет в БД - только обновляет
+    состояние в памяти; запись делает flush().
+    """
+    parsed = parse_payload(data)
+    if parsed is None:
+        return False
+
+    now = time.time()
+    with _lock:
+        entry = _printers.get(parsed["printer_name"])
+        if entry is None:
+            entry = _printers[parsed["printer_name"]] = PrinterTelemetry(parsed["printer_name"])
+        if entry.state != parsed["state"]:
+            entry.state = parsed["state"]
+            entry.state_since = now
+        entry.progress = parsed["progress"]
+        entry.print_duration = parsed["print_duration"]
+        entry.updated_at = now
+    return True
+
+
+def apply_state(db: Session, printer: models.Printer, state: str) -> bool:
+    """
+    Переводит принтер в состояние, соответствующее телеметрии.
+    Возвращает True, если что-то было изменено в БД.
+    """
+    # printer_control импортирует services.printing, который импортирует этот модуль
+    import printer_control
+
+    # Идущая печать - по указателю принтера, без поиска по td_printings
+    printing = printer_service.get_active_printing(printer)
+
+    if state == "complete":
+        if printing and printing.status in ["printing", "paused"]:
+            completed = printer_control.complete_printing(db, printing.id, auto_complete=True)
+            if completed is None:
+                return False
+            # Окончание печати зафиксировано принтером - это реальная длительность
+            prediction.record_finished_printing(db, completed)
+            db.commit()
+            return True
+    elif state == "paused":
+        if printing and printing.status == "printing":
+            return printer_control.pause_printing(db, printing.id) is not None
+    elif state == "printing":
+        if printing and printing.status == "paused":
+            return printer_control.resume_printing(db, printing.id) is not None
+        if printer.status == "error":
+            printer_control.update_printer_status(db, printer.id, "printing" if printing else "idle")
+            db.commit()
+            return True
+    elif state == "cancelled":
+        if printing and printing.status in ["printing", "paused"]:
+            return printer_control.cancel_printing(db, printing.id) is not None
+    elif state == "error":
+        if printer.status != "error":
+            printer_control.update_printer_status(db, printer.id, "error")
+            db.commit()
+            return True
+    elif state == "standby":
+        if printer.status == "error":
+            printer_control.update_printer_status(db, printer.id, "idle")
+            db.commit()
+            return True
+    return False
+
+
+def flush(db: Session) -> int:
+    """
+    Применяет к БД устоявшиеся изменения состояния.
+    Возвращает количество принтеров, для которых была запись.
+    """
+    now = time.time()
+    with _lock:
+        pending = [
+            (entry.name, entry.state)
+            for entry in _printers.values()
+            if entry.state != entry.applied_state
+            and now - entry.state_since >= TELEMETRY_DEBOUNCE_SECONDS
+        ]
+
+    written = 0
+    for name, state in pending:
+        # Ошибка одного принтера не мешает остальным; его состояние повторится в следующий раз
+        try:
+            printer = db.query(models.Printer).filter(models.Printer.name == name).first()
+            # Принтер ещё не зарегистрирован - применим состояние, когда он появится
+            if printer is None:
+                continue
+            if apply_state(db, printer, state):
+                written += 1
+        except Exception as e:
+            logger.error("Failed to apply telemetry state %s for printer %s: %s", state, name, e)
+            db.rollback()
+            continue
+        with _lock:
+            entry = _printers.get(name)
+            # Состояние могло смениться, пока мы писали в БД - тогда применим его в следующий раз
+            if entry is not None and entry.state == state:
+                entry.applied_state = state
+    return written
+
+
+def pull_from_getter() -> int:
+    """Забирает последние данные всех принтеров из getter_data"""
+    if not TELEMETRY_GETTER_URL:
+        return 0
+    response = requests.get(f"{TELEMETRY_GETTER_URL}/api/data", timeout=TELEMETRY_REQUEST_TIMEOUT)
+    response.raise_for_status()
+    return sum(1 for data in response.json().values() if ingest(data))
+
+
+def get_live_progress(printer_name: str) -> Optional[float]:
+    """Реальный прогресс печати по телеметрии или None, если данных нет или они устарели"""
+    with _lock:
+        entry = _printers.get(printer_name)
+        if entry is None or entry.progress is None:
+            return None
+        if time.time() - entry.updated_at > TELEMETRY_STALE_SECONDS:
+            return None
+        if entry.state not in ["printing", "paused"]:
+            return None
+        return entry.progress
+
+
+def get_snapshot() -> List[Dict[str, Any]]:
+    with _lock:
+        return [entry.as_dict() for entry in _printers.values()]
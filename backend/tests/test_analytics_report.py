@@ -0,0 +1,28 @@
+from datetime import datetime, timedelta, timezone
+
+import models
+import report_jobs
+from reports import get_analytics_report
+
+
+def test_timezone_aware_range_is_converted_to_local_time(db):
+    model = models.Model(name="benchy", printing_time=60)
+    db.add(model)
+    db.flush()
+    start = datetime.now().replace(hour=12, minute=0, second=0, microsecond=0) - timedelta(days=1)
+    db.add(models.Printing(model_id=model.id, status="completed", start_time=start,
+                           real_time_stop=start + timedelta(hours=1), downtime=0.0))
+    db.commit()
+
+    aware_start = (start - timedelta(hours=2)).astimezone(timezone.utc)
+    report = get_analytics_report(db, bucket="day", start=aware_start, end=aware_start + timedelta(days=1),
+                                  metrics=["count"])
+
+    assert report["start"] == start - timedelta(hours=2)
+    assert report["start"].tzinfo is None
+    assert sum(report["series"][0]["count"]) == 1
+
+
+def test_report_job_parses_aware_range_as_local_time():
+    params = report_jobs.normalize_spec("analytics", {"start": "2026-10-01T00:00:00Z"})
+    assert params["start"] == datetime(2026, 10, 1, tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
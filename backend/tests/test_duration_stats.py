@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+import models
+import quantiles
+from services.prediction import ALL_PRINTERS, record_duration
+
+
+def test_first_row_inserted_concurrently_is_reused(db):
+    model = models.Model(name="benchy", printing_time=60)
+    db.add(model)
+    db.commit()
+    raced = []
+
+    # Параллельный воркер вставляет строку пары сразу после нашего SELECT, который её не нашёл
+    @event.listens_for(db.get_bind(), "after_cursor_execute")
+    def concurrent_insert(conn, cursor, statement, parameters, context, executemany):
+        if not raced and statement.startswith("SELECT") and "td_duration_stats" in statement:
+            raced.append(True)
+            cursor.connection.execute(
+                "INSERT INTO td_duration_stats (model_id, printer_id, count, mean, m2) VALUES (?, 7, 1, 10.0, 0.0)",
+                (model.id,)
+            )
+
+    record_duration(db, model.id, 7, 20.0)
+    db.commit()
+
+    rows = {row.printer_id: row for row in db.query(models.DurationStats)}
+    assert len(rows) == 2
+    assert rows[7].count == 2 and rows[7].mean == pytest.approx(15.0)
+    assert rows[ALL_PRINTERS].count == 1 and rows[ALL_PRINTERS].mean == pytest.approx(20.0)
+
+
+def test_first_sketch_row_inserted_concurrently_is_reused(db):
+    model = models.Model(name="benchy", printing_time=60)
+    db.add(model)
+    db.commit()
+    sketch = quantiles.DDSketch()
+    sketch.add(10.0)
+    raced = []
+
+    @event.listens_for(db.get_bind(), "after_cursor_execute")
+    def concurrent_insert(conn, cursor, statement, parameters, context, executemany):
+        if not raced and statement.startswith("SELECT") and "td_duration_sketches" in statement:
+            raced.append(True)
+            cursor.connection.execute(
+                "INSERT INTO td_duration_sketches (scope, scope_id, metric, count, sketch) "
+                "VALUES ('model', ?, 'duration', 1, ?)",
+                (model.id, sketch.to_bytes())
+            )
+
+    start = datetime(2024, 1, 1, 10, 0)
+    printing = models.Printing(model_id=model.id, printer_id=7, status="completed", start_time=start,
+                               real_time_stop=start + timedelta(minutes=20), downtime=0.0)
+    quantiles.record_printing(db, printing)
+    db.commit()
+
+    row = db.query(models.DurationSketch).filter_by(scope="model", scope_id=model.id, metric="duration").one()
+    assert row.count == 2
+    assert quantiles.DDSketch.from_bytes(row.sketch).max == pytest.approx(20.0)
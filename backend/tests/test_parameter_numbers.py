@@ -0,0 +1,21 @@
+import pytest
+
+from dal.printer import parse_number
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("0.4", 0.4),
+    ("0,4", 0.4),
+    (" 220 ", 220.0),
+    ("-5", -5.0),
+    ("nan", None),
+    ("inf", None),
+    ("-Infinity", None),
+    ("1e3", None),
+    ("1_000", None),
+    (".5", None),
+    ("PLA", None),
+    (None, None),
+])
+def test_parse_number_matches_migration_backfill(value, expected):
+    assert parse_number(value) == expected
@@ -0,0 +1,67 @@
+import pytest
+from fastapi import HTTPException
+
+import models
+from routers.queue import update_queue_item
+from schemas import PrintQueueCreate
+from services.queue import dispatch_queue
+
+
+def test_unpinned_item_dispatched_while_higher_priority_item_waits_for_busy_printer(db):
+    busy = models.Printer(name="busy", status="printing")
+    idle = models.Printer(name="idle", status="idle")
+    model = models.Model(name="benchy", printing_time=60)
+    db.add_all([busy, idle, model])
+    db.flush()
+    pinned = models.PrintQueue(model_id=model.id, printer_id=busy.id, priority=10, quantity=1, status="queued")
+    unpinned = models.PrintQueue(model_id=model.id, priority=1, quantity=1, status="queued")
+    db.add_all([pinned, unpinned])
+    db.commit()
+
+    created = dispatch_queue(db)
+
+    assert [printing.printer_id for printing in created] == [idle.id]
+    db.refresh(idle)
+    db.refresh(pinned)
+    db.refresh(unpinned)
+    assert idle.status == "printing"
+    assert unpinned.status == "dispatched"
+    assert pinned.status == "queued"
+
+
+def test_update_rejects_non_positive_quantity(db):
+    model = models.Model(name="benchy", printing_time=60)
+    db.add(model)
+    db.flush()
+    item = models.PrintQueue(model_id=model.id, quantity=2, status="queued")
+    db.add(item)
+    db.commit()
+
+    for quantity in (0, -1):
+        with pytest.raises(HTTPException) as error:
+            update_queue_item(item.id, PrintQueueCreate(model_id=model.id, quantity=quantity), db)
+        assert error.value.status_code == 400
+    db.refresh(item)
+    assert item.quantity == 2
+
+
+@pytest.mark.parametrize("change, status, code", [
+    ({"model_id": 999}, "queued", 404),
+    ({"printer_id": 999}, "queued", 404),
+    ({}, "dispatched", 409),
+    ({}, "cancelled", 409),
+])
+def test_update_rejects_unknown_references_and_items_no_longer_queued(db, change, status, code):
+    model = models.Model(name="benchy", printing_time=60)
+    db.add(model)
+    db.flush()
+    item = models.PrintQueue(model_id=model.id, quantity=2, status=status)
+    db.add(item)
+    db.commit()
+
+    with pytest.raises(HTTPException) as error:
+        update_queue_item(item.id, PrintQueueCreate(**{"model_id": model.id, "quantity": 3, **change}), db)
+    assert error.value.status_code == code
+    db.rollback()
+    db.refresh(item)
+    assert item.quantity == 2
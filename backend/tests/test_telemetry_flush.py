@@ -0,0 +1,30 @@
+import models
+import telemetry
+
+
+def _pending(name: str, state: str) -> telemetry.PrinterTelemetry:
+    entry = telemetry.PrinterTelemetry(name)
+    entry.state = state
+    entry.state_since = 0.0
+    return entry
+
+
+def test_flush_continues_after_failure_and_waits_for_unknown_printer(db, monkeypatch):
+    db.add_all([models.Printer(name="broken", status="idle"), models.Printer(name="ok", status="idle")])
+    db.commit()
+    entries = {name: _pending(name, "error") for name in ("broken", "ok", "unregistered")}
+    monkeypatch.setattr(telemetry, "_printers", entries)
+    apply_state = telemetry.apply_state
+
+    def failing_apply_state(db, printer, state):
+        if printer.name == "broken":
+            raise RuntimeError("boom")
+        return apply_state(db, printer, state)
+
+    monkeypatch.setattr(telemetry, "apply_state", failing_apply_state)
+
+    assert telemetry.flush(db) == 1
+    assert db.query(models.Printer).filter_by(name="ok").one().status == "error"
+    assert entries["ok"].applied_state == "error"
+    assert entries["broken"].applied_state is None
+    assert entries["unregistered"].applied_state is None
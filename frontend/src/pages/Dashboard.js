@@ -1,7 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { Link } from 'react-router-dom';
 import { useTranslation } from 'react-i18next';
-import { getPrinters, getPrintings, getPrinterStatusReport, createPrinter, createModel } from '../services/api';
+import { getFleetSnapshot, createPrinter, createModel } from '../services/api';
 import Card from '../components/Card';
 import Button from '../components/Button';
 import Modal from '../components/Modal';
@@ -51,33 +51,17 @@ const Dashboard = () => {
       setError(null);
       
       try {
-        // Use Promise.allSettled to get all data even if some requests fail
-        const results = await Promise.allSettled([
-          getPrinters(),
-          getPrintings(),
-          getPrinterStatusReport()
-        ]);
+        // One snapshot request instead of separate printers, printings and status report calls
+        const { data } = await getFleetSnapshot();
         
-        // Handle each result
-        const [printersResult, printingsResult, statusReportResult] = results;
-        
-        if (printersResult.status === 'fulfilled') {
-          setPrinters(printersResult.value.data);
-        } else {
-          console.error('Error fetching printers:', printersResult.reason);
-        }
-        
-        if (printingsResult.status === 'fulfilled') {
-          setPrintings(printingsResult.value.data.slice(0, 5)); // Get only 5 most recent printings
-        } else {
-          console.error('Error fetching printings:', printingsResult.reason);
-        }
-        
-        if (statusReportResult.status === 'fulfilled') {
-          setStatusReport(statusReportResult.value.data);
-        } else {
-          console.error('Error fetching status report:', statusReportResult.reason);
-        }
+        setPrinters(data.printers);
+        setPrintings(data.recent_printings);
+        setStatusReport({
+          total_printers: data.total_printers,
+          status_counts: data.status_counts,
+          average_efficiency: data.average_efficiency,
+          printers: data.printers
+        });
         
         setLoading(false);
       } catch (error) {
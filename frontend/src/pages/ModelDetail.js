@@ -36,7 +36,7 @@ const ModelDetail = () => {
       
       const [modelRes, printingsRes, printersRes] = await Promise.all([
         getModel(id),
-        getPrintings(),
+        getPrintings({ model_id: id, sort_by: 'start_time', sort_desc: true, limit: 1000 }),
         getPrinters()
       ]);
       
@@ -47,11 +47,8 @@ const ModelDetail = () => {
         printing_time: formatMinutesToHHMM(modelRes.data.printing_time)
       });
       
-      // Filter printings for this model
-      const modelPrintings = printingsRes.data.filter(
-        printing => printing.model_id === parseInt(id)
-      );
-      setPrintings(modelPrintings);
+      // Printings of this model are filtered by the server
+      setPrintings(printingsRes.data);
       setPrinters(printersRes.data);
     } catch (error) {
       console.error('Error fetching model data:', error);
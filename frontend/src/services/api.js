@@ -70,7 +70,7 @@ api.interceptors.response.use(
 );
 
 // Printers API
-export const getPrinters = () => api.get('/printers/');
+export const getPrinters = (params = {}) => api.get('/printers/', { params });
 export const getPrinter = (id) => api.get(`/printers/${id}`);
 export const createPrinter = (printerData) => api.post('/printers/', printerData);
 export const updatePrinter = (id, printerData) => api.put(`/printers/${id}`, printerData);
@@ -94,7 +94,8 @@ export const updateModel = (id, modelData) => api.put(`/models/${id}`, modelData
 export const deleteModel = (id) => api.delete(`/models/${id}`);
 
 // Printings API
-export const getPrintings = () => api.get('/printings/');
+// Filters: status, printer_id, model_id (comma-separated), started_from, started_to, active_only
+export const getPrintings = (params = {}) => api.get('/printings/', { params });
 export const getPrinting = (id) => api.get(`/printings/${id}`);
 export const createPrinting = (printingData) => api.post('/printings/', printingData);
 export const updatePrinting = (id, printingData) => api.put(`/printings/${id}`, printingData);
@@ -118,4 +119,11 @@ export const exportPrintersReport = () => api.get('/reports/printers/export/', {
   }
 });
 
+// Fleet API
+// Printers with active printings, recent printings and status counts in one response
+export const getFleetSnapshot = () => api.get('/fleet/snapshot');
+
+// Search printers and models by part of the name (type: 'printers', 'models' or both)
+export const search = (q, params = {}) => api.get('/search/', { params: { q, ...params } });
+
 export default api; 
\ No newline at end of file
@@ -0,0 +1,6 @@
+-- Migration for active printing listings (/printings/active)
+
+-- Partial index: only printings that are still running, so it stays small
+-- regardless of how much history td_printings holds
+CREATE INDEX idx_printings_active ON td_printings (status, start_time)
+WHERE real_time_stop IS NULL;
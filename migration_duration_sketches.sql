@@ -0,0 +1,14 @@
+-- Migration for print-duration and downtime quantile sketches (/reports/quantiles)
+
+-- Step 1: One compressed DDSketch per model or printer and metric; the backend
+-- builds them from history on the first start and updates them as printings finish
+CREATE TABLE td_duration_sketches (
+    id SERIAL PRIMARY KEY,
+    scope VARCHAR NOT NULL,
+    scope_id INTEGER NOT NULL,
+    metric VARCHAR NOT NULL,
+    count INTEGER DEFAULT 0,
+    sketch BYTEA NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT uq_duration_sketches_scope_metric UNIQUE (scope, scope_id, metric)
+);
@@ -0,0 +1,38 @@
+-- Migration for learned print-duration predictions
+
+-- Step 1: Spread of the predicted printing_time
+ALTER TABLE td_printings
+ADD COLUMN printing_time_std DOUBLE PRECISION NULL;
+
+-- Step 2: Streaming duration statistics per model x printer (printer_id = 0 - all printers)
+CREATE TABLE td_duration_stats (
+    id SERIAL PRIMARY KEY,
+    model_id INTEGER NOT NULL REFERENCES td_models (id),
+    printer_id INTEGER NOT NULL DEFAULT 0,
+    count INTEGER DEFAULT 0,
+    mean DOUBLE PRECISION DEFAULT 0,
+    m2 DOUBLE PRECISION DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT uq_duration_stats_model_printer UNIQUE (model_id, printer_id)
+);
+
+-- Step 3: Seed the statistics once from completed printings (minutes, net of pauses);
+-- afterwards they are updated incrementally as printings finish
+WITH durations AS (
+    SELECT model_id,
+           printer_id,
+           EXTRACT(EPOCH FROM (real_time_stop - start_time)) / 60 - COALESCE(downtime, 0) AS minutes
+    FROM td_printings
+    WHERE status = 'completed'
+      AND real_time_stop IS NOT NULL
+      AND model_id IS NOT NULL
+      AND printer_id IS NOT NULL
+), positive AS (
+    SELECT * FROM durations WHERE minutes > 0
+)
+INSERT INTO td_duration_stats (model_id, printer_id, count, mean, m2)
+SELECT model_id, printer_id, COUNT(*), AVG(minutes), COALESCE(VAR_POP(minutes) * COUNT(*), 0)
+FROM positive GROUP BY model_id, printer_id
+UNION ALL
+SELECT model_id, 0, COUNT(*), AVG(minutes), COALESCE(VAR_POP(minutes) * COUNT(*), 0)
+FROM positive GROUP BY model_id;
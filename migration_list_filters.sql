@@ -0,0 +1,10 @@
+-- Migration for server-side filters of /printings/ and /printers/
+
+-- Step 1: Printings of a model within a start_time range
+CREATE INDEX idx_printings_model_start ON td_printings (model_id, start_time);
+
+-- Step 2: Printings by status set within a start_time range
+CREATE INDEX idx_printings_status_start ON td_printings (status, start_time);
+
+-- Step 3: Printer name prefix (name LIKE 'prefix%') regardless of the database collation
+CREATE INDEX idx_printers_name_prefix ON td_printers (name text_pattern_ops);
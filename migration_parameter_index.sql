@@ -0,0 +1,14 @@
+-- Migration for printer capability lookups
+
+-- Step 1: Typed numeric value for parameter comparisons
+ALTER TABLE td_printer_parameters
+ADD COLUMN value_num DOUBLE PRECISION NULL;
+
+-- Step 2: Backfill numeric values for existing parameters ("0.4", "0,4", "220")
+UPDATE td_printer_parameters
+SET value_num = CAST(REPLACE(TRIM(value), ',', '.') AS DOUBLE PRECISION)
+WHERE TRIM(value) ~ '^-?[0-9]+([.,][0-9]+)?$';
+
+-- Step 3: Inverted indexes: parameter name + value -> printer
+CREATE INDEX idx_printer_param_name_value ON td_printer_parameters (name, value, printer_id);
+CREATE INDEX idx_printer_param_name_num ON td_printer_parameters (name, value_num, printer_id);
@@ -0,0 +1,18 @@
+-- Migration for time-partitioned td_printings
+
+-- Step 1: Index for date-range reports (also used on a non-partitioned table)
+CREATE INDEX IF NOT EXISTS idx_printings_start_time ON td_printings (start_time);
+
+-- Step 2: Convert td_printings to monthly range partitions on start_time.
+-- The conversion copies history in batches while the application keeps
+-- writing (a trigger mirrors concurrent changes) and swaps the tables in one
+-- short transaction, so it is run from the backend directory instead of here:
+--
+--   python partitioning.py convert             -- keeps td_printings_unpartitioned
+--   python partitioning.py convert --drop-old  -- drops the old table after the swap
+--   python partitioning.py status
+--
+-- After the conversion the scheduler keeps PARTITION_MONTHS_AHEAD months of
+-- partitions ready and moves partitions older than PRINTINGS_RETENTION_MONTHS
+-- to td_printings_archive (PRINTINGS_ARCHIVE_MODE=table) or to Parquet files
+-- in PRINTINGS_ARCHIVE_DIR (PRINTINGS_ARCHIVE_MODE=parquet, requires pyarrow).
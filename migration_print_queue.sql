@@ -0,0 +1,9 @@
+-- Migration for the print queue dispatcher
+
+-- Step 1: Track how many copies of a queue item were already sent to printers
+ALTER TABLE print_queue
+ADD COLUMN dispatched_count INTEGER NOT NULL DEFAULT 0;
+
+-- Step 2: Indexes used by the dispatcher
+CREATE INDEX idx_print_queue_dispatch ON print_queue (status, priority DESC, created_at);
+CREATE INDEX ix_td_printers_status ON td_printers (status);
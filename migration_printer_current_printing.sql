@@ -0,0 +1,32 @@
+-- Migration for the denormalized current printing pointer on printers
+
+-- Step 1: Pointer to the printing that occupies the printer and time of the last print activity.
+-- No foreign key: a partitioned td_printings has no unique id on its own
+ALTER TABLE td_printers
+ADD COLUMN current_printing_id INTEGER NULL;
+
+ALTER TABLE td_printers
+ADD COLUMN last_activity_at TIMESTAMP NULL;
+
+-- Step 2: Per-printer lookups of printings (the backfill below, fallbacks in stop/confirm)
+CREATE INDEX IF NOT EXISTS idx_printings_printer_start ON td_printings (printer_id, start_time);
+
+-- Step 3: Backfill from existing printings (the backend does the same on startup
+-- for printers that still have no last_activity_at)
+UPDATE td_printers p
+SET current_printing_id = CASE
+        WHEN p.status IN ('printing', 'paused', 'error') THEN (
+            SELECT pr.id FROM td_printings pr
+            WHERE pr.printer_id = p.id AND pr.real_time_stop IS NULL
+            ORDER BY pr.start_time DESC LIMIT 1)
+        WHEN p.status = 'waiting' THEN (
+            SELECT pr.id FROM td_printings pr
+            WHERE pr.printer_id = p.id
+            ORDER BY pr.start_time DESC LIMIT 1)
+    END,
+    last_activity_at = (
+        SELECT MAX(COALESCE(pr.real_time_stop, pr.pause_time, pr.start_time))
+        FROM td_printings pr
+        WHERE pr.printer_id = p.id)
+WHERE p.last_activity_at IS NULL;
+
@@ -0,0 +1,25 @@
+-- Migration for incrementally maintained printer status counters (/reports/printer-status)
+
+-- Step 1: One row per printer status; the backend applies deltas in the same
+-- transaction as every printer change and rebuilds the table on startup
+CREATE TABLE td_printer_status_counters (
+    status VARCHAR PRIMARY KEY,
+    printers INTEGER NOT NULL DEFAULT 0,
+    total_print_time DOUBLE PRECISION NOT NULL DEFAULT 0,
+    total_downtime DOUBLE PRECISION NOT NULL DEFAULT 0,
+    efficiency_sum DOUBLE PRECISION NOT NULL DEFAULT 0
+);
+
+-- Step 2: Initial values from td_printers
+INSERT INTO td_printer_status_counters (status, printers, total_print_time, total_downtime, efficiency_sum)
+SELECT status,
+       COUNT(*),
+       SUM(COALESCE(total_print_time, 0)),
+       SUM(COALESCE(total_downtime, 0)),
+       SUM(CASE WHEN COALESCE(total_print_time, 0) + COALESCE(total_downtime, 0) > 0
+                THEN COALESCE(total_print_time, 0) * 100.0
+                     / (COALESCE(total_print_time, 0) + COALESCE(total_downtime, 0))
+                ELSE 0 END)
+FROM td_printers
+WHERE status IS NOT NULL
+GROUP BY status;
@@ -0,0 +1,19 @@
+-- Migration for asynchronous report jobs (/reports/jobs)
+
+-- Step 1: Jobs with their canonical spec, progress and stored JSON result
+CREATE TABLE td_report_jobs (
+    id SERIAL PRIMARY KEY,
+    report VARCHAR NOT NULL,
+    params TEXT NOT NULL,
+    spec_hash VARCHAR NOT NULL,
+    status VARCHAR DEFAULT 'queued',
+    progress DOUBLE PRECISION DEFAULT 0,
+    result TEXT,
+    error VARCHAR,
+    created_at TIMESTAMP DEFAULT NOW(),
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+-- Step 2: Lookup of the latest job for the same spec (reuse of results)
+CREATE INDEX idx_report_jobs_spec ON td_report_jobs (spec_hash, created_at);
@@ -0,0 +1,9 @@
+-- Migration for /search over printer and model names
+
+-- Step 1: Trigram matching (similarity, % operator, indexed ILIKE '%...%')
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Step 2: GIN trigram indexes on the searched columns
+CREATE INDEX IF NOT EXISTS idx_printers_name_trgm ON td_printers USING gin (name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_printers_model_trgm ON td_printers USING gin (model gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_models_name_trgm ON td_models USING gin (name gin_trgm_ops);
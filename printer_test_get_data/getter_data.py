@@ -1,12 +1,15 @@
-from fastapi import FastAPI, Request, Body
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, HTTPException, Request, Body
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 import uvicorn
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
 from pydantic import BaseModel
+from registry_store import RegistryStore
 import logging
 import json
+import os
 import time
 
 # Настройка логирования
@@ -19,11 +22,16 @@ logger = logging.getLogger("printer_getter")
 app = FastAPI()
 
 # Монтируем папку static для CSS/JS (если нужно)
-app.mount("/static", StaticFiles(directory="static"), name="static")
+if os.path.isdir("static"):
+    app.mount("/static", StaticFiles(directory="static"), name="static")
 
 # Настройка шаблонов Jinja2
 templates = Jinja2Templates(directory="templates")
 
+# Путь к файлу SQLite с реестром и последними снимками (пустая строка - хранить только в памяти)
+GETTER_DB_PATH = os.environ.get("GETTER_DB_PATH", "getter_registry.db")
+store: Optional[RegistryStore] = RegistryStore(GETTER_DB_PATH) if GETTER_DB_PATH else None
+
 # Словарь для хранения данных всех принтеров, ключ - имя принтера
 printers_data: Dict[str, Dict[str, Any]] = {}
 
@@ -32,41 +40,88 @@ class Printer(BaseModel):
     name: str
     ip_address: str
 
-# Список принтеров
-printers: List[Printer] = []
+# Реестр принтеров, ключ - имя принтера
+printers: Dict[str, Printer] = {}
+
+# Версия данных: увеличивается при любом изменении printers/printers_data.
+# Сериализованные ответы кешируются до смены версии.
+data_version = 0
+_response_cache: Dict[Tuple, bytes] = {}
+_response_cache_version = -1
+
+def _bump_version():
+    global data_version
+    data_version += 1
+
+def _cached_json(key: Tuple, build) -> Response:
+    """Возвращает закешированный JSON-ответ для текущей версии данных"""
+    global _response_cache_version
+    if _response_cache_version != data_version:
+        _response_cache.clear()
+        _response_cache_version = data_version
+    body = _response_cache.get(key)
+    if body is None:
+        body = json.dumps(build(), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        _response_cache[key] = body
+    return Response(content=body, media_type="application/json",
+                    headers={"X-Data-Version": str(data_version)})
+
+def _parse_fields(fields: Optional[str]) -> Optional[Tuple[str, ...]]:
+    if not fields:
+        return None
+    return tuple(sorted({f.strip() for f in fields.split(",") if f.strip()}))
+
+def _project(data: Dict[str, Any], fields: Tuple[str, ...]) -> Dict[str, Any]:
+    """Оставляет в данных принтера только указанные поля (поддерживаются пути через точку)"""
+    projected: Dict[str, Any] = {}
+    for path in fields:
+        value: Any = data
+        for part in path.split("."):
+            if not isinstance(value, dict) or part not in value:
+                break
+            value = value[part]
+        else:
+            target = projected
+            parts = path.split(".")
+            for part in parts[:-1]:
+                target = target.setdefault(part, {})
+            target[parts[-1]] = value
+    return projected
 
 @app.post("/receive_data")
 async def receive_data(request: Request):
     """Принимает данные от клиента и сохраняет их."""
-    global printers_data
     data = await request.json()
     printer_name = data.get("printer_name")
     
     if printer_name:
-        logger.info(f"Получены данные от принтера: {printer_name}")
-        logger.debug(f"Содержимое данных: {json.dumps(data, indent=2)}")
+        logger.debug("Получены данные от принтера: %s", printer_name)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Содержимое данных: %s", json.dumps(data, indent=2))
         
         # Сохраняем данные в словаре
         printers_data[printer_name] = data
+        _bump_version()
+        if store is not None:
+            store.save_snapshot(printer_name, data)
         
         # Извлекаем и логируем некоторую ключевую информацию для мониторинга
         status = data.get("status", "неизвестно")
-        timestamp = data.get("timestamp", time.time())
         
         if "result" in data and isinstance(data["result"], dict):
             result = data["result"]
             if "status_data" in result:
-                status_details = "Данные о статусе получены"
-                logger.info(f"Принтер {printer_name}: статус={status}, {status_details}")
+                logger.debug("Принтер %s: статус=%s, Данные о статусе получены", printer_name, status)
             else:
-                logger.info(f"Принтер {printer_name}: статус={status}, данные сохранены")
+                logger.debug("Принтер %s: статус=%s, данные сохранены", printer_name, status)
         else:
-            logger.warning(f"Принтер {printer_name}: получены данные в неожиданном формате")
+            logger.warning("Принтер %s: получены данные в неожиданном формате", printer_name)
         
         return {"message": "Data received successfully", "printer": printer_name}
     else:
         logger.warning("Получены данные без указания имени принтера")
-        logger.debug(f"Содержимое данных без имени: {json.dumps(data, indent=2)}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Содержимое данных без имени: %s", json.dumps(data, indent=2))
         return {"message": "Error: missing printer_name", "status": "error"}
 
 @app.get("/", response_class=HTMLResponse)
@@ -79,61 +134,136 @@ async def read_root(request: Request):
     )
 
 @app.get("/api/data")
-async def get_latest_data():
-    """API-эндпоинт для получения данных о всех принтерах."""
-    logger.debug(f"Запрос данных о всех принтерах. Доступно принтеров: {len(printers_data)}")
-    return printers_data
+async def get_latest_data(fields: Optional[str] = None, status: Optional[str] = None):
+    """
+    API-эндпоинт для получения данных о всех принтерах.
+    fields - список полей через запятую (например, status,timestamp,result.result.status.print_stats),
+    status - фильтр по статусу (online, offline, error; можно несколько через запятую).
+    """
+    logger.debug("Запрос данных о всех принтерах. Доступно принтеров: %d", len(printers_data))
+    field_list = _parse_fields(fields)
+    statuses = _parse_fields(status)
+
+    def build():
+        if field_list is None and statuses is None:
+            return printers_data
+        return {
+            name: _project(data, field_list) if field_list else data
+            for name, data in printers_data.items()
+            if statuses is None or data.get("status") in statuses
+        }
+
+    return _cached_json(("data", field_list, statuses), build)
 
 @app.get("/api/data/{printer_name}")
-async def get_printer_data(printer_name: str):
+async def get_printer_data(printer_name: str, fields: Optional[str] = None):
     """Получение данных для конкретного принтера."""
-    logger.debug(f"Запрос данных о принтере: {printer_name}")
-    if printer_name in printers_data:
-        return printers_data[printer_name]
-    logger.warning(f"Запрос данных для несуществующего принтера: {printer_name}")
+    logger.debug("Запрос данных о принтере: %s", printer_name)
+    data = printers_data.get(printer_name)
+    if data is not None:
+        field_list = _parse_fields(fields)
+        return _project(data, field_list) if field_list else data
+    logger.warning("Запрос данных для несуществующего принтера: %s", printer_name)
     return {"error": "Printer not found"}
 
 # Endpoint'ы для управления списком принтеров
 @app.get("/api/printers")
 async def get_printers():
     """Получение списка принтеров"""
-    logger.debug(f"Запрос списка принтеров. Доступно принтеров: {len(printers)}")
-    return printers
+    logger.debug("Запрос списка принтеров. Доступно принтеров: %d", len(printers))
+    return _cached_json(("printers",), lambda: [p.dict() for p in printers.values()])
 
 @app.post("/api/printers")
 async def add_printer(printer: Printer):
     """Добавление нового принтера"""
-    logger.info(f"Добавление нового принтера: {printer.name} ({printer.ip_address})")
-    printers.append(printer)
+    logger.info("Добавление нового принтера: %s (%s)", printer.name, printer.ip_address)
+    if store is not None:
+        # Запись ждёт потока хранилища - ждём её вне цикла событий
+        try:
+            await run_in_threadpool(store.save_printer, printer.name, printer.ip_address)
+        except Exception as e:
+            logger.error("Не удалось сохранить принтер %s: %s", printer.name, e)
+            raise HTTPException(status_code=500, detail="Failed to save printer")
+    printers[printer.name] = printer
+    _bump_version()
     return {"message": "Printer added successfully", "printer": printer}
 
 @app.delete("/api/printers/{printer_name}")
 async def delete_printer(printer_name: str):
     """Удаление принтера по имени"""
-    global printers
-    global printers_data
-    
-    logger.info(f"Запрос на удаление принтера: {printer_name}")
-    original_count = len(printers)
-    printers = [p for p in printers if p.name != printer_name]
+    logger.info("Запрос на удаление принтера: %s", printer_name)
+    if store is not None:
+        try:
+            await run_in_threadpool(store.delete_printer, printer_name)
+        except Exception as e:
+            logger.error("Не удалось удалить принтер %s из хранилища: %s", printer_name, e)
+            raise HTTPException(status_code=500, detail="Failed to delete printer")
+    removed = printers.pop(printer_name, None)
     
     # Удаляем данные принтера, если они есть
-    if printer_name in printers_data:
-        del printers_data[printer_name]
-        logger.info(f"Данные принтера {printer_name} удалены")
+    if printers_data.pop(printer_name, None) is not None:
+        logger.info("Данные принтера %s удалены", printer_name)
+    _bump_version()
     
-    if len(printers) < original_count:
-        logger.info(f"Принтер {printer_name} успешно удален")
+    if removed is not None:
+        logger.info("Принтер %s успешно удален", printer_name)
         return {"message": f"Printer '{printer_name}' deleted successfully"}
     
-    logger.warning(f"Принтер {printer_name} не найден при попытке удаления")
+    logger.warning("Принтер %s не найден при попытке удаления", printer_name)
     return {"message": f"Printer '{printer_name}' not found"}
 
+# Воркеры sender_data, делящие опрос принтеров между собой.
+# Воркер считается живым, пока присылает heartbeat чаще, чем раз в WORKER_TTL секунд.
+WORKER_TTL = float(os.environ.get("WORKER_TTL", "15"))
+workers: Dict[str, float] = {}
+
+class WorkerHeartbeat(BaseModel):
+    worker_id: str
+
+def _live_workers() -> List[str]:
+    now = time.monotonic()
+    for worker_id in [w for w, seen in workers.items() if now - seen > WORKER_TTL]:
+        logger.info("Воркер %s перестал присылать heartbeat", worker_id)
+        del workers[worker_id]
+    return sorted(workers)
+
+@app.post("/api/workers/heartbeat")
+async def worker_heartbeat(heartbeat: WorkerHeartbeat):
+    """Регистрирует воркер sender_data и возвращает список живых воркеров"""
+    if heartbeat.worker_id not in workers:
+        logger.info("Подключился воркер %s", heartbeat.worker_id)
+    workers[heartbeat.worker_id] = time.monotonic()
+    return {"workers": _live_workers(), "ttl": WORKER_TTL}
+
+@app.get("/api/workers")
+async def get_workers():
+    """Список живых воркеров sender_data"""
+    return {"workers": _live_workers(), "ttl": WORKER_TTL}
+
+@app.delete("/api/workers/{worker_id}")
+async def remove_worker(worker_id: str):
+    """Корректное отключение воркера: его принтеры сразу переходят к остальным"""
+    if workers.pop(worker_id, None) is not None:
+        logger.info("Воркер %s отключился", worker_id)
+    return {"workers": _live_workers(), "ttl": WORKER_TTL}
+
 @app.on_event("startup")
 async def startup_event():
     """Выполняется при запуске сервера"""
+    if store is not None:
+        saved_printers, snapshots = store.load()
+        printers.update((p["name"], Printer(**p)) for p in saved_printers)
+        printers_data.update(snapshots)
+        _bump_version()
+        store.start()
     logger.info("Сервер получения данных с принтеров запущен")
     logger.info("Ожидание данных...")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Сбрасывает несохранённые снимки при остановке сервера"""
+    if store is not None:
+        store.close()
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=5000)
\ No newline at end of file
@@ -0,0 +1,175 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("printer_getter.store")
+
+
+class _Op:
+    """Изменение реестра в очереди на запись; error - ошибка, если транзакция не удалась"""
+
+    def __init__(self, sql: str, params: tuple):
+        self.sql = sql
+        self.params = params
+        self.done = threading.Event()
+        self.error: Optional[Exception] = None
+
+
+class RegistryStore:
+    """
+    Хранилище реестра принтеров и последних снимков данных в SQLite (режим WAL).
+
+    Все записи выполняет один фоновый поток. Снимки от receive_data не ждут
+    записи на диск: они сворачиваются в памяти (последний снимок на принтер)
+    и сбрасываются одной транзакцией раз в flush_interval секунд. Изменения
+    реестра (добавление/удаление принтера) редкие, поэтому вызывающий код
+    дожидается их фиксации.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 0.5):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._cond = threading.Condition()
+        self._pending_snapshots: Dict[str, Dict[str, Any]] = {}
+        self._pending_ops: List[_Op] = []
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+
+        conn = self._connect()
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS printers (
+                name TEXT PRIMARY KEY,
+                ip_address TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS snapshots (
+                name TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            """
+        )
+        conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # В режиме WAL NORMAL не даёт испортить базу при падении процесса,
+        # но не делает fsync на каждую транзакцию
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    def load(self) -> Tuple[List[Dict[str, str]], Dict[str, Dict[str, Any]]]:
+        """Загружает реестр и последние снимки (один проход по каждой таблице)"""
+        started = time.perf_counter()
+        conn = self._connect()
+        try:
+            printers = [
+                {"name": name, "ip_address": ip_address}
+                for name, ip_address in conn.execute("SELECT name, ip_address FROM printers")
+            ]
+            snapshots = {
+                name: json.loads(data)
+                for name, data in conn.execute("SELECT name, data FROM snapshots")
+            }
+        finally:
+            conn.close()
+        logger.info(
+            "Загружено принтеров: %d, снимков: %d за %.1f мс",
+            len(printers), len(snapshots), (time.perf_counter() - started) * 1000
+        )
+        return printers, snapshots
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="registry-writer", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Сбрасывает накопленные данные и останавливает поток записи"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+
+    def save_snapshot(self, name: str, data: Dict[str, Any]):
+        """Ставит снимок в очередь на запись, не дожидаясь диска; JSON собирает поток записи"""
+        with self._cond:
+            self._pending_snapshots[name] = data
+
+    def save_printer(self, name: str, ip_address: str):
+        self._submit(
+            "INSERT INTO printers (name, ip_address) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET ip_address = excluded.ip_address",
+            (name, ip_address)
+        )
+
+    def delete_printer(self, name: str):
+        with self._cond:
+            self._pending_snapshots.pop(name, None)
+        self._submit("DELETE FROM snapshots WHERE name = ?", (name,), wait=False)
+        self._submit("DELETE FROM printers WHERE name = ?", (name,))
+
+    def _submit(self, sql: str, params: tuple, wait: bool = True):
+        """Ставит изменение в очередь; с wait ждёт фиксации и пробрасывает ошибку записи"""
+        op = _Op(sql, params)
+        with self._cond:
+            if self._thread is None or self._stopping:
+                raise RuntimeError("RegistryStore is not running")
+            self._pending_ops.append(op)
+            self._cond.notify()
+        if wait:
+            op.done.wait()
+            if op.error is not None:
+                raise op.error
+
+    def _run(self):
+        conn = self._connect()
+        try:
+            while True:
+                with self._cond:
+                    if not self._pending_ops and not self._stopping:
+                        self._cond.wait(self.flush_interval)
+                    ops, self._pending_ops = self._pending_ops, []
+                    snapshots, self._pending_snapshots = self._pending_snapshots, {}
+                    stopping = self._stopping
+                if ops or snapshots:
+                    self._write(conn, ops, snapshots)
+                if stopping:
+                    break
+        finally:
+            conn.close()
+
+    def _write(self, conn: sqlite3.Connection, ops, snapshots: Dict[str, Dict[str, Any]]):
+        now = time.time()
+        try:
+            conn.execute("BEGIN")
+            for op in ops:
+                conn.execute(op.sql, op.params)
+            if snapshots:
+                conn.executemany(
+                    "INSERT INTO snapshots (name, data, updated_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(name) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+                    [
+                        (name, json.dumps(data, ensure_ascii=False, separators=(",", ":")), now)
+                        for name, data in snapshots.items()
+                    ]
+                )
+            conn.execute("COMMIT")
+        except Exception as e:
+            logger.error("Ошибка записи в хранилище реестра: %s", e)
+            # Транзакция откатывается целиком - не записано ни одно изменение из пачки
+            for op in ops:
+                op.error = e
+            # Транзакции может уже не быть (не удался BEGIN или SQLite откатил её сам)
+            try:
+                conn.execute("ROLLBACK")
+            except sqlite3.Error as rollback_error:
+                logger.error("Ошибка отката в хранилище реестра: %s", rollback_error)
+        finally:
+            for op in ops:
+                op.done.set()
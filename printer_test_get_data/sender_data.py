@@ -1,6 +1,12 @@
 import requests
 import time
 import json
+import os
+import bisect
+import hashlib
+import heapq
+import random
+import signal
 import socket
 import logging
 from typing import Dict, List, Any, Optional
@@ -11,36 +17,50 @@ urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 # Настройка логирования
 logging.basicConfig(
-    level=logging.INFO,
+    level=os.environ.get("SENDER_LOG_LEVEL", "INFO"),
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger("printer_sender")
 
 # Настройки
-SERVER_URL = "http://83.222.17.92:5000"  # Адрес сервера getter_data.py
-POLL_INTERVAL = 5  # Интервал обновления данных в секундах
+SERVER_URL = os.environ.get("SENDER_SERVER_URL", "http://83.222.17.92:5000")  # Адрес сервера getter_data.py
+POLL_INTERVAL = 5  # Интервал опроса принтера на паузе или в неизвестном состоянии, сек
+ACTIVE_POLL_INTERVAL = 2  # Интервал опроса во время печати или нагрева, сек
+IDLE_POLL_INTERVAL = 30  # Интервал опроса простаивающего принтера, сек
+OFFLINE_BACKOFF_BASE = 5  # Начальная задержка для недоступного принтера, сек
+OFFLINE_BACKOFF_MAX = 300  # Максимальная задержка для недоступного принтера, сек
+PRINTER_LIST_REFRESH = 30  # Как часто обновлять список принтеров с сервера, сек
+PRINTER_LIST_RETRY = 5  # Повтор запроса списка после ошибки сервера, сек
 REQUEST_TIMEOUT = 5  # Таймаут запросов в секундах
+CONNECT_TIMEOUT = 1  # Таймаут проверки доступности порта принтера, сек
+MOONRAKER_PORT = 7125
+# Идентификатор воркера: несколько воркеров делят принтеры между собой по хешу имени
+WORKER_ID = os.environ.get("SENDER_WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}"
+HEARTBEAT_INTERVAL = float(os.environ.get("SENDER_HEARTBEAT_INTERVAL", "5"))  # сек
+RING_VNODES = 64  # Виртуальных узлов на воркер в кольце хешей
 
-def get_printer_list() -> List[Dict]:
-    """Получение списка принтеров с сервера"""
+def get_printer_list() -> Optional[List[Dict]]:
+    """Получение списка принтеров с сервера; None - если сервер не ответил"""
     try:
         logger.debug(f"Запрос списка принтеров на {SERVER_URL}/api/printers")
         response = requests.get(f"{SERVER_URL}/api/printers", timeout=REQUEST_TIMEOUT)
         if response.status_code == 200:
             printers = response.json()
-            logger.debug(f"Получен список принтеров: {json.dumps(printers, indent=2)}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Получен список принтеров: {json.dumps(printers, indent=2)}")
             return printers
         else:
             logger.error(f"Ошибка получения списка принтеров: {response.status_code}")
-            return []
+            return None
     except Exception as e:
         logger.error(f"Ошибка при запросе списка принтеров: {str(e)}")
-        return []
+        return None
 
 def send_printer_data(data: Dict) -> bool:
     """Отправка данных о принтере на сервер"""
     try:
-        logger.debug(f"Отправка данных на сервер: {json.dumps(data, indent=2)}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Отправка данных на сервер: {json.dumps(data, indent=2)}")
         response = requests.post(
             f"{SERVER_URL}/receive_data", 
             json=data,
@@ -56,6 +76,59 @@ def send_printer_data(data: Dict) -> bool:
         logger.error(f"Ошибка при отправке данных: {str(e)}")
         return False
 
+def send_heartbeat() -> Optional[List[str]]:
+    """
+    Сообщает серверу, что воркер жив, и получает список живых воркеров.
+    Возвращает None, если сервер недоступен или не поддерживает воркеры.
+    """
+    try:
+        response = requests.post(
+            f"{SERVER_URL}/api/workers/heartbeat",
+            json={"worker_id": WORKER_ID},
+            timeout=REQUEST_TIMEOUT
+        )
+        if response.status_code == 200:
+            return response.json().get("workers")
+        logger.warning(f"Ошибка heartbeat: {response.status_code}")
+    except Exception as e:
+        logger.warning(f"Ошибка при отправке heartbeat: {str(e)}")
+    return None
+
+def leave_cluster():
+    """Сообщает серверу об отключении воркера, чтобы остальные сразу забрали его принтеры"""
+    try:
+        requests.delete(f"{SERVER_URL}/api/workers/{WORKER_ID}", timeout=REQUEST_TIMEOUT)
+    except Exception as e:
+        logger.warning(f"Ошибка при отключении воркера: {str(e)}")
+
+def _ring_hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+class HashRing:
+    """
+    Кольцо согласованного хеширования: принтер принадлежит воркеру, чья точка
+    на кольце идёт следующей после хеша имени принтера. При подключении или
+    отключении воркера переезжает только его доля принтеров.
+    """
+
+    def __init__(self, workers: List[str], vnodes: int = RING_VNODES):
+        points = sorted(
+            (_ring_hash(f"{worker}#{i}"), worker)
+            for worker in workers
+            for i in range(vnodes)
+        )
+        self._hashes = [h for h, _ in points]
+        self._workers = [w for _, w in points]
+
+    def owner(self, key: str) -> Optional[str]:
+        if not self._hashes:
+            return None
+        index = bisect.bisect(self._hashes, _ring_hash(key)) % len(self._hashes)
+        return self._workers[index]
+
+    def filter(self, printers: List[Dict], worker_id: str) -> List[Dict]:
+        return [p for p in printers if self.owner(p.get("name") or "") == worker_id]
+
 def get_printer_status(ip_address: str) -> Optional[Dict]:
     """Получение статуса принтера по API Klipper/Moonraker"""
     try:
@@ -117,94 +190,226 @@ def get_printer_status(ip_address: str) -> Optional[Dict]:
         return None
 
 def is_printer_online(ip_address: str) -> bool:
-    """Проверка доступности принтера"""
+    """Проверка доступности принтера (адрес может содержать порт: host:port)"""
+    host, _, port = ip_address.partition(":")
     try:
         logger.debug(f"Проверка доступности принтера {ip_address}")
-        socket.create_connection((ip_address, 7125), timeout=REQUEST_TIMEOUT)
+        with socket.create_connection((host, int(port or MOONRAKER_PORT)), timeout=CONNECT_TIMEOUT):
+            pass
         logger.debug(f"Принтер {ip_address} доступен")
         return True
-    except (socket.timeout, socket.error) as e:
+    except (socket.timeout, socket.error, ValueError) as e:
         logger.debug(f"Принтер {ip_address} недоступен: {str(e)}")
         return False
 
+def classify_status(status_data: Dict) -> str:
+    """
+    Определяет режим опроса по данным Moonraker:
+    active - печать или нагрев, paused - пауза, idle - простой
+    """
+    status = status_data.get("result", {}).get("status", {})
+    state = status.get("print_stats", {}).get("state")
+    if state == "printing":
+        return "active"
+    if state == "paused":
+        return "paused"
+    heating = any(
+        (status.get(heater) or {}).get("target", 0) > 0
+        for heater in ("extruder", "heater_bed")
+    )
+    return "active" if heating else "idle"
+
+def poll_printer(printer_name: str, ip_address: str) -> str:
+    """
+    Опрашивает один принтер и отправляет данные на сервер.
+    Возвращает режим для планировщика: active, paused, idle, offline или error.
+    """
+    # Проверяем доступность принтера
+    if not is_printer_online(ip_address):
+        logger.warning(f"Принтер {printer_name} ({ip_address}) недоступен")
+        # Отправляем статус оффлайн
+        send_printer_data({
+            "printer_name": printer_name,
+            "ip_address": ip_address,
+            "status": "offline",
+            "result": {},
+            "timestamp": time.time()
+        })
+        return "offline"
+
+    # Получаем статус принтера
+    logger.debug(f"Запрос статуса принтера {printer_name}")
+    status_data = get_printer_status(ip_address)
+
+    if not status_data:
+        logger.warning(f"Не удалось получить данные с принтера {printer_name}")
+        # Отправляем статус ошибки
+        send_printer_data({
+            "printer_name": printer_name,
+            "ip_address": ip_address,
+            "status": "error",
+            "result": {"error": "Не удалось получить данные с принтера"},
+            "timestamp": time.time()
+        })
+        return "error"
+
+    # Отправляем данные на сервер
+    logger.debug(f"Отправка данных для принтера {printer_name}")
+    send_printer_data({
+        "printer_name": printer_name,
+        "ip_address": ip_address,
+        "status": "online",
+        "result": status_data,
+        "timestamp": time.time()
+    })
+    return classify_status(status_data)
+
+def next_poll_delay(mode: str, failures: int) -> float:
+    """
+    Задержка до следующего опроса принтера.
+    Для недоступных принтеров - экспоненциальная задержка со случайным разбросом,
+    чтобы принтеры, пропавшие одновременно, не опрашивались одной пачкой.
+    """
+    if mode == "active":
+        return ACTIVE_POLL_INTERVAL
+    if mode == "idle":
+        return IDLE_POLL_INTERVAL
+    if mode in ("offline", "error"):
+        delay = min(OFFLINE_BACKOFF_MAX, OFFLINE_BACKOFF_BASE * 2 ** max(0, failures - 1))
+        return random.uniform(delay / 2, delay)
+    return POLL_INTERVAL
+
+class PollScheduler:
+    """Очередь опроса принтеров по времени следующего опроса"""
+
+    def __init__(self):
+        self._queue: List = []  # куча (время опроса, имя принтера)
+        self._due: Dict[str, float] = {}  # имя -> время опроса его действующей записи в куче
+        self._printers: Dict[str, str] = {}  # имя -> IP-адрес
+        self._failures: Dict[str, int] = {}
+
+    def update_printers(self, printers: List[Dict]):
+        """Синхронизирует список принтеров: новые опрашиваются сразу, удалённые забываются"""
+        current = {}
+        for printer in printers:
+            printer_name = printer.get("name")
+            ip_address = printer.get("ip_address")
+            if not ip_address:
+                logger.warning(f"Пропуск принтера {printer_name}: отсутствует IP-адрес")
+                continue
+            current[printer_name] = ip_address
+
+        now = time.monotonic()
+        for printer_name in current.keys() - self._printers.keys():
+            self._schedule(printer_name, now)
+        for printer_name in self._printers.keys() - current.keys():
+            self._failures.pop(printer_name, None)
+            self._due.pop(printer_name, None)
+        self._printers = current
+
+    def _schedule(self, printer_name: str, at: float):
+        self._due[printer_name] = at
+        heapq.heappush(self._queue, (at, printer_name))
+
+    def next_due(self) -> Optional[float]:
+        # Записи удалённых принтеров и записи, которые заменило повторное добавление,
+        # выкидываются из кучи лениво: действующая запись только та, что в _due
+        while self._queue and self._due.get(self._queue[0][1]) != self._queue[0][0]:
+            heapq.heappop(self._queue)
+        return self._queue[0][0] if self._queue else None
+
+    def run_due(self):
+        """Опрашивает все принтеры, время опроса которых наступило"""
+        now = time.monotonic()
+        while True:
+            due = self.next_due()
+            if due is None or due > now:
+                return
+            _, printer_name = heapq.heappop(self._queue)
+            mode = poll_printer(printer_name, self._printers[printer_name])
+            if mode in ("offline", "error"):
+                self._failures[printer_name] = self._failures.get(printer_name, 0) + 1
+            else:
+                self._failures.pop(printer_name, None)
+            delay = next_poll_delay(mode, self._failures.get(printer_name, 0))
+            logger.debug(f"Принтер {printer_name}: режим {mode}, следующий опрос через {delay:.1f} сек")
+            self._schedule(printer_name, time.monotonic() + delay)
+
 def main_loop():
     """Основной цикл программы"""
     logger.info("Запуск клиента сбора данных с принтеров")
-    logger.info(f"Сервер: {SERVER_URL}")
-    logger.info(f"Интервал опроса: {POLL_INTERVAL} сек")
-    
+    logger.info(f"Сервер: {SERVER_URL}, воркер: {WORKER_ID}")
+    logger.info(
+        f"Интервалы опроса: печать {ACTIVE_POLL_INTERVAL} сек, пауза {POLL_INTERVAL} сек, "
+        f"простой {IDLE_POLL_INTERVAL} сек, недоступен до {OFFLINE_BACKOFF_MAX} сек"
+    )
+
+    scheduler = PollScheduler()
+    printers: List[Dict] = []
+    workers = [WORKER_ID]
+    ring = HashRing(workers)
+    next_refresh = 0.0
+    next_heartbeat = 0.0
+
     while True:
         try:
-            logger.info("Получение списка принтеров...")
-            printers = get_printer_list()
-            logger.info(f"Получен список из {len(printers)} принтеров")
-            
-            for printer in printers:
-                printer_name = printer.get("name")
-                ip_address = printer.get("ip_address")
-                
-                if not ip_address:
-                    logger.warning(f"Пропуск принтера {printer_name}: отсутствует IP-адрес")
-                    continue
-                
-                logger.info(f"Обработка принтера {printer_name} ({ip_address})")
-                
-                # Проверяем доступность принтера
-                is_online = is_printer_online(ip_address)
-                
-                if not is_online:
-                    logger.warning(f"Принтер {printer_name} ({ip_address}) недоступен")
-                    # Отправляем статус оффлайн
-                    offline_data = {
-                        "printer_name": printer_name,
-                        "ip_address": ip_address,
-                        "status": "offline",
-                        "result": {},
-                        "timestamp": time.time()
-                    }
-                    send_printer_data(offline_data)
-                    continue
-                
-                # Получаем статус принтера
-                logger.debug(f"Запрос статуса принтера {printer_name}")
-                status_data = get_printer_status(ip_address)
-                
-                if status_data:
-                    # Формируем данные для отправки
-                    data_to_send = {
-                        "printer_name": printer_name,
-                        "ip_address": ip_address,
-                        "status": "online",
-                        "result": status_data,
-                        "timestamp": time.time()
-                    }
-                    
-                    # Отправляем данные на сервер
-                    logger.info(f"Отправка данных для принтера {printer_name}")
-                    send_printer_data(data_to_send)
+            now = time.monotonic()
+            reassign = False
+
+            if now >= next_heartbeat:
+                live_workers = send_heartbeat()
+                # Без ответа сервера продолжаем с последним известным составом
+                if live_workers is not None:
+                    live_workers = sorted(set(live_workers) | {WORKER_ID})
+                    if live_workers != workers:
+                        logger.info(f"Состав воркеров изменился: {', '.join(live_workers)}")
+                        workers = live_workers
+                        ring = HashRing(workers)
+                        reassign = True
+                next_heartbeat = now + HEARTBEAT_INTERVAL
+
+            if now >= next_refresh:
+                logger.info("Получение списка принтеров...")
+                new_printers = get_printer_list()
+                if new_printers is None:
+                    # Без ответа сервера опрашиваем прежний список и скоро пробуем снова
+                    logger.warning(
+                        f"Список принтеров не получен, продолжаем с прежним ({len(printers)}), "
+                        f"повтор через {PRINTER_LIST_RETRY} сек"
+                    )
+                    next_refresh = now + PRINTER_LIST_RETRY
                 else:
-                    logger.warning(f"Не удалось получить данные с принтера {printer_name}")
-                    # Отправляем статус ошибки
-                    error_data = {
-                        "printer_name": printer_name,
-                        "ip_address": ip_address,
-                        "status": "error",
-                        "result": {"error": "Не удалось получить данные с принтера"},
-                        "timestamp": time.time()
-                    }
-                    send_printer_data(error_data)
-            
-            # Спим до следующего опроса
-            logger.info(f"Ожидание {POLL_INTERVAL} секунд до следующего опроса...")
-            time.sleep(POLL_INTERVAL)
+                    printers = new_printers
+                    logger.info(f"Получен список из {len(printers)} принтеров")
+                    next_refresh = now + PRINTER_LIST_REFRESH
+                    reassign = True
+
+            if reassign:
+                own_printers = ring.filter(printers, WORKER_ID)
+                logger.info(f"Воркер {WORKER_ID} опрашивает {len(own_printers)} из {len(printers)} принтеров")
+                scheduler.update_printers(own_printers)
+
+            scheduler.run_due()
+
+            # Спим до ближайшего опроса, heartbeat или обновления списка
+            due = scheduler.next_due()
+            wake_at = min(next_refresh, next_heartbeat)
+            if due is not None:
+                wake_at = min(wake_at, due)
+            time.sleep(max(0.0, wake_at - time.monotonic()))
             
         except KeyboardInterrupt:
             logger.info("Программа остановлена пользователем")
+            leave_cluster()
             break
         except Exception as e:
             logger.error(f"Произошла ошибка в основном цикле: {str(e)}", exc_info=True)
             # Ожидаем перед повторной попыткой
             time.sleep(1)
 
+def _handle_sigterm(signum, frame):
+    raise KeyboardInterrupt
+
 if __name__ == "__main__":
-    main_loop()
\ No newline at end of file
+    signal.signal(signal.SIGTERM, _handle_sigterm)
+    main_loop()
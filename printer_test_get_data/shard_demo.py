@@ -0,0 +1,149 @@
+"""
+Демонстрация масштабирования sender_data по числу воркеров.
+
+Поднимает заглушку Moonraker с искусственной задержкой ответа, сервер
+getter_data и по очереди запускает 1, 2, 4 ... процессов sender_data.
+Воркеры делят принтеры по кольцу хешей, поэтому число опросов в секунду
+растёт примерно линейно, пока не упрётся в требуемую частоту опроса.
+
+Пример: python shard_demo.py --printers 200 --workers 1 2 4 --latency 0.05
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+class StubMoonraker(BaseHTTPRequestHandler):
+    """Отвечает на /printer/objects/query как печатающий принтер Klipper"""
+
+    latency = 0.05
+    lock = threading.Lock()
+    queries = 0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(self.latency)
+        with StubMoonraker.lock:
+            StubMoonraker.queries += 1
+        body = json.dumps({
+            "result": {
+                "eventtime": time.time(),
+                "status": {
+                    "print_stats": {"state": "printing", "print_duration": 600.0},
+                    "virtual_sdcard": {"progress": 0.5},
+                    "extruder": {"temperature": 215.0, "target": 215.0},
+                    "heater_bed": {"temperature": 60.0, "target": 60.0},
+                },
+            }
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # Воркер завершили посреди запроса
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+def wait_for(url: str, timeout: float = 15.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} не отвечает")
+
+
+def run_workers(count: int, server_url: str, warmup: float, duration: float) -> float:
+    env = dict(
+        os.environ,
+        SENDER_SERVER_URL=server_url,
+        SENDER_LOG_LEVEL="WARNING",
+        SENDER_HEARTBEAT_INTERVAL="1",
+    )
+    workers = [
+        subprocess.Popen(
+            [sys.executable, os.path.join(HERE, "sender_data.py")],
+            env=dict(env, SENDER_WORKER_ID=f"demo-worker-{i}"),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        for i in range(count)
+    ]
+    try:
+        # Даём воркерам увидеть друг друга и поделить принтеры
+        time.sleep(warmup)
+        started = StubMoonraker.queries
+        time.sleep(duration)
+        return (StubMoonraker.queries - started) / duration
+    finally:
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--printers", type=int, default=200)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--latency", type=float, default=0.05, help="задержка ответа принтера, сек")
+    parser.add_argument("--warmup", type=float, default=5.0)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--stub-port", type=int, default=17125)
+    parser.add_argument("--getter-port", type=int, default=15000)
+    args = parser.parse_args()
+
+    StubMoonraker.latency = args.latency
+    stub = ThreadingHTTPServer(("127.0.0.1", args.stub_port), StubMoonraker)
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+
+    server_url = f"http://127.0.0.1:{args.getter_port}"
+    with tempfile.TemporaryDirectory() as tmp:
+        getter = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "getter_data:app",
+             "--port", str(args.getter_port), "--log-level", "warning"],
+            cwd=HERE,
+            env=dict(os.environ, GETTER_DB_PATH=os.path.join(tmp, "registry.db")),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            wait_for(f"{server_url}/api/printers")
+            for i in range(args.printers):
+                requests.post(f"{server_url}/api/printers", json={
+                    "name": f"stub-{i}",
+                    "ip_address": f"127.0.0.1:{args.stub_port}",
+                }, timeout=5)
+
+            results = {}
+            for count in args.workers:
+                rate = run_workers(count, server_url, args.warmup, args.duration)
+                results[count] = rate
+                print(f"воркеров: {count:>2}  опросов/сек: {rate:7.1f}  на воркер: {rate / count:6.1f}")
+            print(json.dumps({"printers": args.printers, "latency": args.latency, "polls_per_second": results}))
+        finally:
+            getter.terminate()
+            getter.wait()
+            stub.shutdown()
+
+
+if __name__ == "__main__":
+    main()